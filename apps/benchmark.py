@@ -51,7 +51,10 @@
 # finished.
 #
 # In all cases the time reported is measured from the moment when the
-# operands are ready until all the results are ready.
+# operands are ready until all the results are ready. The number of
+# bytes sent per operation is reported as well. Run the benchmark with
+# and without --no-binary-shares to compare the hexadecimal and the
+# binary share encodings.
 
 import sys
 import time
@@ -63,7 +66,8 @@ viff.reactor.install()
 from twisted.internet import reactor
 
 from viff.field import GF, FakeGF
-from viff.runtime import Runtime, create_runtime, make_runtime_class
+from viff.runtime import Runtime, create_runtime, make_runtime_class, \
+    element_size
 from viff.passive import PassiveRuntime
 from viff.active import (BasicActiveRuntime,
                          TriplesHyperinvertibleMatricesMixin, TriplesPRSSMixin)
@@ -191,6 +195,11 @@ else:
 
 Zp = Field(find_prime(options.modulus))
 print "Using field elements (%d bit modulus)" % log(Zp.modulus, 2)
+if options.binary_shares:
+    print "Sending shares in binary encoding (%d bytes per element)" \
+        % element_size(Zp)
+else:
+    print "Sending shares as hexadecimal strings"
 
 
 count = options.count
@@ -45,6 +45,18 @@ def record_stop(x, what, count):
     return x
 
 
+def bytes_sent(rt):
+    """Return the total number of bytes sent by *rt* so far."""
+    return sum([p.sent_bytes for p in rt.protocols.itervalues()])
+
+
+def record_bytes(x, rt, start_bytes, what, count):
+    sent = bytes_sent(rt) - start_bytes
+    print "Bytes sent: %d (%.1f per %s operation)" % \
+        (sent, float(sent) / count, what)
+    return x
+
+
 class Benchmark(object):
     """Abstract base class for all Benchmarks.
 
@@ -114,11 +126,14 @@ class ParallelBenchmark(Benchmark):
             self.pc = list(self.rt.program_counter)
         c_shares = []
         record_start("parallel test")
+        start_bytes = bytes_sent(self.rt)
         while not self.is_operation_done():
             c_shares.append(self.do_operation())
 
         done = gatherResults(c_shares)
         done.addCallback(record_stop, "parallel test", self.count)
+        done.addCallback(record_bytes, self.rt, start_bytes,
+                         "parallel test", self.count)
         def f(x):
             needed_data = self.rt._needed_data
             self.rt._needed_data = {}
@@ -133,6 +148,7 @@ class SequentialBenchmark(Benchmark):
 
     def run_test(self, _, termination_function, d):
         record_start("sequential test")
+        self.start_bytes = bytes_sent(self.rt)
         self.single_operation(None, termination_function)
 
     def single_operation(self, _, termination_function):
@@ -141,6 +157,8 @@ class SequentialBenchmark(Benchmark):
             self.rt.schedule_callback(c, self.single_operation, termination_function)
         else:
             record_stop(None, "sequential test", self.count)
+            record_bytes(None, self.rt, self.start_bytes,
+                         "sequential test", self.count)
             self.finished(None, termination_function)
 
 
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+# This program measures the speed of field arithmetic. It reports the
+# number of additions, multiplications, inversions, and
+# exponentiations per second for fields with moduli of different
+# sizes. No network is involved.
+#
+# Example:
+#
+#   ./field-benchmark.py --bits 32,65,256 --count 100000
+
+import time
+from optparse import OptionParser
+
+from gmpy import mpz
+
+from viff.field import GF, GF256
+from viff.util import rand
+
+parser = OptionParser()
+parser.add_option("-b", "--bits", metavar="B1,B2,...",
+                  help="comma separated list of modulus bit lengths")
+parser.add_option("-c", "--count", type="int",
+                  help="number of operations for each measurement")
+parser.set_defaults(bits="32,65,256,1024", count=100000)
+
+(options, args) = parser.parse_args()
+
+
+def find_prime(bits):
+    """Return the smallest Blum prime with at least *bits* bits."""
+    p = mpz(2)**(bits - 1) + 3
+    while not (p.is_prime() and p % 4 == 3):
+        p += 4
+    return long(p)
+
+
+def measure(field, count):
+    """Return operations per second for add, mul, invert, and pow."""
+    xs = [field(rand.randint(1, field.modulus - 1)) for _ in range(1000)]
+    ys = [field(rand.randint(1, field.modulus - 1)) for _ in range(1000)]
+    pairs = zip(xs, ys) * (count // len(xs))
+    exponent = field.modulus // 3
+
+    results = []
+    for op, items in [(lambda x, y: x + y, pairs),
+                      (lambda x, y: x * y, pairs),
+                      (lambda x, y: ~x, pairs),
+                      (lambda x, y: x**exponent, pairs[:count // 100])]:
+        start = time.time()
+        for x, y in items:
+            op(x, y)
+        results.append(len(items) / (time.time() - start))
+    return results
+
+print "%-8s %12s %12s %12s %12s" % ("field", "add/s", "mul/s",
+                                    "invert/s", "pow/s")
+fields = [("GF256", GF256)]
+fields.extend([("%d bit" % bits, GF(find_prime(bits)))
+               for bits in map(int, options.bits.split(","))])
+for name, field in fields:
+    print "%-8s %12.0f %12.0f %12.0f %12.0f" % ((name, ) +
+                                                 tuple(measure(field,
+                                                               options.count)))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+# This program compares the VIFF reactors. For each number of players
+# n it connects n simulated players in a full mesh over loopback TCP,
+# giving n * (n-1) open sockets in a single reactor. Each connection
+# keeps a small message bouncing back and forth, and every received
+# message makes a recursive call to doIteration like
+# Runtime.activate_reactor does. The program reports the number of
+# reactor iterations and messages per second.
+#
+# Example:
+#
+#   ./reactor-benchmark.py --players 3,7,15 --duration 5
+
+import time
+from optparse import OptionParser
+
+from twisted.internet.protocol import Protocol, ServerFactory, ClientFactory
+
+import viff.reactor
+from viff.reactor import ViffReactor
+
+parser = OptionParser()
+parser.add_option("-n", "--players", metavar="N1,N2,...",
+                  help="comma separated list of player counts to try")
+parser.add_option("-d", "--duration", type="float",
+                  help="seconds to run each measurement")
+parser.set_defaults(players="3,7,15", duration=3.0)
+
+(options, args) = parser.parse_args()
+
+reactors = [("select", ViffReactor)]
+if viff.reactor.EPollReactor is not None:
+    reactors.append(("epoll", viff.reactor.EPollViffReactor))
+
+
+class Bouncer(Protocol):
+    """Send every message straight back."""
+
+    def connectionMade(self):
+        self.factory.connected.append(self)
+        if self.factory.initiator:
+            self.transport.write("x" * 32)
+
+    def dataReceived(self, data):
+        self.factory.stats["messages"] += 1
+        self.transport.write(data)
+        # Imitate Runtime.activate_reactor.
+        reactor = self.factory.reactor
+        if reactor.depth < 1:
+            reactor.depth += 1
+            reactor.doIteration(0)
+            reactor.depth -= 1
+
+
+def make_factory(factory_class, reactor, stats, connected, initiator):
+    factory = factory_class()
+    factory.protocol = Bouncer
+    factory.reactor = reactor
+    factory.stats = stats
+    factory.connected = connected
+    factory.initiator = initiator
+    return factory
+
+
+def measure(reactor_class, n, duration):
+    """Return iterations and messages per second for *n* players."""
+    reactor = reactor_class()
+    reactor.depth = 0
+    stats = {"messages": 0}
+    connected = []
+
+    # Player i listens and players j > i connect to it.
+    ports = []
+    for i in range(n):
+        factory = make_factory(ServerFactory, reactor, stats, connected,
+                               False)
+        ports.append(reactor.listenTCP(0, factory, interface="127.0.0.1"))
+    for i in range(n):
+        for j in range(i + 1, n):
+            factory = make_factory(ClientFactory, reactor, stats, connected,
+                                   True)
+            reactor.connectTCP("127.0.0.1", ports[i].getHost().port, factory)
+
+    # Wait until the full mesh is connected.
+    sockets = n * (n - 1)
+    while len(connected) < sockets:
+        reactor.doIteration(0.1)
+
+    iterations = 0
+    stats["messages"] = 0
+    start = time.time()
+    while time.time() - start < duration:
+        reactor.doIteration(0)
+        iterations += 1
+    elapsed = time.time() - start
+
+    for protocol in connected:
+        protocol.transport.loseConnection()
+    for port in ports:
+        port.stopListening()
+    for _ in range(10):
+        reactor.doIteration(0)
+
+    return iterations / elapsed, stats["messages"] / elapsed
+
+print "%-8s %4s %8s %14s %14s" % ("reactor", "n", "sockets",
+                                 "iterations/s", "messages/s")
+for n in map(int, options.players.split(",")):
+    for name, reactor_class in reactors:
+        iterations, messages = measure(reactor_class, n, options.duration)
+        print "%-8s %4d %8d %14.0f %14.0f" % (name, n, n * (n - 1),
+                                              iterations, messages)
@@ -170,6 +170,11 @@ class Protocol:
         # Make a shallow copy -- the algorithm wont be in-place anyway
         # since we create lots of new Shares as we go along.
         array = array[:]
+        # The comparators are collected in layers. Comparators in the
+        # same layer touch different elements and are done together
+        # using greater_than_equal_many.
+        layers = []
+        depth = [0] * len(array)
 
         def bitonic_sort(low, n, ascending):
             if n > 1:
@@ -188,23 +193,34 @@ class Protocol:
                 bitonic_merge(low + m, n - m, ascending)
 
         def compare(i, j, ascending):
-
-            def tick_progressbar(dummy):
-                """This is added as a callback to the deferred in le, and
-                therefor must pass on the result of the comparison to
-                where it is actually used."""
-                self.comparisons += 1
-                self.progressbar.update(self.comparisons)
-                return dummy
-
-            def xor(a, b):
-                # TODO: We use this simple xor until
-                # http://tracker.viff.dk/issue60 is fixed.
-                return a + b - 2*a*b
-
-            le = array[i] <= array[j] # a deferred
-            le.addCallback(tick_progressbar)
-
+            layer = max(depth[i], depth[j])
+            depth[i] = depth[j] = layer + 1
+            if layer == len(layers):
+                layers.append([])
+            layers[layer].append((i, j, ascending))
+
+        def tick_progressbar(dummy):
+            """This is added as a callback to the deferred in le, and
+            therefor must pass on the result of the comparison to
+            where it is actually used."""
+            self.comparisons += 1
+            self.progressbar.update(self.comparisons)
+            return dummy
+
+        def xor(a, b):
+            # TODO: We use this simple xor until
+            # http://tracker.viff.dk/issue60 is fixed.
+            return a + b - 2*a*b
+
+        def compare_layer(comparators):
+            # array[i] <= array[j] is the same as array[j] >= array[i].
+            les = self.rt.greater_than_equal_many([(array[j], array[i])
+                                                   for i, j, _ in comparators])
+            for (i, j, ascending), le in zip(comparators, les):
+                le.addCallback(tick_progressbar)
+                swap(i, j, ascending, le)
+
+        def swap(i, j, ascending, le):
             # We must swap array[i] and array[j] when they sort in the
             # wrong direction, that is, when ascending is True and
             # array[i] > array[j], or when ascending is False (meaning
@@ -228,6 +244,8 @@ class Protocol:
             array[j] = aj + b_ai_aj
 
         bitonic_sort(0, len(array), ascending=True)
+        for comparators in layers:
+            compare_layer(comparators)
         return array
 
 # Run doctests
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+# Copyright 2010 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+# This program measures the speed of the zero-knowledge proofs used
+# by the BeDOZa Share protocol. For each number s of ciphertexts per
+# proof it reports the number of proofs generated and verified per
+# second. No network is involved.
+#
+# Example:
+#
+#   ./zk-benchmark.py --sizes 5,20,80 --count 10 --keysize 1024
+
+import time
+from optparse import OptionParser
+from random import Random
+
+from gmpy import mpz
+
+from viff.paillier import generate_keys
+from viff.bedoza.modified_paillier import ModifiedPaillier
+from viff.bedoza.util import rand_int_signed
+from viff.bedoza.zero_knowledge import ZKProof, _check_proofs
+
+parser = OptionParser()
+parser.add_option("-s", "--sizes", metavar="S1,S2,...",
+                  help="comma separated list of ciphertexts per proof")
+parser.add_option("-c", "--count", type="int",
+                  help="number of proofs for each measurement")
+parser.add_option("-k", "--bits", type="int",
+                  help="bit length of the plaintexts")
+parser.add_option("--keysize", type="int",
+                  help="Paillier key size")
+parser.set_defaults(sizes="5,10,20,40,80", count=10, bits=64, keysize=1024)
+
+(options, args) = parser.parse_args()
+
+
+class Player(object):
+
+    def __init__(self, pubkey):
+        self.pubkey = pubkey
+
+
+class Runtime(object):
+    """Just enough of a runtime to make and check proofs locally."""
+
+    def __init__(self, id, players):
+        self.id = id
+        self.players = players
+
+
+def measure(s, k, count):
+    """Return proofs per second generated and verified."""
+    pubkey, _ = generate_keys(options.keysize)
+    players = {1: Player(pubkey), 2: Player(pubkey)}
+    prover = Runtime(1, players)
+    verifier = Runtime(2, players)
+    random = Random(s)
+    paillier = ModifiedPaillier(prover, random)
+
+    proofs = []
+    start = time.time()
+    for _ in range(count):
+        x = [mpz(rand_int_signed(random, 2**k)) for _ in range(s)]
+        r, c = zip(*[paillier.encrypt_r(xi) for xi in x])
+        proof = ZKProof(s, 1, k, prover, list(c), random=random,
+                        paillier=paillier, x=x, r=list(r))
+        proof._generate_proof()
+        proofs.append((c, proof._serialize_proof()))
+    generated = count / (time.time() - start)
+
+    checks = []
+    for c, serialized_proof in proofs:
+        proof = ZKProof(s, 1, k, verifier, list(c))
+        proof._prepare_check(serialized_proof)
+        checks.append(proof)
+    start = time.time()
+    assert _check_proofs(checks), "Proof failed"
+    verified = count / (time.time() - start)
+    return generated, verified
+
+print "%-6s %12s %12s" % ("s", "generate/s", "verify/s")
+for s in map(int, options.sizes.split(",")):
+    print "%-6d %12.2f %12.2f" % ((s, ) + measure(s, options.bits,
+                                                  options.count))
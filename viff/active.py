@@ -18,6 +18,8 @@
 """A thresholdbased actively secure runtime."""
 
 from math import ceil
+from hashlib import sha1
+from struct import pack, unpack
 
 from gmpy import numdigits
 
@@ -25,10 +27,60 @@ from twisted.internet.defer import gatherResults, Deferred
 
 from viff import shamir
 from viff.util import rand
-from viff.matrix import Matrix, hyper
-from viff.passive import PassiveRuntime
-from viff.runtime import Share, preprocess, gather_shares
-from viff.constants import ECHO, READY, SEND
+from viff.field import GF
+from viff.matrix import hyper
+from viff.passive import PassiveRuntime, _vector_mul
+from viff.runtime import Share, SharedVector, preprocess, gather_shares
+from viff.constants import ECHO, READY, SEND, FETCH, PAYLOAD
+
+
+def _verify_sharing(modulus, values, degree):
+    """Check that *values* are shares of a polynomial of *degree*.
+
+    The values are the integer shares of players 1, 2, ..., n in the
+    field with the given *modulus*. This is run in a worker process
+    by :meth:`TriplesHyperinvertibleMatricesMixin._verify_single`.
+    """
+    field = GF(modulus)
+    shares = [(field(i+1), field(v)) for i, v in enumerate(values)]
+    return shamir.verify_sharing(shares, degree)
+
+
+def _verify_sharings(modulus, sharings, degree):
+    """Return the indices of the *sharings* which are not of *degree*.
+
+    Each sharing is a list of integer shares like for
+    :func:`_verify_sharing`. All sharings are checked at once by
+    :func:`viff.shamir.verify_sharing_many`. This is run in a worker
+    process by :meth:`TriplesHyperinvertibleMatricesMixin.generate_triples`.
+    """
+    field = GF(modulus)
+    xs = [field(i+1) for i in range(len(sharings[0]))]
+    return shamir.verify_sharing_many(sharings, degree, xs)
+
+
+def _pack_strings(strings):
+    """Pack a list of strings into a single length-prefixed string."""
+    return "".join([pack("!I", len(s)) + s for s in strings])
+
+
+def _unpack_strings(data):
+    """Unpack a string packed with :func:`_pack_strings`.
+
+    Raises :exc:`ValueError` if the *data* is truncated.
+    """
+    strings = []
+    offset = 0
+    while offset < len(data):
+        if offset + 4 > len(data):
+            raise ValueError("Truncated length field")
+        size = unpack("!I", data[offset:offset+4])[0]
+        offset += 4
+        if offset + size > len(data):
+            raise ValueError("Truncated string")
+        strings.append(data[offset:offset+size])
+        offset += size
+    return strings
 
 
 class BrachaBroadcastMixin:
@@ -37,110 +89,185 @@ class BrachaBroadcastMixin:
     broadcast.
     """
 
-    def _broadcast(self, sender, message=None):
-        """Perform a Bracha broadcast.
+    def broadcast_many(self, senders, messages=None):
+        """Perform a batched Bracha broadcast.
 
-        A Bracha broadcast is reliable against an active adversary
-        corrupting up to t < n/3 of the players. For more details, see
-        the paper "An asynchronous [(n-1)/3]-resilient consensus
-        protocol" by G. Bracha in Proc. 3rd ACM Symposium on
-        Principles of Distributed Computing, 1984, pages 154-162.
+        Each player in *senders* broadcasts a list of strings. If this
+        player is one of the senders, its list must be given as
+        *messages*. All lists are broadcast in a single Bracha
+        instance.
+
+        Only the send messages carry the payload. The echo and ready
+        messages carry a SHA-1 digest of it, and the votes for each
+        digest are counted in a bitset of player IDs. A player who
+        delivers the digest for a sender without holding the matching
+        payload fetches it from the other players right away, so the
+        senders are fetched from independently of each other.
+
+        The result is a list with a :class:`Deferred` for each sender,
+        which yields the list of strings sent by that sender.
         """
+        assert messages is None or self.id in senders
+
         # We need a unique program counter for each call.
         self.increment_pc()
 
-        result = Deferred()
         pc = tuple(self.program_counter)
         n = self.num_players
         t = self.threshold
-
-        # For each distinct message (and program counter) we save a
-        # dictionary for each of the following variables. The reason
-        # is that we need to count for each distinct message how many
-        # echo and ready messages we have received.
-
-        bracha_echo = {}
-        bracha_ready = {}
-        bracha_sent_ready = {}
-        bracha_delivered = {}
-
-        def unsafe_broadcast(data_type, message):
+        results = dict((sender, Deferred()) for sender in senders)
+
+        # The payload received from each sender, the bitsets of the
+        # echo and ready votes for each (sender, digest), the senders
+        # we have sent a ready message for, and the digest delivered
+        # for each sender.
+        payloads = {}
+        echoes = {}
+        readies = {}
+        sent_ready = set()
+        delivered = {}
+
+        def unsafe_broadcast(data_type, message, pc=pc):
             # Performs a regular broadcast without any guarantees. In
             # other words, it sends the message to each player except
             # for this one.
-            for protocol in self.protocols.itervalues():
-                protocol.sendData(pc, data_type, message)
+            for peer_id, protocol in self.protocols.iteritems():
+                if peer_id != self.id:
+                    protocol.sendData(pc, data_type, message)
 
             # do actual communication
             self.activate_reactor()
 
-        def echo_received(message, peer_id):
+        def vote(votes, sender, digest, peer_id):
+            # Adds the vote of peer_id to the bitset and returns the
+            # number of votes, or None if the peer has voted already.
+            mask = votes.get((sender, digest), 0)
+            bit = 1 << peer_id
+            if mask & bit:
+                return None
+            mask |= bit
+            votes[(sender, digest)] = mask
+            return bin(mask).count("1")
+
+        def send_ready(sender, digest):
+            if sender not in sent_ready:
+                sent_ready.add(sender)
+                unsafe_broadcast(READY, pack("!I", sender) + digest)
+                ready_received(sender, digest, self.id)
+
+        def echo_received(sender, digest, peer_id):
             # This is called when we receive an echo message. It
-            # updates the echo count for the message and enters the
+            # updates the echo count for the digest and enters the
             # ready state if the count is high enough.
-            ids = bracha_echo.setdefault(message, [])
-            ready = bracha_sent_ready.setdefault(message, False)
+            count = vote(echoes, sender, digest, peer_id)
+            if count is not None and count >= ceil((n+t+1)/2):
+                send_ready(sender, digest)
 
-            if peer_id not in ids:
-                ids.append(peer_id)
-                if len(ids) >= ceil((n+t+1)/2) and not ready:
-                    bracha_sent_ready[message] = True
-                    unsafe_broadcast(READY, message)
-                    ready_received(message, self.id)
-
-        def ready_received(message, peer_id):
+        def ready_received(sender, digest, peer_id):
             # This is called when we receive a ready message. It
-            # updates the ready count for the message. Depending on
-            # the count, we may either stay in the same state or enter
-            # the ready or delivered state.
-            ids = bracha_ready.setdefault(message, [])
-            ready = bracha_sent_ready.setdefault(message, False)
-            delivered = bracha_delivered.setdefault(message, False)
-            if peer_id not in ids:
-                ids.append(peer_id)
-                if len(ids) == t+1 and not ready:
-                    bracha_sent_ready[message] = True
-                    unsafe_broadcast(READY, message)
-                    ready_received(message, self.id)
-
-                elif len(ids) == 2*t+1 and not delivered:
-                    bracha_delivered[message] = True
-                    result.callback(message)
-
-        def send_received(message):
-            # This is called when we receive a send message. We react
-            # by sending an echo message to each player. Since the
-            # unsafe broadcast doesn't send a message to this player,
-            # we simulate it by calling the echo_received function.
-            unsafe_broadcast(ECHO, message)
-            echo_received(message, self.id)
+            # updates the ready count for the digest. Depending on the
+            # count, we may enter the ready or delivered state.
+            count = vote(readies, sender, digest, peer_id)
+            if count is None:
+                return
+            if count >= t+1:
+                send_ready(sender, digest)
+            if count >= 2*t+1 and sender not in delivered:
+                delivered[sender] = digest
+                deliver(sender, payloads.get(sender))
+                fetch(sender, not results[sender].called)
+
+        def deliver(sender, payload):
+            # Delivers the payload if it matches the delivered digest.
+            # All honest players deliver the same payload, so they
+            # agree on failing if it is malformed.
+            if not results[sender].called and payload is not None \
+                    and sha1(payload).digest() == delivered.get(sender):
+                try:
+                    messages = _unpack_strings(payload)
+                except ValueError, e:
+                    results[sender].errback(e)
+                else:
+                    results[sender].callback(messages)
 
+        def send_received(payload, sender):
+            # This is called when we receive a send message. We react
+            # by sending an echo message with the digest to each
+            # player.
+            payloads[sender] = payload
+            digest = sha1(payload).digest()
+            unsafe_broadcast(ECHO, pack("!I", sender) + digest)
+            echo_received(sender, digest, self.id)
+            deliver(sender, payload)
+
+        def vote_received(data, handler, peer_id):
+            # Votes are a sender ID followed by a digest. Malformed
+            # votes and votes for unknown senders are ignored.
+            if len(data) == 4 + sha1().digest_size:
+                sender = unpack("!I", data[:4])[0]
+                if sender in results:
+                    handler(sender, data[4:], peer_id)
+
+        def fetch(sender, missing):
+            # Every player tells every other player whether it is
+            # missing the payload from the sender, or holds one which
+            # does not match the delivered digest. The fetch messages
+            # and the answers use a program counter for each sender.
+            # All honest players deliver the digest and get here, so
+            # the fetch messages expected from them all arrive.
+            sub_pc = pc + (sender,)
+            if missing:
+                for peer_id in self.players:
+                    if peer_id != self.id:
+                        d = Deferred().addCallback(deliver_fetched, sender)
+                        self._expect_data_with_pc(sub_pc, peer_id, PAYLOAD, d)
+            unsafe_broadcast(FETCH, missing and "\x01" or "\x00", sub_pc)
+
+        def fetch_received(data, sender, peer_id):
+            # Answer a request with the payload we got from the
+            # sender. The requester checks it against the digest.
+            if data == "\x01":
+                self.protocols[peer_id].sendData(pc + (sender,), PAYLOAD,
+                                                 payloads.get(sender, ""))
+                self.activate_reactor()
+
+        def deliver_fetched(payload, sender):
+            # Wrong payloads are ignored, the other players answer
+            # too.
+            deliver(sender, payload)
 
         # In the following we prepare to handle a send message from
-        # the sender and at most one echo and one ready message from
-        # each player.
+        # each sender, and one echo, one ready and one fetch message
+        # per sender from each player.
         for peer_id in self.players:
             if peer_id != self.id:
-                d_echo = Deferred().addCallback(echo_received, peer_id)
-                self._expect_data(peer_id, ECHO, d_echo)
-
-                d_ready = Deferred().addCallback(ready_received, peer_id)
-                self._expect_data(peer_id, READY, d_ready)
-
-        # If this player is the sender, we transmit a send message to
-        # each player. We send one to this player by calling the
-        # send_received function.
-        if self.id == sender:
-            unsafe_broadcast(SEND, message)
-            send_received(message)
-        else:
-            d_send = Deferred().addCallback(send_received)
-            self._expect_data(sender, SEND, d_send)
+                for sender in senders:
+                    d_echo = Deferred().addCallback(vote_received,
+                                                    echo_received, peer_id)
+                    self._expect_data(peer_id, ECHO, d_echo)
+
+                    d_ready = Deferred().addCallback(vote_received,
+                                                     ready_received, peer_id)
+                    self._expect_data(peer_id, READY, d_ready)
+
+                    d_fetch = Deferred().addCallback(fetch_received,
+                                                     sender, peer_id)
+                    self._expect_data_with_pc(pc + (sender,), peer_id,
+                                              FETCH, d_fetch)
+
+        for sender in senders:
+            if sender == self.id:
+                payload = _pack_strings(messages)
+                unsafe_broadcast(SEND, payload)
+                send_received(payload, sender)
+            else:
+                d_send = Deferred().addCallback(send_received, sender)
+                self._expect_data(sender, SEND, d_send)
 
         # do actual communication
         self.activate_reactor()
 
-        return result
+        return [results[sender] for sender in senders]
 
     def broadcast(self, senders, message=None):
         """Perform one or more Bracha broadcast(s).
@@ -158,16 +285,17 @@ class BrachaBroadcastMixin:
         the paper "An asynchronous [(n-1)/3]-resilient consensus
         protocol" by G. Bracha in Proc. 3rd ACM Symposium on
         Principles of Distributed Computing, 1984, pages 154-162.
+        All messages are sent in one instance of
+        :meth:`broadcast_many`.
         """
         assert message is None or self.id in senders
 
-        result = []
-
-        for sender in senders:
-            if sender == self.id:
-                result.append(self._broadcast(sender, message))
-            else:
-                result.append(self._broadcast(sender))
+        if message is None:
+            messages = None
+        else:
+            messages = [message]
+        result = [d.addCallback(lambda messages: messages[0])
+                  for d in self.broadcast_many(senders, messages)]
 
         if len(result) == 1:
             return result[0]
@@ -179,26 +307,24 @@ class TriplesHyperinvertibleMatricesMixin:
     """Mixin class which generates multiplication triples using
     hyperinvertible matrices."""
 
-    #: A hyper-invertible matrix.
-    #:
-    #: It should be suitable for :attr:`num_players` players, but
-    #: since we don't know the total number of players yet, we set it
-    #: to :const:`None` here and update it as necessary.
-    _hyper = None
-
     def _verify_single(self, shares, rvec, T, field, degree):
         """Verify shares.
 
         It is checked that they correspond to polynomial of the
-        expected degree.
+        expected degree. The check is done by :meth:`defer_to_pool`.
 
-        If the verification succeeds, the T shares are returned,
-        otherwise an exception is thrown.
+        Returns a :class:`Deferred` which will yield the T shares if
+        the verification succeeds, otherwise it fails.
         """
-        shares = map(lambda (i, s): (field(i+1), s), enumerate(shares))
-        assert shamir.verify_sharing(shares, degree), \
-               "Could not verify %s, degree %d" % (shares, degree)
-        return rvec[:T]
+        values = [s.value for s in shares]
+        result = self.defer_to_pool(_verify_sharing,
+                                    field.modulus, values, degree)
+
+        def check(verified):
+            assert verified, "Could not verify %s, degree %d" % (shares, degree)
+            return rvec[:T]
+        result.addCallback(check)
+        return result
 
     def _verify_double(self, shares, rvec1, rvec2, T, field, d1, d2):
         """Verify shares.
@@ -207,19 +333,22 @@ class TriplesHyperinvertibleMatricesMixin:
         expected degrees and that they can be recombined to the
         same value.
 
-        If the verification succeeds, the T double shares are
-        returned, otherwise an exception is thrown.
+        Returns a :class:`Deferred` which will yield the T double
+        shares if the verification succeeds, otherwise it fails.
         """
         si_1, si_2 = shares
-        self._verify_single(si_1, rvec1, T, field, d1)
-        self._verify_single(si_2, rvec2, T, field, d2)
-        si_1 = map(lambda (i, s): (field(i+1), s), enumerate(si_1))
-        si_2 = map(lambda (i, s): (field(i+1), s), enumerate(si_2))
-
-        assert shamir.recombine(si_1[:d1+1]) == shamir.recombine(si_2[:d2+1]), \
-            "Shares do not recombine to the same value"
-
-        return (rvec1[:T], rvec2[:T])
+        result = gatherResults([
+                self._verify_single(si_1, rvec1, T, field, d1),
+                self._verify_single(si_2, rvec2, T, field, d2)])
+
+        def check(_):
+            s1 = map(lambda (i, s): (field(i+1), s), enumerate(si_1))
+            s2 = map(lambda (i, s): (field(i+1), s), enumerate(si_2))
+            assert shamir.recombine(s1[:d1+1]) == shamir.recombine(s2[:d2+1]), \
+                "Shares do not recombine to the same value"
+            return (rvec1[:T], rvec2[:T])
+        result.addCallback(check)
+        return result
 
     def _exchange_single(self, svec, rvec, T, field, degree):
         """Exchange and (if possible) verify shares."""
@@ -287,12 +416,17 @@ class TriplesHyperinvertibleMatricesMixin:
 
     def _share_single(self, si, degree, field):
         inputters = range(1, self.num_players + 1)
-        if self._hyper is None:
-            self._hyper = hyper(self.num_players, field)
-
         svec = self.shamir_share(inputters, field, si, degree)
-        rvec = self._hyper * Matrix([svec]).transpose()
-        rvec = rvec.transpose().rows[0]
+
+        # The shares are multiplied with the hyper-invertible matrix
+        # when all of them have arrived.
+        rvec = [Share(self, field) for _ in inputters]
+
+        def apply_hyper(values):
+            product = hyper(self.num_players, field).mul_vectors([values])
+            for share, value in zip(rvec, product[0]):
+                share.callback(value)
+        gather_shares(svec).addCallback(apply_hyper)
         return svec, rvec
 
     def single_share_random(self, T, degree, field):
@@ -333,51 +467,148 @@ class TriplesHyperinvertibleMatricesMixin:
         # are no pre-processed triples left.
         return self.generate_triples(field, quantity=1, gather=False)[0]
 
+    def get_triple_vector(self, field, length):
+        """Return a vector of *length* multiplication triples.
+
+        The triples are generated in a single run of
+        :meth:`generate_triples` and gathered into three
+        :class:`~viff.runtime.SharedVector` objects.
+        """
+        triples = self.generate_triples(field, quantity=length, gather=False)
+        a, b, c = zip(*triples[:length])
+        return (self.gather_vector(a), self.gather_vector(b),
+                self.gather_vector(c))
+
     def generate_triples(self, field, quantity=None, gather=True):
         """Generate multiplication triples.
 
         These are random numbers *a*, *b*, and *c* such that ``c =
         ab``. This function can be used in pre-processing.
 
-        Returns a tuple with the number of triples generated and a
-        Deferred which will yield a list of 3-tuples.
+        Every player shares L random values for each of *a*, *b*, and
+        a double sharing *r*, where L is chosen such that the T*L
+        triples made cover *quantity*, with T = n - 2t. The shares are
+        sent to each player as one vector, mixed with a single product
+        with a hyper-invertible matrix, and the last 2t mixed sharings
+        of each kind are verified by players T+1, ..., n.
+
+        Returns a list of T*L Deferreds which will yield a list with
+        the three field elements of a triple. If *gather* is false a
+        list of triples of :class:`~viff.runtime.Share` objects is
+        returned instead.
         """
         n = self.num_players
         t = self.threshold
         T = n - 2*t
+        L = max(1, -(-(quantity or 1) // T))
+
+        # Our sharings of a, b, and r with degree t, followed by
+        # another sharing of r with degree 2t.
+        modulus = field.modulus
+        a, b, r = [[rand.randint(0, modulus - 1) for _ in range(L)]
+                   for _ in range(3)]
+        sharings = [shamir.share_many(a + b + r, t, n, field),
+                    shamir.share_many(r, 2*t, n, field)]
+
+        received = []
+        for (peer_id, shares_t), (_, shares_2t) in zip(*sharings):
+            received.append(self._exchange_share_vector(
+                    peer_id.value, field, shares_t + shares_2t))
+        received = gather_shares(received)
+
+        def verify(shares):
+            # The columns hold the shares of all players of each
+            # mixed sharing assigned to us.
+            columns = zip(*shares)
+            result = gatherResults([
+                    self.defer_to_pool(_verify_sharings, modulus,
+                                       columns[:3*L], t),
+                    self.defer_to_pool(_verify_sharings, modulus,
+                                       columns[3*L:], 2*t)])
+
+            def check((bad_t, bad_2t)):
+                bad = bad_t + [3*L + i for i in bad_2t]
+                assert not bad, \
+                    "Could not verify sharings %s from hyper-invertible " \
+                    "matrix" % bad
+                xs = [field(i) for i in range(1, n+1)]
+                r_t = zip(*columns[2*L:3*L])[:t+1]
+                r_2t = zip(*columns[3*L:])[:2*t+1]
+                assert shamir.recombine_many(zip(xs, r_t)) == \
+                    shamir.recombine_many(zip(xs, r_2t)), \
+                    "Shares do not recombine to the same value"
+            return result.addCallback(check)
+
+        def mix(shares):
+            # Row k of the product holds our shares of the mixed
+            # sharings with index k. We send rows T+1, ..., n to the
+            # players verifying them.
+            rows = zip(*hyper(n, field).mul_vectors(zip(*shares)))
+            pc = tuple(self.program_counter)
+            for k in range(T+1, n+1):
+                if k != self.id:
+                    row = [long(share.value) for share in rows[k-1]]
+                    self.protocols[k].sendShareVector(pc, field, row)
+
+            if self.id <= T:
+                return rows[:T]
+
+            checked = []
+            for peer_id in range(1, n+1):
+                if peer_id == self.id:
+                    row = [long(share.value) for share in rows[peer_id-1]]
+                    checked.append(Share(self, field, row))
+                else:
+                    checked.append(self._expect_share_vector(peer_id, field,
+                                                             4*L))
+            result = gather_shares(checked)
+            result.addCallback(verify)
+            result.addCallback(lambda _: rows[:T])
+            return result
 
-        def make_triple(shares, results):
-            a_t, b_t, (r_t, r_2t) = shares
-
-            c_2t = []
-            for i in range(T):
-                # Multiply a[i] and b[i] without resharing.
-                ci = gather_shares([a_t[i], b_t[i]])
-                ci.addCallback(lambda (ai, bi): ai * bi)
-                c_2t.append(ci)
-
-            d_2t = [c_2t[i] - r_2t[i] for i in range(T)]
-            d = [self.open(d_2t[i], threshold=2*t) for i in range(T)]
-            c_t = [r_t[i] + d[i] for i in range(T)]
-
-            if gather:
-                for triple, result in zip(zip(a_t, b_t, c_t), results):
-                    gatherResults(triple).chainDeferred(result)
-            else:
-                for triple, result_triple in zip(zip(a_t, b_t, c_t), results):
-                    for item, result_item in zip(triple, result_triple):
-                        item.chainDeferred(result_item)
+        def multiply(rows):
+            # Multiply a and b without resharing and open the product
+            # minus r with threshold 2t.
+            a_t, b_t, r_t, r_2t = [sum([list(row[i*L:(i+1)*L])
+                                         for row in rows], [])
+                                   for i in range(4)]
+            d_2t = [long((x * y - z).value)
+                    for x, y, z in zip(a_t, b_t, r_2t)]
+            d = self.open_vector(SharedVector(self, field, T*L, d_2t),
+                                 threshold=2*t)
+            d.addCallback(lambda d: zip(a_t, b_t,
+                                        [x + y for x, y in zip(r_t, d)]))
+            return d
+
+        def finish(triples):
+            for triple, result in zip(triples, results):
+                if gather:
+                    result.callback(list(triple))
+                else:
+                    for item, result_item in zip(triple, result):
+                        result_item.callback(item)
 
-        single_a = self.single_share_random(T, t, field)
-        single_b = self.single_share_random(T, t, field)
-        double_c = self.double_share_random(T, t, 2*t, field)
+        def fail(failure):
+            for result in results:
+                if gather:
+                    result.errback(failure)
+                else:
+                    for result_item in result:
+                        result_item.errback(failure)
 
         if gather:
-            results = [Deferred() for i in range(T)]
+            results = [Deferred() for _ in range(T*L)]
         else:
-            results = [[Share(self, field) for i in range(3)] for i in range(T)]
+            results = [[Share(self, field) for _ in range(3)]
+                       for _ in range(T*L)]
+
+        self.schedule_callback(received, mix)
+        self.schedule_callback(received, multiply)
+        received.addCallbacks(finish, fail)
+
+        # do actual communication
+        self.activate_reactor()
 
-        self.schedule_callback(gatherResults([single_a, single_b, double_c]), make_triple, results)
         return results
 
 class TriplesPRSSMixin:
@@ -420,6 +651,24 @@ class TriplesPRSSMixin:
         else:
             return zip(a_t, b_t, c_t)
 
+    def get_triple_vector(self, field, length):
+        """Generate a vector of *length* multiplication triples using
+        PRSS.
+
+        Returns three :class:`~viff.runtime.SharedVector` objects *a*,
+        *b*, and *c* with ``c[i] = a[i] * b[i]``. Only a single
+        vector is opened, no matter the length.
+        """
+        a_t = self.prss_share_random_vector(field, length)
+        b_t = self.prss_share_random_vector(field, length)
+        r_t, r_2t = self.prss_double_share_vector(field, length)
+
+        # Multiply a and b without resharing.
+        c_2t = self._vector_op(a_t, b_t, _vector_mul)
+        d = self.open_vector(c_2t - r_2t, threshold=2*self.threshold)
+        c_t = r_t + d
+        return a_t, b_t, c_t
+
 
 class BasicActiveRuntime(PassiveRuntime):
     """Basic runtime secure against active adversaries.
@@ -435,6 +684,9 @@ class BasicActiveRuntime(PassiveRuntime):
     def get_triple(self, field):
         raise NotImplementedError
 
+    def get_triple_vector(self, field, length):
+        raise NotImplementedError
+
     def mul(self, share_x, share_y):
         """Multiplication of shares.
 
@@ -471,6 +723,39 @@ class BasicActiveRuntime(PassiveRuntime):
         result.addCallback(lambda (d,e): d*e + d*b + e*a + c)
         return result
 
+    def mul_vector(self, vector_x, vector_y):
+        """Element-wise multiplication of shared vectors.
+
+        Works like :meth:`mul`, but uses a vector of triples from
+        :meth:`get_triple_vector` and opens two vectors in total.
+
+        Preprocessing: *length* multiplication triples.
+        Communication: 2 vector openings.
+        """
+        assert isinstance(vector_x, SharedVector), \
+            "vector_x must be a SharedVector."
+
+        if not isinstance(vector_y, SharedVector):
+            # Local multiplication.
+            return PassiveRuntime.mul_vector(self, vector_x, vector_y)
+
+        assert len(vector_x) == len(vector_y), "Vector lengths differ."
+        field = vector_x.field
+        length = len(vector_x)
+        if length == 0:
+            return SharedVector(self, field, 0, [])
+
+        a, b, c = self.get_triple_vector(field, length)
+        d = self.open_vector(vector_x - a)
+        e = self.open_vector(vector_y - b)
+
+        # The opened d and e are public, so the products below are
+        # all local.
+        de = gatherResults([d, e])
+        de.addCallback(lambda (d, e): _vector_mul(field, map(long, d),
+                                                  map(long, e)))
+        return b * d + a * e + c + de
+
 
 class ActiveRuntime(TriplesPRSSMixin, BasicActiveRuntime):
     """Default mix of :class:`BasicActiveRuntime` and
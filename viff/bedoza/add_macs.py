@@ -20,7 +20,7 @@ import struct
 from twisted.internet.defer import gatherResults
 from viff.runtime import Share
 
-from viff.bedoza.util import _send, fast_pow
+from viff.bedoza.util import _send_longs, fast_pow
 from viff.bedoza.keylist import BeDOZaKeyList
 from viff.bedoza.maclist import BeDOZaMACList
 
@@ -40,27 +40,11 @@ def add_macs(runtime, field, u_bound, alpha, random, paillier, partial_shares):
     runtime.increment_pc() # Huh!?
 
     def do_add_macs(partial_share_contents, result_shares):
-        """The transmission_restraint_constant is the number of
-        encrypted shares we can safely transmit in one call to
-        sendData. The sendData method can only transmit up to
-        65536 bytes.
-        The constant has been imperically determined by running
-        TripleGenerator.generate_triples.
-        TODO: How can we allow a user of the runtime to adjust this
-        constraint at a higher level of abstraction?
-        """
-        transmission_restraint_constant = 50
-        
         num_players = runtime.num_players
 
-        list_of_player_to_enc_shares_lists = []
-        
         player_to_mac_keys = [ [] for x in runtime.players]
         player_to_enc_shares = [ [] for x in runtime.players]
         for inx, partial_share_content in enumerate(partial_share_contents):
-            if inx % transmission_restraint_constant == 0:
-                player_to_enc_shares = [ [] for x in runtime.players]
-                list_of_player_to_enc_shares_lists.append(player_to_enc_shares)
             for j in xrange(num_players):
                 # TODO: This is probably not the fastes way to generate
                 # the betas.
@@ -74,20 +58,10 @@ def add_macs(runtime, field, u_bound, alpha, random, paillier, partial_shares):
                 player_to_enc_shares[j].append(c)
                 player_to_mac_keys[j].append(field(beta))
 
-        received_cs = []
-        for ls in list_of_player_to_enc_shares_lists:
-            received_cs.append(_send(runtime, ls, deserialize=eval))
-
-        def merge(received_cs):
-            r = [ [] for x in xrange(len(received_cs[0]))]
-            for ls in received_cs:
-                for inx, xs in enumerate(ls):
-                    r[inx] += xs
-            return r
+        received_cs = _send_longs(runtime, player_to_enc_shares)
 
         def finish_sharing(recevied_cs, partial_share_contents,
                            lists_of_mac_keys, result_shares):
-            recevied_cs = merge(recevied_cs)
             shares = []               
             for inx in xrange(0, len(partial_share_contents)):
                 mac_keys = []
@@ -105,7 +79,7 @@ def add_macs(runtime, field, u_bound, alpha, random, paillier, partial_shares):
                                         mac_msg_list))
             return shares
 
-        runtime.schedule_callback(gatherResults(received_cs),
+        runtime.schedule_callback(received_cs,
                                   finish_sharing,
                                   partial_share_contents,
                                   player_to_mac_keys,
@@ -24,6 +24,7 @@ from viff.runtime import Share, ShareList, gather_shares
 from viff.field import FieldElement
 from viff.constants import TEXT
 from viff.simplearithmetic import SimpleArithmeticRuntime
+from viff.paillier import RandomizerPoolMixin
 
 from viff.hash_broadcast import HashBroadcastMixin
 
@@ -95,31 +96,29 @@ class BeDOZaMixin(HashBroadcastMixin, ShareGenerator):
             pc = tuple(self.program_counter)
             keyLists = []
             for other_id in receivers:
-                message_string = ""
+                message = []
                 for inx, beDOZaContents in enumerate(ls):
                     keyLists.append(beDOZaContents.get_keys())
-                    message_string += "%s:%s;" % \
-                           (beDOZaContents.get_value().value,
-                            beDOZaContents.get_mac(other_id - 1).value)
-                self.protocols[other_id].sendData(pc, TEXT, message_string)
+                    message.append(beDOZaContents.get_value().value)
+                    message.append(beDOZaContents.get_mac(other_id - 1).value)
+                self.protocols[other_id].sendLongs(pc, TEXT, message)
 
             if self.id in receivers:
-                def deserialize(s):
-                    def field_long(x):
-                        return field(long(x))
-                    xs = s[0:-1].split(';')
-                    ys = [x.split(':') for x in xs]
-                    return [map(field_long, xs) for xs in ys]
+                def deserialize(xs):
+                    # Pairs of a value and a MAC.
+                    return [(field(xs[i]), field(xs[i + 1]))
+                            for i in xrange(0, len(xs), 2)]
                 num_players = len(self.players.keys())
                 values = num_players * [None]
                 for inx, other_id in enumerate(self.players.keys()):
                     d = Deferred()
                     d.addCallbacks(deserialize, self.error_handler)
-                    self._expect_data(other_id, TEXT, d)
+                    self._expect_longs(other_id, TEXT, d)
                     values[inx] = d
                 result = gatherResults(values)
-                result.addCallbacks(recombine_value, self.error_handler,
-                                    callbackArgs=(keyLists, len(shares)))
+                self.schedule_callback(result, recombine_value, keyLists,
+                                       len(shares))
+                result.addErrback(self.error_handler)
                 return result
 
         result = gather_shares(shares)
@@ -271,8 +270,9 @@ class BeDOZaMixin(HashBroadcastMixin, ShareGenerator):
                     values[inx] =  self._expect_share(other_id, field)
                     codes[inx] = self._expect_share(other_id, field)
                 result = gatherResults(values + codes)
-                result.addCallbacks(recombine_value, self.error_handler,
-                                    callbackArgs=(shareContent.get_keys(),))
+                self.schedule_callback(result, recombine_value,
+                                       shareContent.get_keys())
+                result.addErrback(self.error_handler)
                 return result
 
         result = share.clone()
@@ -322,7 +322,8 @@ class BeDOZaMixin(HashBroadcastMixin, ShareGenerator):
         return x.cmul(c)
 
 
-class BeDOZaRuntime(BeDOZaMixin, SimpleArithmeticRuntime):
+class BeDOZaRuntime(BeDOZaMixin, RandomizerPoolMixin,
+                    SimpleArithmeticRuntime):
     """The BeDOZa runtime.
 
     The runtime is used for sharing values (:meth:`secret_share` or
@@ -351,3 +352,20 @@ class BeDOZaRuntime(BeDOZaMixin, SimpleArithmeticRuntime):
         SimpleArithmeticRuntime.__init__(self, player, threshold, options)
         self.threshold = self.num_players - 1
         self.triples = triples
+        self.start_randomizer_pool()
+
+    @staticmethod
+    def add_options(parser):
+        SimpleArithmeticRuntime.add_options(parser)
+        RandomizerPoolMixin.add_randomizer_pool_options(parser)
+        HashBroadcastMixin.add_hash_broadcast_options(parser)
+
+    def add_player(self, player, protocol):
+        SimpleArithmeticRuntime.add_player(self, player, protocol)
+        self.register_randomizers(player)
+
+    def shutdown(self):
+        result = self.shutdown_checkpoint()
+        result.addCallback(lambda _: SimpleArithmeticRuntime.shutdown(self))
+        result.addCallback(lambda _: self.stop_randomizer_pool())
+        return result
@@ -27,7 +27,7 @@ from twisted.internet.defer import Deferred, gatherResults, succeed
 from viff.runtime import Runtime, ShareList, gather_shares
 from viff.field import FieldElement, GF
 from viff.constants import TEXT
-from viff.util import rand
+from viff.util import rand, pack_longs, unpack_longs
 from viff.bedoza.shares import BeDOZaShare, BeDOZaShareContents, PartialShare
 from viff.bedoza.shares import PartialShareContents
 from viff.bedoza.share_generators import PartialShareGenerator
@@ -105,13 +105,48 @@ class TripleGenerator(object):
         Data sent over the network is packaged in large hunks in order
         to optimize. TODO: Explain better.
 
-        TODO: This method needs to have enough RAM to represent all n
-        triples in memory at the same time. Is there a nice way to
-        stream this, e.g. by using Python generators?
+        This method needs enough RAM to represent all the triples in
+        memory at the same time. Use :meth:`generate_triple_stream` to
+        generate many triples with bounded memory.
 
         """
         return self._generate_triples(self.security_parameter)
 
+    def generate_triple_stream(self, number_of_triples, consumer,
+                               window=None):
+        """Generate *number_of_triples* triples in windows.
+
+        The triples are generated, MACed, and verified *window* at a
+        time, by default *self.security_parameter* at a time. When a
+        window is done, *consumer* is called with a list of the
+        verified viff.triple.Triple objects. The next window is not
+        started before the consumer returns, or, if it returns a
+        deferred, before that deferred fires. Only a single window is
+        kept in memory, so the consumer should store or use the
+        triples before it returns.
+
+        Returns a deferred that will yield *number_of_triples* when
+        all windows have been consumed.
+        """
+        if window is None:
+            window = self.security_parameter
+        assert window > 0, "Window must be positive."
+        result = Deferred()
+
+        def next_window(_, remaining):
+            if remaining == 0:
+                result.callback(number_of_triples)
+                return
+            size = min(window, remaining)
+            triples = gatherResults(self._generate_triples(size))
+            self.runtime.schedule_callback(triples, consumer)
+            self.runtime.schedule_callback(triples, next_window,
+                                           remaining - size)
+            triples.addErrback(result.errback)
+
+        next_window(None, number_of_triples)
+        return result
+
 
     def _generate_triples(self, number_of_triples):
         self.runtime.increment_pc()
@@ -187,8 +222,7 @@ class TripleGenerator(object):
             return Triple(a, b, c)
 
         def prepare_verification(rs_serialized, results):
-            # Repr/eval deserialization.
-            rs = [eval(rss) for rss in rs_serialized]
+            rs = [unpack_longs(rss) for rss in rs_serialized]
 
             for i in xrange(n):
                 a = triple_candidates[i]
@@ -222,11 +256,9 @@ class TripleGenerator(object):
         results = [Deferred() for _ in xrange(n)]
 
         ri = [self.random.randint(0, self.p - 1) for _ in xrange(n)]
-        # TODO: We use repr/eval as simple marshalling. Should be
-        # factored out and maybe optimized by using better compression
-        # here.
         ris = self.runtime.broadcast(
-            self.runtime.players.keys(), self.runtime.players.keys(), repr(ri))
+            self.runtime.players.keys(), self.runtime.players.keys(),
+            pack_longs(ri))
         ris = gatherResults(ris)
         self.runtime.schedule_callback(ris, prepare_verification, results)     
         ris.addErrback(err_handler)
@@ -258,23 +290,7 @@ class TripleGenerator(object):
         Returns a deferred which will yield a list of field elements.
         """
         CKIND = 1
- 
-        """The transmission_restraint_constant is the number of
-        encrypted shares we can safely transmit in one call to
-        sendData. The sendData method can only transmit up to
-        65536 bytes.
-        The constant has been imperically determined by running
-        TripleGenerator.generate_triples.
-        TODO: How can we allow a user of the runtime to adjust this
-        constraint at a higher level of abstraction?
-
-        """
-        transmission_restraint_constant = 425
 
-        number_of_packets = n / transmission_restraint_constant
-        if n % transmission_restraint_constant != 0:
-            number_of_packets += 1
-        
         self.runtime.increment_pc()
 
         pc = tuple(self.runtime.program_counter)
@@ -283,41 +299,33 @@ class TripleGenerator(object):
         zis = []
         if self.runtime.id == inx:
             Nj_square = self.paillier.get_modulus_square(jnx)
-            all_cs = []
-            for iny, (ai, cj) in enumerate(zip(ais, cjs)):
-                if iny % transmission_restraint_constant == 0:
-                    cs = []
-                    all_cs.append(cs)
+            cs = []
+            for ai, cj in zip(ais, cjs):
                 u = rand.randint(0, self.u_bound)
                 Ej_u = self.paillier.encrypt(u, jnx)
                 cs.append( (fast_pow(cj, ai.value, Nj_square) * Ej_u) % Nj_square )
                 zi = self.Zp(-u)
                 zis.append(zi)
-                
-            for cs in all_cs:
-                self.runtime.protocols[jnx].sendData(pc, CKIND, str(cs))
+
+            self.runtime.protocols[jnx].sendLongs(pc, CKIND, cs)
 
         if self.runtime.id == jnx:
-            all_cs = []
-            for _ in xrange(number_of_packets):
-                cs = Deferred()
-                self.runtime._expect_data(inx, CKIND, cs)
-                all_cs.append(cs)
-                
-            def decrypt(all_cs, pc, zis):
-                zjs = []
-                cs = reduce(lambda x, y: x + eval(y), all_cs, [])
-                for iny, c in enumerate(cs):
-                    t = self.paillier.decrypt(c)
-                    zj = self.Zp(t)
-                    zjs.append(zj)
+            cs = Deferred()
+            self.runtime._expect_longs(inx, CKIND, cs)
+
+            def decrypt(cs, pc, zis):
+                result = self.paillier.decrypt_many(cs)
+                result.addCallback(combine, zis)
+                return result
+
+            def combine(ts, zis):
+                zjs = [self.Zp(t) for t in ts]
                 if not zis == []:
                     return [x + y for x, y in zip(zis, zjs)]
                 else:
-                    return zjs 
-            all_cs_d = gatherResults(all_cs)
-            all_cs_d.addCallback(decrypt, pc, zis)
-            deferred = all_cs_d
+                    return zjs
+            cs.addCallback(decrypt, pc, zis)
+            deferred = cs
         else:
             zis_deferred = Deferred()
             zis_deferred.callback(zis)
@@ -374,8 +382,12 @@ class TripleGenerator(object):
                     s.callback(v)
                 return None
             
-            d.addCallback(lambda values: generate_partial_share_contents(
-                    values, self.runtime, self.paillier, self.k, self.zk_random))
+            # The partial shares are broadcast, so this must happen
+            # with the same program counter for all players.
+            self.runtime.schedule_callback(
+                d, lambda values: generate_partial_share_contents(
+                    values, self.runtime, self.paillier, self.k,
+                    self.zk_random))
             d.addCallback(callBackPartialShareContents, result_shares)
             return d
         result_shares = [PartialShare(self.runtime, self.Zp) for _ in a]
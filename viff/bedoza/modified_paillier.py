@@ -15,15 +15,35 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
 
-from gmpy import gcd
+from gmpy import gcd, mpz
+
+from twisted.internet.defer import succeed
+
+from viff import paillier
 
 try:
     import pypaillier
 except ImportError:
-    # The pypaillier module is not released yet, so we cannot expect
-    # the import to work.
-    print "Error: The pypaillier module or one of the used functions " \
-        "are not available."
+    # The pypaillier module is not released yet. Fall back to the
+    # Paillier implementation in VIFF.
+    pypaillier = paillier
+
+
+def _f_inverse(y, n):
+    if 0 <= y <= (n - 1) / 2:
+        return y
+    else:
+        return y - n
+
+
+def _decrypt_many(enc_values, seckey, n):
+    """Decrypt each of *enc_values* with the VIFF implementation.
+
+    This is run in a worker process by
+    :meth:`ModifiedPaillier.decrypt_many`.
+    """
+    return [_f_inverse(paillier.decrypt(c, seckey), n) for c in enc_values]
+
 
 class ModifiedPaillier(object):
     """A slight modification of the Paillier cryptosystem.
@@ -45,10 +65,7 @@ class ModifiedPaillier(object):
             return n + x
 
     def _f_inverse(self, y, n):
-        if 0 <= y <= (n - 1) / 2:
-            return y
-        else:
-            return y - n
+        return _f_inverse(y, n)
 
 
     def encrypt_r(self, value, player_id=None, random_elm=None):
@@ -63,7 +80,7 @@ class ModifiedPaillier(object):
         pseudo-random generator given when the ModifiedPaillier object
         was constructed.
         """
-        assert isinstance(value, int) or isinstance(value, long), \
+        assert isinstance(value, (int, long, type(mpz(0)))), \
             "paillier: encrypts only integers and longs, got %s" % \
                 value.__class__
         if not player_id:
@@ -75,6 +92,23 @@ class ModifiedPaillier(object):
             "paillier: plaintext %d outside legal range [-(n-1)/2 " \
             "; (n-1)/2] = [%d ; %d]"  % (value, min, max)
 
+        pubkey = self.runtime.players[player_id].pubkey
+        if random_elm == None and pypaillier is paillier:
+            # The random element and its n'th power are taken from
+            # the randomizer pool or, if asked for, computed using
+            # fixed-base tables, saving an exponentiation.
+            pool = getattr(self.runtime, 'randomizer_pool', None)
+            options = getattr(self.runtime, 'options', None)
+            if pool is not None:
+                random_elm, rn = pool.get(pubkey, self.random)
+            elif getattr(options, 'fixed_base_randomizers', False):
+                random_elm, rn = paillier.fixed_base_randomizer(pubkey,
+                                                                self.random)
+            else:
+                random_elm, rn = paillier.randomizer(pubkey, self.random)
+            return random_elm, paillier.encrypt_rn(self._f(value, n), rn,
+                                                   pubkey)
+
         # Here we verify that random_elm is either None or in Zn*. But
         # for realistical parameters, we can save time by not doing
         # this, since for large n = pq, it is extremely unlikely that
@@ -87,7 +121,6 @@ class ModifiedPaillier(object):
         elif not gcd(random_elm, n) == 1:
             raise Exception("Random element must be an element in Zn*")
 
-        pubkey = self.runtime.players[player_id].pubkey
         return random_elm, pypaillier.encrypt_r(
             self._f(value, n), random_elm, pubkey)
 
@@ -104,7 +137,7 @@ class ModifiedPaillier(object):
 
     def decrypt(self, enc_value):
         """Decrypt using own private key."""
-        assert isinstance(enc_value, int) or isinstance(enc_value, long), \
+        assert isinstance(enc_value, (int, long, type(mpz(0)))), \
             "paillier decrypts only longs, got %s" % enc_value.__class__
         n = self.runtime.players[self.runtime.id].pubkey['n']
         n_square = self.runtime.players[self.runtime.id].pubkey['n_square']
@@ -114,6 +147,21 @@ class ModifiedPaillier(object):
         seckey = self.runtime.players[self.runtime.id].seckey
         return self._f_inverse(pypaillier.decrypt(enc_value, seckey), n)
 
+    def decrypt_many(self, enc_values):
+        """Decrypt a list of values using own private key.
+
+        Returns a deferred which will yield the list of plaintexts.
+        With the VIFF Paillier implementation the decryptions are done
+        by :meth:`~viff.runtime.Runtime.defer_to_pool`.
+        """
+        if pypaillier is not paillier:
+            # The pypaillier keys cannot be sent to a worker process.
+            return succeed(map(self.decrypt, enc_values))
+        n = self.runtime.players[self.runtime.id].pubkey['n']
+        seckey = self.runtime.players[self.runtime.id].seckey
+        return self.runtime.defer_to_pool(_decrypt_many, enc_values,
+                                          seckey, n)
+
     def get_modulus(self, player_id):
         return self.runtime.players[player_id].pubkey['n']
 
@@ -19,7 +19,8 @@ from gmpy import mpz
 
 from twisted.internet.defer import gatherResults
 
-from viff.bedoza.zero_knowledge import ZKProof
+from viff.util import pack_longs, unpack_longs
+from viff.bedoza.zero_knowledge import ZKProof, verify_proofs
 from viff.bedoza.shares import PartialShareContents
 
 def generate_partial_share_contents(field_elements, runtime, paillier, k, random):
@@ -61,10 +62,10 @@ def generate_partial_share_contents(field_elements, runtime, paillier, k, random
        
     list_of_enc_shares = runtime.broadcast(
         runtime.players.keys(), runtime.players.keys(),
-        str(list_of_enc_shares))
+        pack_longs(list_of_enc_shares))
 
-    def construct_partial_shares(zk_results, list_of_enc_shares, field_elements):
-        if False in zk_results:
+    def construct_partial_shares(zk_result, list_of_enc_shares, field_elements):
+        if not zk_result:
             raise Exception("Zero-knowledge proof failed")
         reordered_encrypted_shares = [[] for _ in list_of_enc_shares[0]]
         for enc_shares in list_of_enc_shares:
@@ -78,8 +79,8 @@ def generate_partial_share_contents(field_elements, runtime, paillier, k, random
         return partial_share_contents
 
     def do_zk_proofs(list_of_enc_shares, field_elements):
-        zk_results = []
-        list_of_enc_shares = [eval(x) for x in list_of_enc_shares]
+        zk_proofs = []
+        list_of_enc_shares = [unpack_longs(x) for x in list_of_enc_shares]
 
         # We expect all players to broadcast the same number of
         # encrypted shares.
@@ -94,9 +95,8 @@ def generate_partial_share_contents(field_elements, runtime, paillier, k, random
             zk_proof = ZKProof(
                 len(field_elements), i + 1, k, runtime, list_of_enc_shares[i],
                 random=random, x=x, r=r, paillier=paillier)
-            zk_result = zk_proof.start()
-            zk_results.append(zk_result)
-        d = gatherResults(zk_results)
+            zk_proofs.append(zk_proof)
+        d = verify_proofs(runtime, zk_proofs)
         runtime.schedule_callback(
             d, construct_partial_shares, list_of_enc_shares, field_elements)
         return d
@@ -44,6 +44,29 @@ def _send(runtime, vals, serialize=str, deserialize=int):
     result = gatherResults(values)
     return result
 
+def _send_longs(runtime, vals):
+    """Send the list of integers vals[i] to player i + 1. Returns
+    deferred list of the lists received.
+
+    The lists may be of any length, see
+    :meth:`viff.runtime.ShareExchanger.sendLongs`.
+    """
+    runtime.increment_pc()
+
+    pc = tuple(runtime.program_counter)
+    for p in runtime.players:
+        runtime.protocols[p].sendLongs(pc, TEXT, vals[p - 1])
+    def err_handler(err):
+        print err
+    values = []
+    for p in runtime.players:
+        d = Deferred()
+        d.addErrback(err_handler)
+        runtime._expect_longs(p, TEXT, d)
+        values.append(d)
+    result = gatherResults(values)
+    return result
+
 def _convolute(runtime, val, serialize=str, deserialize=int):
     """As send, but sends the same val to all players."""
     return _send(runtime, [val] * runtime.num_players,
@@ -62,6 +85,22 @@ def _send_gf_elm(runtime, vals):
 def fast_pow(a, b, modulus):
     return long(pow(mpz(a), b, modulus))
 
+def multi_pow(bases, exponents, modulus):
+    """Returns the product of bases[i]**exponents[i] modulo modulus.
+
+    The exponents must be non-negative. The powers are computed
+    together so that they share the squarings, which pays off for
+    many bases with short exponents.
+    """
+    result = mpz(1)
+    bits = max([long(e) for e in exponents] + [0]).bit_length()
+    for i in reversed(xrange(bits)):
+        result = result * result % modulus
+        for base, exponent in zip(bases, exponents):
+            if (exponent >> i) & 1:
+                result = result * base % modulus
+    return result
+
 
 def rand_int_signed(random, lim):
     """Returns a pseudo-uniformly distributed random integer a
@@ -19,8 +19,45 @@ from gmpy import mpz, digits
 
 import hashlib
 
+from viff import paillier
 from viff.runtime import gatherResults
-from viff.bedoza.util import rand_int_signed
+from viff.util import rand, pack_longs, unpack_longs
+from viff.bedoza.util import rand_int_signed, multi_pow
+
+
+def _check_proofs(proofs):
+    """Check the values of *proofs*, stopping at the first failure.
+
+    This is run in a worker process by :func:`verify_proofs`.
+    """
+    for proof in proofs:
+        if not proof._check():
+            return False
+    return True
+
+
+def verify_proofs(runtime, proofs):
+    """Execute several zero-knowledge proofs and verify them together.
+
+    All players must construct the same *proofs* in the same order.
+    The proofs are broadcast one by one, but the proofs from the other
+    players are checked together in a single job using
+    :meth:`viff.runtime.Runtime.defer_to_pool`. The check stops as
+    soon as one of the proofs fails.
+
+    Returns a deferred evaluating to True if all proofs succeed and
+    False otherwise.
+    """
+    for proof in proofs:
+        if runtime.id == proof.prover_id:
+            proof._generate_proof()
+    received = [proof._receive_proof() for proof in proofs]
+    others = [proof for proof in proofs if proof.prover_id != runtime.id]
+    result = gatherResults(received)
+    runtime.schedule_callback(result, lambda _: runtime.defer_to_pool(
+            _check_proofs, others))
+    return result
+
 
 class ZKProof(object):
     """Zero-knowledge protocol used as part of the Share protocol.
@@ -31,7 +68,11 @@ class ZKProof(object):
     he knows the plaintexts x[j] and that the x[i]'s are of limited
     size, e.g. that abs(x[i]) <= 2**k.
     """
-    
+
+    #: Bit length of the random exponents used when the verifier
+    #: checks the equations of the proof together.
+    batch_bits = 40
+
     def __init__(self, s, prover_id, k, runtime, c, random=None, paillier=None, x=None, r=None):
         """
         random: a random source (e.g. viff.util.Random)
@@ -71,40 +112,67 @@ class ZKProof(object):
 
         The result also evaluates to True or False as above for the
         proving player, even though this is not needed.
+
+        Use :func:`verify_proofs` to verify several proofs together.
         """
-        if self.runtime.id == self.prover_id:
-            self._generate_proof()
-        deferred_proof = self._get_proof_broadcasted_by_prover()
-        self.runtime.schedule_callback(deferred_proof, self._verify_proof)
-        return deferred_proof
+        return verify_proofs(self.runtime, [self])
 
     def _generate_proof(self):
         self._generate_u_v_and_d()
         self._generate_e()
         self._generate_Z_and_W()
 
-    def _verify_proof(self, serialized_proof):
+    def __getstate__(self):
+        # The proof is sent to a worker process without the runtime.
+        state = self.__dict__.copy()
+        for name in ('runtime', 'paillier', 'random'):
+            state[name] = None
+        return state
+
+    def _receive_proof(self):
+        deferred_proof = self._get_proof_broadcasted_by_prover()
+        self.runtime.schedule_callback(deferred_proof, self._prepare_check)
+        return deferred_proof
+
+    def _prepare_check(self, serialized_proof):
         # The prover don't need to prove to himself.
         if self.runtime.id == self.prover_id:
-            return True
+            return
         self._deserialize_proof(serialized_proof)
         self._generate_e()
-        temp = self._vec_pow_E(self.c, self.prover_n2)
-        S = self._vec_mul(self.d, temp, self.prover_n2)
-        T = [mpz(self.paillier.encrypt(int(self.Z[j]), player_id=self.prover_id, random_elm=int(self.W[j])))
-             for j in range(self.m)]
-        for j in xrange(self.m):
-            # TODO: Return false if S[j] != T[j].
-            if S[j] != T[j]:
-                # TODO: Proof failed, return false!
-                pass
-            if abs(self.Z[j]) > 2**(2 * self.k):
-                # TODO: Proof failed, return false!
-                pass
-
-        # TODO: Fix zero-knowledge proof!!!
-        return True
-        
+        # Only the numbers in the key are needed for verification,
+        # the key may also hold precomputed tables.
+        pubkey = self.runtime.players[self.prover_id].pubkey
+        self.prover_pubkey = dict((key, pubkey[key])
+                                  for key in ('n', 'g', 'n_square'))
+        # The exponents must be unknown to the prover when the proof
+        # is made, so they are chosen by the verifier.
+        self.rho = [rand.getrandbits(self.batch_bits)
+                    for _ in xrange(self.m)]
+
+    def _check(self):
+        """Return True if S[j] == T[j] and Z[j] is at most 2**(s + 2k)
+        for all j.
+
+        Here S[j] is d[j] * c**E[j] and T[j] is the modified Paillier
+        encryption of Z[j] using W[j] as random element. Instead of
+        computing the m encryptions, both sides are raised to the
+        random exponents rho[j] and multiplied together. This costs
+        one full exponentiation instead of m, and a false proof is
+        accepted with probability about 2**-batch_bits.
+        """
+        n, n2 = self.prover_n, self.prover_n2
+        # An honest Z[j] = u[j] + (xE)[j] is at most 2**(2k) + s * 2**k
+        # in absolute value.
+        bound = 2**(self.s + 2 * self.k)
+        for z in self.Z:
+            if abs(z) > bound:
+                return False
+        S = self._vec_mul(self.d, self._vec_pow_E(self.c, n2), n2)
+        z = sum([rho * z for rho, z in zip(self.rho, self.Z)]) % n
+        w = multi_pow(self.W, self.rho, n2)
+        return multi_pow(S, self.rho, n2) == \
+            paillier.encrypt_r(z, w, self.prover_pubkey)
 
     def _generate_u_v_and_d(self):
         self.u, self.v, self.d = [], [], []
@@ -123,21 +191,19 @@ class ZKProof(object):
     def _get_proof_broadcasted_by_prover(self):
         serialized_proof = None
         if self.runtime.id == self.prover_id:
-            # TODO: Should we somehow compress message for improved
-            # performance?
             serialized_proof = self._serialize_proof()
         deferred_proof = self._broadcast(serialized_proof)
         return deferred_proof
 
     def _serialize_proof(self):
-        return repr([self.d, self.Z, self.W])
+        return pack_longs(self.d + self.Z + self.W)
 
     def _deserialize_proof(self, serialized_proof):
-        # We remove quotes before evaluation in order to get a list.
-        proof = eval(serialized_proof[1:-1])
-        self.d = proof[0]
-        self.Z = proof[1]
-        self.W = proof[2]
+        proof = [mpz(v) for v in unpack_longs(serialized_proof)]
+        assert len(proof) == 3 * self.m, "Malformed proof"
+        self.d = proof[:self.m]
+        self.Z = proof[self.m:2 * self.m]
+        self.W = proof[2 * self.m:]
 
     def _extract_bits(self, string, no_of_bits):
         """Returns list of first no_of_bits from the given string."""
@@ -176,7 +242,7 @@ class ZKProof(object):
         self.e = self._extract_bits(hash, self.s)
 
     def _broadcast(self, values):
-        msg = repr(values) if self.prover_id == self.runtime.id else None
+        msg = values if self.prover_id == self.runtime.id else None
         return self.runtime.broadcast(
             [self.prover_id], self.runtime.players.keys(), message=msg)
 
@@ -201,15 +267,16 @@ class ZKProof(object):
         return [x + y for x, y in zip(x,y)]
 
     def _vec_mul_E(self, x):
-        """Takes an s x 1 vector x and returns the m x 1 vector xE."""
-        # TODO: This could probably be optimized since we know the
-        # structure of E.
-        res = []
-        for j in xrange(self.m):
-            t = 0
-            for i in xrange(self.s):
-                t = t + x[i] * self._E(j, i)
-            res.append(t)
+        """Takes an s x 1 vector x and returns the m x 1 vector xE.
+
+        Entry j is the sum of e[j - i] * x[i], so the product is the
+        convolution of x and e, computed one bit of e at a time.
+        """
+        res = [0] * self.m
+        for k, bit in enumerate(self.e):
+            if bit:
+                for i, xi in enumerate(x):
+                    res[i + k] += xi
         return res
     
     def _vec_mul(self, x, y, n):
@@ -220,9 +287,8 @@ class ZKProof(object):
         assert self.s == len(y), \
             "not same length: %d != %d" % (self.s, len(y))
         res = [mpz(1)] * self.m
-        for j in range(self.m):
-            for i in range(self.s):
-                if self._E(j, i) == mpz(1):
-                    # TODO: Should we reduce modulo n each time?
-                    res[j] = (res[j] * y[i]) % n
+        for k, bit in enumerate(self.e):
+            if bit:
+                for i, yi in enumerate(y):
+                    res[i + k] = res[i + k] * yi % n
         return res
@@ -23,7 +23,7 @@
 import math
 
 from viff.util import rand, profile
-from viff.runtime import Share, gather_shares
+from viff.runtime import Share, SharedVector, gather_shares
 from viff.passive import PassiveRuntime
 from viff.active import ActiveRuntime
 from viff.field import GF256, FieldElement
@@ -197,7 +197,8 @@ class ComparisonToft07Mixin:
 
         # TODO: do not generate all bits, only $l$ of them
         # could perhaps do PRSS over smaller subset?
-        r_bitsField = [self.prss_share_random(field, True) for _ in range(l+k)]
+        bits = self.prss_share_random_bits(field, l+k+1)
+        r_bitsField, s_bit = bits[:l+k], bits[l+k]
 
         # TODO: compute r_full from r_modl and top bits, not from scratch
         r_full = 0
@@ -216,8 +217,6 @@ class ComparisonToft07Mixin:
             r_bits = [self.convert_bit_share(bit, smallField) \
                       for bit in r_bitsField]
 
-        s_bit = self.prss_share_random(field, binary=True)
-
         s_bitSmallField = self.convert_bit_share(s_bit, smallField)
         s_sign = 1 + s_bitSmallField * -2
 
@@ -285,12 +284,13 @@ class ComparisonToft07Mixin:
             E_tilde.append(e_i)
         E_tilde.append(mask) # Hack: will mult e_i and mask...
 
+        # Multiply the values together as a balanced tree.
         while len(E_tilde) > 1:
-            # TODO: pop() ought to be preferred? No: it takes the
-            # just appended and thus works linearly... try with
-            # two lists instead, pop(0) is quadratic if it moves
-            # elements.
-            E_tilde.append(E_tilde.pop(0) * E_tilde.pop(0))
+            products = [E_tilde[i] * E_tilde[i + 1]
+                        for i in range(0, len(E_tilde) - 1, 2)]
+            if len(E_tilde) % 2 == 1:
+                products.append(E_tilde[-1])
+            E_tilde = products
 
         E_tilde[0] = self.open(E_tilde[0])
         E_tilde[0].addCallback(lambda bit: field(bit.value != 0))
@@ -328,6 +328,146 @@ class ComparisonToft07Mixin:
         return self.greater_than_equal_online(share_a, share_b, preproc,
                                               field)
 
+    def greater_than_equal_many(self, pairs):
+        """Compute ``a >= b`` for each pair (a, b) in *pairs*.
+
+        Does the same as calling :meth:`greater_than_equal` on each
+        pair, but the comparisons from one field are done together on
+        :class:`~viff.runtime.SharedVector` objects. The random bits
+        for all comparisons are made by opening one vector of squares,
+        and the products of the E_tilde values are computed level by
+        level as a tree for all comparisons at once. The pairs may
+        come from different fields. A list of 0/1 shares is returned.
+
+        Communication cost: 3 vector openings and about log(l) vector
+        multiplications per field, where l is the bit length.
+        """
+        fields = []
+        groups = {}
+        for index, (share_a, share_b) in enumerate(pairs):
+            field = getattr(share_a, "field", getattr(share_b, "field", None))
+            if not isinstance(share_a, Share):
+                if not isinstance(share_a, FieldElement):
+                    share_a = field(share_a)
+                share_a = Share(self, field, share_a)
+            if not isinstance(share_b, Share):
+                if not isinstance(share_b, FieldElement):
+                    share_b = field(share_b)
+                share_b = Share(self, field, share_b)
+            if field not in groups:
+                fields.append(field)
+                groups[field] = []
+            groups[field].append((index, share_a, share_b))
+
+        results = [None] * len(pairs)
+        for field in fields:
+            indices, shares_a, shares_b = zip(*groups[field])
+            shares = self._greater_than_equal_vector(field, list(shares_a),
+                                                     list(shares_b))
+            for index, share in zip(indices, shares):
+                results[index] = share
+        return results
+
+    def _random_bit_vectors(self, field, count, length):
+        """Share *count* vectors of *length* random 0/1 elements.
+
+        All the bits are made together using
+        :meth:`prss_share_random_bit_vector`.
+        """
+        result = self.prss_share_random_bit_vector(field, count * length)
+
+        def split(bits):
+            for i, vector in enumerate(vectors):
+                vector.callback(bits[i * length:(i + 1) * length])
+            return bits
+        vectors = [SharedVector(self, field, length) for _ in range(count)]
+        result.addCallback(split)
+        return vectors
+
+    def _greater_than_equal_vector(self, field, shares_a, shares_b):
+        """Compute ``shares_a[i] >= shares_b[i]`` for all i.
+
+        The shares must all be from *field*.
+        """
+        length = len(shares_a)
+        # Need an extra bit to avoid troubles with equal inputs
+        l = self.options.bit_length + 1
+        k = self.options.security_parameter
+        assert field.modulus > 2**(l+2) + 2**(l+k), "Field too small"
+
+        ##################################################
+        # Preprocessing
+        ##################################################
+        bits = self._random_bit_vectors(field, l + k + 1, length)
+        r_bits, s_bit = bits[:l+k], bits[l+k]
+        r_full = self.lin_comb_vector([2**i for i in range(l+k)], r_bits)
+        r_bits = r_bits[:l]
+        r_modl = self.lin_comb_vector([2**i for i in range(l)], r_bits)
+        s_sign = 1 - 2 * s_bit
+        mask = self.prss_share_random_vector(field, length)
+
+        ##################################################
+        # Online computation
+        ##################################################
+        # z = 2**l + a - b where a = 2a+1 and b = 2b
+        z = self.lin_comb_vector([2, -2], [self.gather_vector(shares_a),
+                                           self.gather_vector(shares_b)])
+        z = z + (2**l + 1)
+        c = self.open_vector(r_full + z)
+
+        result = SharedVector(self, field, length)
+        self.schedule_callback(c, self._finish_greater_than_equal_vector,
+                               field, s_bit, s_sign, mask, r_modl, r_bits, z)
+        c.chainDeferred(result)
+        return self.split_vector(result)
+
+    def _finish_greater_than_equal_vector(self, c, field, s_bit, s_sign,
+                                          mask, r_modl, r_bits, z):
+        """Finish the calculation for a vector of comparisons."""
+        l = self.options.bit_length + 1
+        c_bits = [[ci.bit(i) for ci in c] for i in range(l)]
+
+        # E_tilde[i] = s_sign + r_bits[i] - c_bits[i] + 3 * sumXORs[i]
+        # where sumXORs[i] is the sum of r_bits[j] xor c_bits[j] for
+        # j > i. The xor with the public bits is linear.
+        E_tilde = [None] * l
+        sumXORs = None
+        for i in range(l-1, -1, -1):
+            e_i = s_sign + r_bits[i] - c_bits[i]
+            if sumXORs is not None:
+                e_i = e_i + 3 * sumXORs
+            E_tilde[i] = e_i
+            xor = r_bits[i] * [1 - 2 * cb for cb in c_bits[i]] + c_bits[i]
+            if sumXORs is None:
+                sumXORs = xor
+            else:
+                sumXORs = sumXORs + xor
+        E_tilde.append(mask) # Hack: will mult e_i and mask...
+
+        # Multiply the vectors together as a balanced tree, the
+        # multiplications on each level are done in parallel.
+        while len(E_tilde) > 1:
+            products = [E_tilde[i] * E_tilde[i + 1]
+                        for i in range(0, len(E_tilde) - 1, 2)]
+            if len(E_tilde) % 2 == 1:
+                products.append(E_tilde[-1])
+            E_tilde = products
+
+        def finish(non_zero):
+            non_zero = [int(v != 0) for v in non_zero]
+            # UF == underflow, UF = non_zero xor s_bit
+            UF = s_bit * [1 - 2 * b for b in non_zero] + non_zero
+
+            # conclude the computation -- compute final bit and map to 0/1
+            # return  2^(-l) * (z - (c%2**l - r%2**l + UF*2**l))
+            c_mod2l = [ci.value % 2**l for ci in c]
+            result = z - c_mod2l + r_modl - UF * 2**l
+            return result * long(~field(2**l))
+
+        result = self.open_vector(E_tilde[0])
+        self.schedule_callback(result, finish)
+        return result
+
 
 class Toft07Runtime(ComparisonToft07Mixin, PassiveRuntime):
     """Default mix of :class:`~viff.comparison.ComparisonToft07Mixin`
@@ -24,6 +24,11 @@ READY    = 2
 SEND     = 3
 PAILLIER = 4
 TEXT     = 5
+SHARES   = 10
+
+# Used by the BrachaBroadcastMixin
+FETCH    = 11
+PAYLOAD  = 12
 
 # Used by the HashBroadcastMixin
 INCONSISTENTHASH = 6
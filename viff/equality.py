@@ -20,6 +20,11 @@
 is mixed with.
 """
 
+from twisted.internet.defer import Deferred, gatherResults
+
+from viff.runtime import SharedVector
+
+
 class ProbabilisticEqualityMixin:
     """This class implements probabilistic constant-round secure
     equality-testing of secret shared numbers."""
@@ -39,47 +44,219 @@ class ProbabilisticEqualityMixin:
 
         TODO: Make it work for any prime-modulo, the b's should be in
         {y,1} where y is a non-square modulo p.
-
-        TODO: Make the final "and"ing of the x's more efficient as
-        described in the paper.
         """
+        return self.equal_many([(share_x, share_y)])[0]
+
+    def equal_many(self, pairs):
+        """Equality testing of many pairs with secret shared results.
 
-        Zp = share_x.field
+        Does the same as calling :meth:`equal` on each pair (x, y) in
+        *pairs*. All pairs must be from the same field. The k test
+        bits for all pairs are computed on
+        :class:`~viff.runtime.SharedVector` objects and opened as one
+        vector. The k bits of each pair are combined using an
+        unbounded fan-in "and", see :meth:`_and_many`. The number of
+        rounds does not depend on k or on the number of pairs.
 
-        a = share_x - share_y # We will check if a == 0
+        Communication cost: O(k) vector multiplications and openings
+        in a constant number of rounds. The test bits take 3
+        multiplications and 1 opening of vectors of length n*k, where
+        n is the number of pairs. The "and" takes 4k + 1
+        multiplications and 2k + 1 openings of vectors of length n:
+        one of each per random invertible mask, and k products of
+        masks, k products of unmasks, and k masked powers to open.
+        That is about twice the traffic of testing the pairs one by
+        one and multiplying the test bits together, so this trades
+        bandwidth for fewer rounds.
+        """
+        if not pairs:
+            return []
+        share_x, share_y = pairs[0]
+        Zp = getattr(share_x, "field", getattr(share_y, "field", None))
         k = self.options.security_parameter
+        n = len(pairs)
+
+        # We will check if a == 0
+        a = self.gather_vector([x - y for x, y in pairs])
+
+        # Each difference is tested k times.
+        def repeat(values):
+            repeated.callback([v for v in values for _ in range(k)])
+            return values
+        repeated = SharedVector(self, Zp, n * k)
+        a.addCallback(repeat)
+
+        x = self._equality_test_bits(repeated)
+        return self.split_vector(self._and_many(x, n, k))
+
+    def _equality_test_bits(self, a):
+        """Compute test bits for the elements of the vector *a*.
+
+        A test bit is always 1 if the element is zero and it is 0 with
+        probability 1/2 otherwise.
+        """
+        Zp = a.field
+        m = len(a)
+
+        # The b's are random numbers in {-1, 1}
+        b = self.prss_share_random_bit_vector(Zp, m) * 2 - 1
+        r = self.prss_share_random_vector(Zp, m)
+        rp = self.prss_share_random_vector(Zp, m)
+
+        # If b_i == 1 c_i will always be a square modulo p if a is
+        # zero and with probability 1/2 otherwise (except if rp == 0).
+        # If b_i == -1 it will be non-square.
+        c = self.open_vector(a * r + b * (rp * rp))
+
+        def finish((c, b, a)):
+            x = []
+            retry = []
+            for i, (cj, bj) in enumerate(zip(c, b)):
+                l = legendre_mod_p(cj)
+                if l == 1:
+                    xj = (1/Zp(2)) * (bj + 1)
+                elif l == -1:
+                    xj = (-1) * (1/Zp(2)) * (bj - 1)
+                else:
+                    # Start over below.
+                    retry.append(i)
+                    xj = Zp(0)
+                x.append(xj.value)
+            if not retry:
+                return x
+
+            def fill(more):
+                for i, xj in zip(retry, more):
+                    x[i] = xj
+                return x
+            more = self._equality_test_bits(
+                SharedVector(self, Zp, len(retry), [a[i] for i in retry]))
+            more.addCallback(fill)
+            return more
+
+        result = SharedVector(self, Zp, m)
+        values = gatherResults([c, b, a])
+        self.schedule_callback(values, finish)
+        values.chainDeferred(result)
+        return result
+
+    def _and_many(self, x, n, k):
+        """Compute the "and" of each group of k bits in the vector *x*.
+
+        The vector holds *n* groups of *k* 0/1 elements. With u = 1 +
+        the sum of a group, the "and" is f(u) where the polynomial f
+        of degree k is 1 in k + 1 and 0 in 1, ..., k. The powers of u
+        are computed in a constant number of rounds using the
+        unbounded fan-in multiplication by Bar-Ilan and Beaver which
+        works since u is non-zero.
+        """
+        Zp = x.field
+        modulus = Zp.modulus
+        assert modulus > k + 1, "Field too small"
+
+        u = SharedVector(self, Zp, n)
+        def sums(values):
+            u.callback([(1 + sum(values[p * k:(p + 1) * k])) % modulus
+                        for p in range(n)])
+            return values
+        x.addCallback(sums)
+
+        powers = self._powers_vector(u, k)
+
+        # The coefficients of f(X) = (X - 1)...(X - k) / k!
+        f = [Zp(1)]
+        for j in range(1, k + 1):
+            f = [c - j * d for c, d in zip([Zp(0)] + f, f + [Zp(0)])]
+        scale = ~reduce(lambda a, b: a * b, [Zp(j) for j in range(1, k + 1)])
+        f = [long(c * scale) for c in f]
+        return self.lin_comb_vector(f[1:], powers) + f[0]
+
+    def _powers_vector(self, u, k):
+        """Compute the powers u**1, ..., u**k of the vector *u*.
+
+        The elements of *u* must be non-zero. Random invertible masks
+        r_0, ..., r_k are made and m_i = r_(i-1) * u * r_i**-1 is
+        opened for i = 1, ..., k. Then u**i = r_0**-1 * (m_1 * ... *
+        m_i) * r_i where only the product in the middle depends on
+        *u*. A list of k vectors is returned.
+        """
+        Zp = u.field
+        n = len(u)
+
+        # Random masks and their inverses.
+        r, r_inv = zip(*[self._invertible_vector(Zp, n)
+                         for _ in range(k + 1)])
+
+        # These products do not depend on u.
+        masks = [r[i - 1] * r_inv[i] for i in range(1, k + 1)]
+        unmasks = [r_inv[0] * r[i] for i in range(1, k + 1)]
+
+        opened = gatherResults([self.open_vector(u * mask)
+                                for mask in masks])
+
+        def prefix_products(opened):
+            products = []
+            product = [Zp(1)] * n
+            for m_i in opened:
+                product = [p * m for p, m in zip(product, m_i)]
+                products.append([long(p) for p in product])
+            return products
+        opened.addCallback(prefix_products)
+
+        def split(products):
+            for public, product in zip(publics, products):
+                public.callback(product)
+            return products
+        # Multiplication by the public products is local.
+        publics = [Deferred() for _ in range(k)]
+        opened.addCallback(split)
+        return [unmask * public for unmask, public in zip(unmasks, publics)]
+
+    def _invertible_vector(self, Zp, n):
+        """Make a random vector r of non-zero elements and its inverse.
+
+        The inverse of r is s * (r * s)**-1 for a random s. Elements
+        where r * s is zero are made again. Two vectors of length *n*
+        are returned.
+        """
+        r = self.prss_share_random_vector(Zp, n)
+        s = self.prss_share_random_vector(Zp, n)
+        rs = self.open_vector(r * s)
+
+        def finish((rs, r, s)):
+            masks = list(r)
+            inverses = []
+            retry = []
+            for i, (rsj, sj) in enumerate(zip(rs, s)):
+                if rsj.value == 0:
+                    # Start over below.
+                    retry.append(i)
+                    inverses.append(0)
+                else:
+                    inverses.append((Zp(sj) * ~rsj).value)
+            if not retry:
+                return masks, inverses
+
+            def fill((more_masks, more_inverses)):
+                for i, rj, r_invj in zip(retry, more_masks, more_inverses):
+                    masks[i] = rj
+                    inverses[i] = r_invj
+                return masks, inverses
+            more = gatherResults(self._invertible_vector(Zp, len(retry)))
+            more.addCallback(fill)
+            return more
+
+        def split((masks, inverses)):
+            mask.callback(masks)
+            inverse.callback(inverses)
+
+        mask = SharedVector(self, Zp, n)
+        inverse = SharedVector(self, Zp, n)
+        values = gatherResults([rs, r, s])
+        self.schedule_callback(values, finish)
+        values.addCallback(split)
+        return mask, inverse
 
-        def gen_test_bit():
-            # The b's are random numbers in {-1, 1}
-            b = self.prss_share_random(Zp, binary=True) * 2 - 1
-            r = self.prss_share_random(Zp)
-            rp = self.prss_share_random(Zp)
-
-            # If b_i == 1 c_i will always be a square modulo p if a is
-            # zero and with probability 1/2 otherwise (except if rp == 0).
-            # If b_i == -1 it will be non-square.
-            c = self.open(a * r + b * rp * rp)
-            return self.schedule_callback(c, finish, b)
-
-        def finish(cj, bj):
-            l = legendre_mod_p(cj)
-            if l == 1:
-                xj = (1/Zp(2)) * (bj + 1)
-            elif l == -1:
-                xj = (-1) * (1/Zp(2)) * (bj - 1)
-            else:
-                # Start over.
-                xj = gen_test_bit()
-            return xj
-
-        x = [gen_test_bit() for _ in range(k)]
-
-        # Take the product (this is here the same as the "and") of all
-        # the x'es
-        while len(x) > 1:
-            x.append(x.pop(0) * x.pop(0))
-
-        return x[0]
 
 def legendre_mod_p(a):
     """Return the legendre symbol ``legendre(a, p)`` where *p* is the
@@ -75,13 +75,21 @@ The reason for the slightly confusing error message is that ``x`` and
 ``z`` are instances of two *different* classes called ``GFElement``.
 """
 
-from gmpy import mpz
+from gmpy import mpz, invert
 from math import log, ceil
 
+#: Check that the operands of comparisons and divisions are from the
+#: same field. The checks are skipped unless this is set to True.
+#: Arithmetic on elements from different fields always raises a
+#: :exc:`TypeError`.
+debug = False
+
 
 class FieldElement(object):
     """Common base class for elements."""
 
+    __slots__ = ()
+
     def __int__(self):
         """Extract integer value from the field element.
 
@@ -390,35 +398,46 @@ def GF(modulus):
 
     # Define a new class representing the field. This class will be
     # returned at the end of the function.
+    # Reducing with an mpz modulus gives mpz values, also when the
+    # input is an int or a long.
+    mpz_modulus = mpz(modulus)
+    integers = (int, long, type(mpz_modulus))
+
     class GFElement(FieldElement):
 
+        __slots__ = ('value',)
+
         def __init__(self, value):
-            self.value = value % self.modulus
+            self.value = value % mpz_modulus
+
+        def __int__(self):
+            return int(self.value)
+
+        def __long__(self):
+            return long(self.value)
+
+        # The binary operations check the class of the other operand
+        # with 'is' since there is only one class representing this
+        # field. Elements from other fields and other types are left
+        # to the other operand by returning NotImplemented.
 
         def __add__(self, other):
             """Addition."""
-            if not isinstance(other, (GFElement, int, long)):
-                return NotImplemented
-            try:
-                # We can do a quick test using 'is' here since
-                # there will only be one class representing this
-                # field.
-                assert self.field is other.field, "Fields must be identical"
+            if other.__class__ is GFElement:
                 return GFElement(self.value + other.value)
-            except AttributeError:
+            elif isinstance(other, integers):
                 return GFElement(self.value + other)
+            return NotImplemented
 
         __radd__ = __add__
 
         def __sub__(self, other):
             """Subtraction."""
-            if not isinstance(other, (GFElement, int, long)):
-                return NotImplemented
-            try:
-                assert self.field is other.field, "Fields must be identical"
+            if other.__class__ is GFElement:
                 return GFElement(self.value - other.value)
-            except AttributeError:
+            elif isinstance(other, integers):
                 return GFElement(self.value - other)
+            return NotImplemented
 
         def __rsub__(self, other):
             """Subtraction (reflected argument version)."""
@@ -426,13 +445,11 @@ def GF(modulus):
 
         def __xor__(self, other):
             """Xor for bitvalues."""
-            if not isinstance(other, (GFElement, int, long)):
-                return NotImplemented
-            try:
-                assert self.field is other.field, "Fields must be identical"
+            if other.__class__ is GFElement:
                 return GFElement(self.value ^ other.value)
-            except AttributeError:
+            elif isinstance(other, integers):
                 return GFElement(self.value ^ other)
+            return NotImplemented
 
         def __rxor__(self, other):
             """Xor for bitvalues (reflected argument version)."""
@@ -440,19 +457,17 @@ def GF(modulus):
 
         def __mul__(self, other):
             """Multiplication."""
-            if not isinstance(other, (GFElement, int, long)):
-                return NotImplemented
-            try:
-                assert self.field is other.field, "Fields must be identical"
+            if other.__class__ is GFElement:
                 return GFElement(self.value * other.value)
-            except AttributeError:
+            elif isinstance(other, integers):
                 return GFElement(self.value * other)
+            return NotImplemented
 
         __rmul__ = __mul__
 
         def __pow__(self, exponent):
             """Exponentiation."""
-            return GFElement(pow(self.value, exponent, self.modulus))
+            return GFElement(pow(self.value, exponent, mpz_modulus))
 
         def __neg__(self):
             """Negation."""
@@ -466,30 +481,15 @@ def GF(modulus):
             """
             if self.value == 0:
                 raise ZeroDivisionError("Cannot invert zero")
-
-            def extended_gcd(a, b):
-                """The extended Euclidean algorithm."""
-                x = 0
-                lastx = 1
-                y = 1
-                lasty = 0
-                while b != 0:
-                    quotient = a // b
-                    a, b = b, a % b
-                    x, lastx = lastx - quotient*x, x
-                    y, lasty = lasty - quotient*y, y
-                return (lastx, lasty, a)
-
-            inverse = extended_gcd(self.value, self.modulus)[0]
-            return GFElement(inverse)
+            return GFElement(invert(self.value, mpz_modulus))
 
         def __div__(self, other):
             """Division."""
-            try:
-                assert self.field is other.field, "Fields must be identical"
-                return self * ~other
-            except AttributeError:
+            if isinstance(other, integers):
                 return self * ~GFElement(other)
+            if debug:
+                assert self.field is other.field, "Fields must be identical"
+            return self * ~other
 
         __truediv__ = __div__
         __floordiv__ = __div__
@@ -515,12 +515,12 @@ def GF(modulus):
             # Because we assert that the modulus is a Blum prime
             # (congruent to 3 mod 4), there will be no reminder in the
             # division below.
-            root = pow(self.value, (self.modulus+1)//4, self.modulus)
+            root = pow(self.value, (self.modulus+1)//4, mpz_modulus)
             return GFElement(root)
 
         def bit(self, index):
             """Extract a bit (index is counted from zero)."""
-            return (self.value >> index) & 1
+            return int((self.value >> index) & 1)
 
         def signed(self):
             """Return a signed integer representation of the value.
@@ -550,7 +550,9 @@ def GF(modulus):
         def __eq__(self, other):
             """Equality test."""
             try:
-                assert self.field is other.field, "Fields must be identical"
+                if debug:
+                    assert self.field is other.field, \
+                        "Fields must be identical"
                 return self.value == other.value
             except AttributeError:
                 return self.value == other
@@ -558,7 +560,9 @@ def GF(modulus):
         def __ne__(self, other):
             """Inequality test."""
             try:
-                assert self.field is other.field, "Fields must be identical"
+                if debug:
+                    assert self.field is other.field, \
+                        "Fields must be identical"
                 return self.value != other.value
             except AttributeError:
                 return self.value != other
@@ -566,7 +570,9 @@ def GF(modulus):
         def __cmp__(self, other):
             """Comparison."""
             try:
-                assert self.field is other.field, "Fields must be identical"
+                if debug:
+                    assert self.field is other.field, \
+                        "Fields must be identical"
                 return cmp(self.value, other.value)
             except AttributeError:
                 return cmp(self.value, other)
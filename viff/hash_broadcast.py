@@ -17,7 +17,10 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
 
-from twisted.internet.defer import Deferred
+from optparse import OptionGroup
+from struct import pack
+
+from twisted.internet.defer import Deferred, succeed
 
 try:
     from hashlib import sha1
@@ -39,7 +42,29 @@ class HashBroadcastMixin:
     generated and exchanged among the receivers. If a receiver
     receives a hash which is not equal to the one he generated, then
     he aborts. Else he returns the received value and the computation
-    continues."""
+    continues.
+
+    With the ``--optimistic-broadcast`` option the received value is
+    returned at once and the hash is only recorded. The hashes are
+    compared at the next :meth:`checkpoint`, which costs one round
+    for all broadcasts since the previous checkpoint. A runtime using
+    this option should call :meth:`shutdown_checkpoint` when it shuts
+    down."""
+
+    #: Deferreds for the hashes of the messages received
+    #: optimistically since the last checkpoint.
+    _broadcast_transcript = None
+
+    @staticmethod
+    def add_hash_broadcast_options(parser):
+        group = OptionGroup(parser, "Hash Broadcast Options")
+        parser.add_option_group(group)
+
+        group.add_option("--optimistic-broadcast", action="store_true",
+                         help="Use broadcast values at once and compare "
+                         "their hashes only at checkpoints and on shutdown.")
+
+        parser.set_defaults(optimistic_broadcast=False)
 
     def _send_message(self, pc, sender, receivers, message):
         for peer_id in receivers:
@@ -83,6 +108,102 @@ class HashBroadcastMixin:
 
 
 
+    def _receive_optimistic(self, unique_pc, sender, receivers):
+        """Receive a message and record its hash for the next
+        checkpoint."""
+        entry = Deferred()
+        self._broadcast_transcript.append(entry)
+
+        def message_received(m):
+            entry.callback((unique_pc, receivers, sha1(m).digest()))
+            return m
+
+        d_message = Deferred().addCallbacks(message_received,
+                                            self.error_handler)
+        self._expect_data(sender, TEXT, d_message)
+        return d_message
+
+    def _exchange_transcripts(self):
+        """Exchange transcript digests with the other players.
+
+        Each player hashes, in program counter order, the hashes of
+        the messages received since the last checkpoint by both
+        itself and the peer. The result is a list of the peers whose
+        digest differs from ours.
+        """
+        self.increment_pc()
+        pc = tuple(self.program_counter)
+
+        entries = self._broadcast_transcript or []
+        self._broadcast_transcript = []
+
+        received = []
+        for peer_id in self.players:
+            if peer_id != self.id:
+                d = Deferred()
+                self._expect_data(peer_id, HASH, d)
+                received.append(d)
+
+        def send_digests(entries):
+            entries.sort()
+            digests = {}
+            for peer_id in self.players:
+                if peer_id != self.id:
+                    h = sha1()
+                    for unique_pc, receivers, digest in entries:
+                        if peer_id in receivers:
+                            h.update(pack("!H%dI" % len(unique_pc),
+                                          len(unique_pc), *unique_pc))
+                            h.update(digest)
+                    digests[peer_id] = h.digest()
+                    self.protocols[peer_id].sendData(pc, HASH,
+                                                     digests[peer_id])
+            self.activate_reactor()
+            return digests
+
+        def compare((digests, received)):
+            peers = [peer_id for peer_id in self.players if peer_id != self.id]
+            return [peer_id for peer_id, digest in zip(peers, received)
+                    if digest != digests[peer_id]]
+
+        mine = gatherResults(entries).addCallback(send_digests)
+        result = gatherResults([mine, gatherResults(received)])
+        result.addCallback(compare)
+        return result
+
+    def checkpoint(self):
+        """Check the messages received optimistically.
+
+        All players must call this method at the same point in the
+        program. The returned Deferred fails with
+        :class:`InconsistentHashException` if some player received a
+        message different from ours, otherwise it yields None.
+        """
+        def check(inconsistent):
+            if inconsistent:
+                raise InconsistentHashException(error_msg %
+                                                (self.id, inconsistent))
+
+        return self._exchange_transcripts().addCallback(check)
+
+    def shutdown_checkpoint(self):
+        """Run a last :meth:`checkpoint` before shutting down.
+
+        The execution is aborted if the check fails. Nothing is done
+        unless the ``--optimistic-broadcast`` option is used.
+        """
+        if not getattr(self.options, "optimistic_broadcast", False):
+            return succeed(None)
+
+        def check(inconsistent):
+            if inconsistent:
+                exc = InconsistentHashException(error_msg %
+                                                (self.id, inconsistent))
+                self.abort(self.protocols[inconsistent[0]], exc)
+                raise exc
+
+        return self._exchange_transcripts().addCallback(check)
+
     def broadcast(self, senders, receivers, message=None):
         """Broadcast the messeage from senders to receivers.
 
@@ -103,6 +224,9 @@ class HashBroadcastMixin:
         self.increment_pc()
 
         pc = tuple(self.program_counter)
+        optimistic = getattr(self.options, "optimistic_broadcast", False)
+        if optimistic and self._broadcast_transcript is None:
+            self._broadcast_transcript = []
         if self.id in receivers or self.id in senders:
             results = [None] * len(senders)
         else:
@@ -116,7 +240,11 @@ class HashBroadcastMixin:
                 sender = senders[x]
                 new_pc = list(self.program_counter)
                 new_pc.append(x)
-                results[x] = self._receive_broadcast(pc, tuple(new_pc), sender, receivers)
+                if optimistic:
+                    results[x] = self._receive_optimistic(tuple(new_pc),
+                                                          sender, receivers)
+                else:
+                    results[x] = self._receive_broadcast(pc, tuple(new_pc), sender, receivers)
 
         if self.id in senders and self.id not in receivers:
             d = Deferred()
@@ -24,9 +24,38 @@ type that acts like a number, including :class:`viff.field.GF256` and
 
 from __future__ import division
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from viff.field import GF256
+
+
+def _dot_mod(a, x, modulus):
+    """Return ``a.dot(x) % modulus`` for NumPy arrays of residues.
+
+    Arrays of int64 are multiplied in limbs of *x* which are small
+    enough for the sums to fit in 63 bits, reducing after each limb.
+    """
+    if a.dtype == object:
+        return a.dot(x) % modulus
+    bits = int(modulus).bit_length()
+    limb = 62 - (a.shape[1] + 1).bit_length() - bits
+    mask = (1 << limb) - 1
+    acc = numpy.zeros((a.shape[0], x.shape[1]), dtype=numpy.int64)
+    for shift in reversed(range(0, bits, limb)):
+        acc = ((acc << limb) + a.dot((x >> shift) & mask)) % modulus
+    return acc
+
+
 class Matrix(object):
     """A matrix."""
 
+    #: Cached integer residues of the entries for
+    #: :meth:`mul_vectors`, or :const:`None`.
+    _residues = None
+
     def _init_zeros(self, m, n):
         """Initialize a new zero matrix with *m* rows and *n* columns."""
         self.rows = [[0 for _ in range(n)] for _ in range(m)]
@@ -66,6 +95,7 @@ class Matrix(object):
          [ 0  0]]
         """
         self.rows[i][j] = value
+        self._residues = None
 
     def __getitem__(self, (i, j)):
         """Allows matrix entry access using ``z = M[x, y]``.
@@ -182,6 +212,59 @@ class Matrix(object):
                 result[i, j] = other * self[i, j]
         return result
 
+    def mul_vectors(self, vectors):
+        """Multiplies the matrix with each of the column *vectors*.
+
+        The vectors are lists of length *n* and the result is a list
+        with a list of length *m* for each vector:
+
+        >>> A = Matrix([[1, 2], [3, 4]])
+        >>> A.mul_vectors([[1, 0], [0, 1], [1, 1]])
+        [[1, 3], [2, 4], [3, 7]]
+
+        Matrices over a :func:`viff.field.GF` field are multiplied as
+        integer residues, all vectors at once. NumPy is used for this
+        if it is available. The vectors can hold field elements or
+        integers and the result holds field elements:
+
+        >>> from viff.field import GF
+        >>> Zp = GF(47)
+        >>> print hyper(2, Zp).mul_vectors([[Zp(1), Zp(2)]])[0]
+        [{3}, {4}]
+        """
+        if not vectors:
+            return []
+        for vector in vectors:
+            if len(vector) != self.n:
+                raise ValueError('Matrix dimensions do not match for '
+                                 'multiplication')
+
+        field = getattr(self[0, 0], "field", None)
+        if field is None or field is GF256:
+            return [[sum([a * v for a, v in zip(row, vector)], 0)
+                     for row in self.rows] for vector in vectors]
+
+        modulus = field.modulus
+        values = [[long(v) for v in vector] for vector in vectors]
+        if self._residues is None:
+            rows = [[long(a) for a in row] for row in self.rows]
+            if numpy is not None:
+                # Use int64 if the limbs in _dot_mod get 8 bits or more.
+                if int(modulus).bit_length() + (self.n + 1).bit_length() \
+                        <= 54:
+                    rows = numpy.array(rows, dtype=numpy.int64)
+                else:
+                    rows = numpy.array(rows, dtype=object)
+            self._residues = rows
+
+        if numpy is None:
+            result = [[sum([a * v for a, v in zip(row, vector)]) % modulus
+                       for row in self._residues] for vector in values]
+        else:
+            x = numpy.array(values, dtype=self._residues.dtype).T
+            result = _dot_mod(self._residues, x, modulus).T.tolist()
+        return [[field(r) for r in vector] for vector in result]
+
     def __str__(self):
         """Returns a string representation of the matrix.
 
@@ -236,10 +319,17 @@ class Matrix(object):
         return sum
 
 
+#: Cache of hyper-invertible matrices, indexed by (n, field).
+_hyper_cache = {}
+
+
 def hyper(n, field):
     """Makes an *n* times *n* hyper-invertible square matrix.
     The matrix entries will belong to *field*.
 
+    The matrix is cached and the same object is returned in later
+    calls with the same *n* and *field*, so it must not be modified.
+
     A hyper-invertible matrix is a matrix where every sub-matrix is
     invertible. A sub-matrix consists of an arbitrary subset of the
     rows and columns of the original matrix (and is not necessarily a
@@ -255,6 +345,10 @@ def hyper(n, field):
      [ {3} {39}  {6}]
      [ {6} {32} {10}]]
     """
+    key = (n, field)
+    if key in _hyper_cache:
+        return _hyper_cache[key]
+
     result = Matrix(n, n)
     for i in range(0, n):
         for j in range(0, n):
@@ -263,6 +357,7 @@ def hyper(n, field):
                 if k != j:
                     product *= field(n+i-k)/field(j-k)
             result[i, j] = product
+    _hyper_cache[key] = result
     return result
 
 if __name__ == "__main__":
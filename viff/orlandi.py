@@ -28,7 +28,7 @@ import operator
 from twisted.internet.defer import Deferred, gatherResults, succeed
 
 from viff.runtime import Share, gather_shares, preprocess
-from viff.util import rand
+from viff.util import rand, pack_longs, unpack_longs
 from viff.constants import TEXT, PAILLIER
 from viff.field import FieldElement
 from viff.paillier import encrypt_r, decrypt
@@ -388,23 +388,22 @@ class OrlandiMixin(HashBroadcastMixin):
                                        (x, rho1, rho2, Cx1, Cx))
 
         def deserialize(ls, commitments):
-            def convert_from_string_to_field(s):
-                def field_long(x):
-                    return field(long(x))
-                xs = s[0:-1].split(';')
-                ys = [x.split(':') for x in xs]
-                return [map(field_long, xs) for xs in ys]
-            shares = map(convert_from_string_to_field, ls)
+            def convert_to_field(s):
+                xs = unpack_longs(s)
+                return [(field(xs[i]), field(xs[i + 1]), field(xs[i + 2]))
+                        for i in xrange(0, len(xs), 3)]
+            shares = map(convert_to_field, ls)
             return map(recombine_value, zip(zip(*shares), commitments))
 
         def exchange(ls, receivers):
             commitments = [None] * len(ls)
-            broadcast_string = ""
+            values = []
             for inx, (xi, (rhoi1, rhoi2), Cx) in enumerate(ls):
-                broadcast_string += "%s:%s:%s;" % (xi.value, rhoi1.value, rhoi2.value)
+                values.extend([xi.value, rhoi1.value, rhoi2.value])
                 commitments[inx] = (Cx)
             # Send share to all receivers.
-            ds = self.broadcast(self.players.keys(), receivers, broadcast_string)
+            ds = self.broadcast(self.players.keys(), receivers,
+                                pack_longs(values))
 
             if self.id in receivers:
                 result = gatherResults(ds)
@@ -1303,3 +1302,13 @@ class OrlandiRuntime(OrlandiMixin, SimpleArithmeticRuntime):
         self.d = 0
         self.s_lambda = 1
         self.triples = []
+
+    @staticmethod
+    def add_options(parser):
+        SimpleArithmeticRuntime.add_options(parser)
+        HashBroadcastMixin.add_hash_broadcast_options(parser)
+
+    def shutdown(self):
+        result = self.shutdown_checkpoint()
+        result.addCallback(lambda _: SimpleArithmeticRuntime.shutdown(self))
+        return result
@@ -24,10 +24,21 @@ From the paper "Public-Key Cryptosystems Based on Composite Degree
 Residuosity Classes" by Pascal Paillier in EUROCRYPT 1999, 223-238.
 """
 
-from twisted.internet.defer import Deferred, gatherResults
+import cPickle as pickle
+import multiprocessing
+import threading
+from collections import deque
+from functools import partial
+from random import Random
+from optparse import OptionGroup
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, gatherResults, succeed
 import gmpy
+from gmpy import mpz
 
-from viff.runtime import Runtime, Share, gather_shares
+from viff.runtime import Runtime, Share, gather_shares, \
+     _init_worker, _call_in_worker
 from viff.constants import PAILLIER
 from viff.util import rand, find_random_prime
 
@@ -35,6 +46,13 @@ def L(u, n):
     return (u-1)/n
 
 def generate_keys(bit_length):
+    """Generate a Paillier key pair with an RSA modulus of
+    *bit_length* bits.
+
+    The generator is g = n + 1 which makes g^m = 1 + m*n (mod n^2).
+    The secret key keeps the primes p and q for use by
+    :func:`decrypt`.
+    """
     # Make an RSA modulus n.
     p = find_random_prime(bit_length/2)
     while True:
@@ -45,54 +63,442 @@ def generate_keys(bit_length):
     nsq = n*n
 
     # Calculate Carmichael's function.
-    lm = gmpy.lcm(p-1, q-1)
+    lm = long(gmpy.lcm(p-1, q-1))
+
+    # The generator g = n + 1 is always in B.
+    g = n + 1
+
+    return {'n': n, 'g': g, 'n_square': nsq}, \
+        {'n': n, 'g': g, 'lm': lm, 'p': p, 'q': q}
+
+def _g_pow(m, n, g, nsq):
+    """Compute g^m (mod n^2)."""
+    if g == n + 1:
+        # The binomial theorem gives (1 + n)^m = 1 + m*n (mod n^2).
+        return (1 + mpz(m) * n) % nsq
+    else:
+        return pow(mpz(g), m, nsq)
+
+
+class FixedBase(object):
+    """Fixed-base exponentiation using a precomputed table.
+
+    The table holds base^(j * 2^(w*i)) for all w-bit digits j, so an
+    exponentiation takes one multiplication per digit of the exponent
+    and no squarings:
+
+    >>> table = FixedBase(3, 1000003, 64)
+    >>> table.pow(12345678901234567) == pow(3, 12345678901234567, 1000003)
+    True
+    """
+
+    def __init__(self, base, modulus, bits, window=5):
+        """Build the table for exponents of up to *bits* bits."""
+        self.modulus = mpz(modulus)
+        self.bits = bits
+        self.window = window
+        self.mask = (1 << window) - 1
+        self.table = []
+        b = mpz(base) % self.modulus
+        for _ in range((bits + window - 1) // window):
+            row = [mpz(1)]
+            for _ in range(self.mask):
+                row.append(row[-1] * b % self.modulus)
+            self.table.append(row)
+            b = row[-1] * b % self.modulus
+
+    def pow(self, exponent):
+        """Compute base^*exponent* (mod modulus)."""
+        if not 0 <= exponent < 2**self.bits:
+            raise ValueError("exponent must be in [0, 2^%d)" % self.bits)
+        result = mpz(1)
+        for row in self.table:
+            if not exponent:
+                break
+            digit = exponent & self.mask
+            if digit:
+                result = result * row[digit] % self.modulus
+            exponent >>= self.window
+        return result
+
 
-    # Generate a generator g in B.
+#: Cache for fixed-base tables used for randomizers, keyed by modulus.
+_randomizers = {}
+
+def randomizer(pubkey, random=rand):
+    """Return a uniformly random r in Zn* together with r^n (mod n^2)."""
+    n = mpz(pubkey['n'])
     while True:
-        g = rand.randint(1, long(nsq))
-        if gmpy.gcd(L(pow(g, lm, nsq), n), n) == 1: break
+        r = mpz(random.randint(1, long(n) - 1))
+        if gmpy.gcd(r, n) == 1:
+            return long(r), long(pow(r, n, n*n))
+
+def fixed_base_randomizer(pubkey, random=rand):
+    """Return a random r in Zn* together with r^n (mod n^2).
+
+    This uses the faster encryption from "A Generalization of
+    Paillier's Public-Key System with Applications to Electronic
+    Voting" by Damgard, Jurik, and Nielsen (section 4.1). The first
+    time a key is used, a fixed element h = -y^2 (mod n) is chosen for
+    a random y in Zn*. The random element is then r = h^a for a random
+    exponent a of ceil(k/2) bits, where k is the bit length of n. Both
+    r and r^n = (h^n)^a are computed using :class:`FixedBase` tables,
+    which is much faster than a full exponentiation modulo n^2.
+
+    Note that r is not uniform in Zn*: it lies in the subgroup
+    generated by h. The encryptions are therefore only as secure as
+    standard Paillier encryptions under the additional assumption
+    that h^a for a random ceil(k/2)-bit a cannot be distinguished from
+    a random element of that subgroup. The paper argues this when n
+    is a product of safe primes; :func:`generate_keys` does not
+    ensure that. This is why :func:`randomizer` is used unless the
+    fixed-base randomizers are asked for explicitly.
+    """
+    n = pubkey['n']
+    try:
+        h_table, hn_table = _randomizers[n]
+    except KeyError:
+        while True:
+            y = rand.randint(2, long(n) - 1)
+            if gmpy.gcd(y, n) == 1: break
+        h = -mpz(y)**2 % n
+        nsq = n*n
+        bits = (mpz(n).numdigits(2) + 1) // 2
+        h_table = FixedBase(h, n, bits)
+        hn_table = FixedBase(pow(h, n, nsq), nsq, bits)
+        _randomizers[n] = h_table, hn_table
+    a = random.getrandbits(h_table.bits)
+    return long(h_table.pow(a)), long(hn_table.pow(a))
+
+
+def _make_randomizers(n, count, seed):
+    """Return *count* pairs ``(r, r^n mod n^2)`` for random r in Zn*.
+
+    This is run in a worker process by :class:`RandomizerPool`. The
+    *seed* must be fresh for each call since the workers are forked
+    with a copy of the random generator state of the parent.
+    """
+    random = Random(seed)
+    pubkey = {'n': n}
+    return [randomizer(pubkey, random) for _ in range(count)]
+
+
+class RandomizerPool(object):
+    """Pool of Paillier randomizers computed in background processes.
+
+    For each registered public key the pool keeps a queue of pairs
+    ``(r, r^n mod n^2)``. When a queue drops below the low watermark,
+    batches of new pairs are computed by a :mod:`multiprocessing`
+    pool until the queue holds *depth* pairs again. Encryption with
+    a pair from the queue costs only a multiplication. If a queue is
+    empty, :func:`randomizer` is used instead, or
+    :func:`fixed_base_randomizer` if *fixed_base* is true.
+    """
+
+    def __init__(self, depth, low_watermark=None, batch_size=100,
+                 processes=None, fixed_base=False):
+        #: Number of pairs to keep per public key.
+        self.depth = depth
+        if low_watermark is None:
+            low_watermark = depth // 2
+        #: Refill when fewer than this many pairs are available.
+        self.low_watermark = low_watermark
+        #: Number of pairs computed by each background job.
+        self.batch_size = batch_size
+        self.processes = processes
+        self.fixed_base = fixed_base
+        self._workers = None
+        self._closed = False
+        self._queues = {}
+        self._pending = {}
+        self._waiters = []
+        self._lock = threading.Lock()
+        #: Number of pairs taken from the pool.
+        self.hits = 0
+        #: Number of pairs computed on demand since the pool was empty.
+        self.misses = 0
+
+    def register(self, pubkey):
+        """Start filling the pool for *pubkey*."""
+        n = pubkey['n']
+        if n not in self._queues:
+            self._queues[n] = deque()
+            self._pending[n] = 0
+        self._refill(n)
+
+    def _refill(self, n):
+        self._lock.acquire()
+        try:
+            available = len(self._queues[n]) + self._pending[n]
+            if self._closed or available >= self.low_watermark:
+                return
+            missing = self.depth - available
+            self._pending[n] += missing
+        finally:
+            self._lock.release()
+
+        if self._workers is None:
+            self._workers = multiprocessing.Pool(self.processes,
+                                                 _init_worker)
+        while missing > 0:
+            count = min(missing, self.batch_size)
+            missing -= count
+            job = pickle.dumps((_make_randomizers,
+                                (n, count, rand.getrandbits(128))),
+                               pickle.HIGHEST_PROTOCOL)
+            self._workers.apply_async(_call_in_worker, (job,),
+                                      callback=partial(self._add, n, count))
+
+    def _add(self, n, count, reply):
+        # Called in the result handler thread of the worker pool. A
+        # failed batch adds no pairs, but it is no longer pending.
+        success, pairs = pickle.loads(reply)
+        self._lock.acquire()
+        try:
+            if success:
+                self._queues[n].extend(pairs)
+            self._pending[n] -= count
+            if sum(self._pending.itervalues()) == 0 and self._waiters:
+                waiters = self._waiters
+                self._waiters = []
+                reactor.callFromThread(self._fire_waiters, waiters)
+        finally:
+            self._lock.release()
+
+    def _fire_waiters(self, waiters):
+        for waiter in waiters:
+            waiter.callback(None)
+
+    def get(self, pubkey, random=rand):
+        """Return a pair ``(r, r^n mod n^2)`` for *pubkey*."""
+        n = pubkey['n']
+        if n not in self._queues:
+            self.register(pubkey)
+        try:
+            pair = self._queues[n].popleft()
+            self.hits += 1
+        except IndexError:
+            if self.fixed_base:
+                pair = fixed_base_randomizer(pubkey, random)
+            else:
+                pair = randomizer(pubkey, random)
+            self.misses += 1
+        self._refill(n)
+        return pair
+
+    def encrypt(self, m, pubkey):
+        """Encrypt *m* using a randomizer from the pool."""
+        rn = self.get(pubkey)[1]
+        return encrypt_rn(m, rn, pubkey)
+
+    def wait(self):
+        """Return a :class:`Deferred` which fires when no batches are
+        being computed.
+        """
+        self._lock.acquire()
+        try:
+            if sum(self._pending.itervalues()) == 0:
+                return succeed(None)
+            result = Deferred()
+            self._waiters.append(result)
+            return result
+        finally:
+            self._lock.release()
 
-    return {'n':n, 'g': g}, {'n': n, 'g': g, 'lm': lm}
+    def stats(self):
+        """Return a dictionary with statistics for the pool."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'available': sum(map(len, self._queues.itervalues())),
+                'pending': sum(self._pending.itervalues())}
 
-def encrypt(m, pubkey):
-    r = rand.randint(1, long(pubkey['n']))
-    return encrypt_r(m, r, pubkey)
+    def close(self):
+        """Stop the background processes.
+
+        The pool can still be used after this, but it will no longer
+        be refilled. Deferreds returned by :meth:`wait` fire now.
+        """
+        self._closed = True
+        if self._workers is not None:
+            self._workers.terminate()
+            self._workers.join()
+            self._workers = None
+        # The batches still being computed are lost.
+        for n in self._pending:
+            self._pending[n] = 0
+        waiters = self._waiters
+        self._waiters = []
+        self._fire_waiters(waiters)
+
+def encrypt(m, pubkey, fixed_base=False):
+    """Encrypt *m* using a random r from :func:`randomizer`, or from
+    :func:`fixed_base_randomizer` if *fixed_base* is true."""
+    if fixed_base:
+        r, rn = fixed_base_randomizer(pubkey)
+    else:
+        r, rn = randomizer(pubkey)
+    return encrypt_rn(m, rn, pubkey)
 
 def encrypt_r(m, r, pubkey):
+    n = pubkey['n']
+    nsq = n*n
+    return encrypt_rn(m, pow(mpz(r), n, nsq), pubkey)
+
+def encrypt_rn(m, rn, pubkey):
+    """Encrypt *m* using the precomputed *rn* = r^n (mod n^2)."""
     n = pubkey['n']
     g = pubkey['g']
     nsq = n*n
-    return (pow(g, m, nsq)*pow(r, n, nsq)) % nsq
+    return long(_g_pow(m, n, g, nsq) * rn % nsq)
 
 #: Cache for ciphertext-independent factors.
 _decrypt_factors = {}
 
 def decrypt(c, seckey):
-    c = long(c)
+    """Decrypt *c*.
+
+    When the secret key holds the primes p and q, the decryption is
+    done modulo p^2 and q^2 and combined using the Chinese remainder
+    theorem. This is about four times faster than working modulo
+    n^2.
+    """
+    c = mpz(c)
     n = seckey['n']
     g = seckey['g']
+    if 'p' in seckey and 'q' in seckey:
+        p = seckey['p']
+        q = seckey['q']
+        key = (n, g, p, q)
+        try:
+            psq, qsq, hp, hq, q_inv = _decrypt_factors[key]
+        except KeyError:
+            psq, qsq = mpz(p)**2, mpz(q)**2
+            hp = gmpy.invert(L(pow(mpz(g) % psq, p-1, psq), p), p)
+            hq = gmpy.invert(L(pow(mpz(g) % qsq, q-1, qsq), q), q)
+            q_inv = gmpy.invert(q, p)
+            _decrypt_factors[key] = psq, qsq, hp, hq, q_inv
+        mp = L(pow(c % psq, p-1, psq), p) * hp % p
+        mq = L(pow(c % qsq, q-1, qsq), q) * hq % q
+        # Combine the two residues with Garner's formula.
+        return long(mq + (mp - mq) * q_inv % p * q)
+
     lm = seckey['lm']
     numer = L(pow(c, lm, n*n), n)
     key = (n, g, lm)
     try:
         factor = _decrypt_factors[key]
     except KeyError:
-        denom = L(pow(g, lm, n*n), n)
+        denom = L(pow(mpz(g), lm, n*n), n)
         factor = gmpy.invert(denom, n)
         _decrypt_factors[key] = factor
-    return (numer * factor) % n
+    return long((numer * factor) % n)
+
+
+class RandomizerPoolMixin:
+    """Mixin class for runtimes encrypting with Paillier.
+
+    It keeps an optional :class:`RandomizerPool` for the public keys
+    of the players. The pool is disabled unless the
+    ``--randomizer-pool-depth`` option is positive. A runtime using
+    the mixin must call :meth:`start_randomizer_pool` when it is
+    initialized, :meth:`register_randomizers` for each player added,
+    and :meth:`stop_randomizer_pool` when it shuts down.
+    """
+
+    #: Pool of Paillier randomizers or None.
+    randomizer_pool = None
+
+    @staticmethod
+    def add_randomizer_pool_options(parser):
+        group = OptionGroup(parser, "Paillier Randomizer Options")
+        parser.add_option_group(group)
+
+        group.add_option("--randomizer-pool-depth", type="int", metavar="N",
+                         help="Keep N precomputed Paillier randomizers per "
+                         "public key, computed in background processes. "
+                         "Zero disables the pool.")
+        group.add_option("--randomizer-pool-low", type="int", metavar="N",
+                         help="Refill the randomizer pool when fewer than N "
+                         "randomizers are left. Defaults to half the depth.")
+        group.add_option("--randomizer-pool-processes", type="int",
+                         metavar="N", help="Number of processes computing "
+                         "randomizers. Defaults to the number of CPUs.")
+        group.add_option("--fixed-base-randomizers", action="store_true",
+                         help="Compute randomizers not taken from the pool "
+                         "with fixed-base tables. This is faster, but "
+                         "relies on an extra hardness assumption.")
+
+        parser.set_defaults(randomizer_pool_depth=0,
+                            randomizer_pool_low=None,
+                            randomizer_pool_processes=None,
+                            fixed_base_randomizers=False)
+
+    def start_randomizer_pool(self):
+        """Create the randomizer pool if enabled by the options."""
+        depth = getattr(self.options, "randomizer_pool_depth", 0)
+        if not depth:
+            return
+        self.randomizer_pool = RandomizerPool(
+            depth, self.options.randomizer_pool_low,
+            processes=self.options.randomizer_pool_processes,
+            fixed_base=getattr(self.options, "fixed_base_randomizers", False))
+        for player in self.players.itervalues():
+            self.register_randomizers(player)
+        if self.options.statistics:
+            reactor.addSystemEventTrigger("after", "shutdown",
+                                          self.print_randomizer_stats)
+
+    def register_randomizers(self, player):
+        """Start computing randomizers for the key of *player*."""
+        if self.randomizer_pool is not None and \
+                isinstance(player.pubkey, dict):
+            self.randomizer_pool.register(player.pubkey)
+
+    def stop_randomizer_pool(self):
+        """Stop the processes computing randomizers."""
+        if self.randomizer_pool is not None:
+            self.randomizer_pool.close()
+
+    def print_randomizer_stats(self):
+        """Print statistics for the pool of Paillier randomizers."""
+        stats = self.randomizer_pool.stats()
+        print "Randomizer pool: %(hits)d used, %(misses)d computed " \
+            "on demand, %(available)d left, %(pending)d pending" % stats
+
+    def paillier_encrypt(self, m, pubkey):
+        """Encrypt *m*, using the randomizer pool if there is one."""
+        if self.randomizer_pool is None:
+            return encrypt(m, pubkey,
+                           getattr(self.options, "fixed_base_randomizers",
+                                   False))
+        else:
+            return self.randomizer_pool.encrypt(m, pubkey)
 
 
-class PaillierRuntime(Runtime):
+class PaillierRuntime(RandomizerPoolMixin, Runtime):
     """Two-player runtime based on the Paillier crypto system."""
 
+    @staticmethod
+    def add_options(parser):
+        Runtime.add_options(parser)
+        RandomizerPoolMixin.add_randomizer_pool_options(parser)
+
+    def __init__(self, player, threshold, options=None):
+        Runtime.__init__(self, player, threshold, options)
+        self.start_randomizer_pool()
+
     def add_player(self, player, protocol):
         Runtime.add_player(self, player, protocol)
+        self.register_randomizers(player)
         if player.id == self.id:
             self.player = player
         else:
             self.peer = player
 
+    def shutdown(self):
+        result = Runtime.shutdown(self)
+        result.addCallback(lambda _: self.stop_randomizer_pool())
+        return result
+
     def prss_share_random(self, field):
         """Generate a share of a uniformly random element."""
         prfs = self.players[self.id].prfs(field.modulus)
@@ -184,11 +590,11 @@ class PaillierRuntime(Runtime):
             pc = tuple(self.program_counter)
             send_data = self.protocols[self.peer.id].sendData
 
-            if hash(pc) % 2 == self.id:
+            if hash(pc) % 2 == self.id - 1:
                 # We play the role of P1.
                 a1, b1 = a, b
-                enc_a1 = encrypt(a1.value, self.player.pubkey)
-                enc_b1 = encrypt(b1.value, self.player.pubkey)
+                enc_a1 = self.paillier_encrypt(a1.value, self.player.pubkey)
+                enc_b1 = self.paillier_encrypt(b1.value, self.player.pubkey)
                 send_data(pc, PAILLIER, str(enc_a1))
                 send_data(pc, PAILLIER, str(enc_b1))
 
@@ -214,7 +620,7 @@ class PaillierRuntime(Runtime):
 
                 # Chose and encrypt r.
                 r = rand.randint(0, 2 * field.modulus**2 + 2**k)
-                enc_r = encrypt(r, self.peer.pubkey)
+                enc_r = self.paillier_encrypt(r, self.peer.pubkey)
 
                 c1 = gatherResults([enc_a1_b2, enc_b1_a2])
                 c1.addCallback(lambda (a,b): a * b * enc_r)
@@ -22,12 +22,38 @@
 import operator
 
 from viff import shamir
-from viff.runtime import Runtime, Share, ShareList, gather_shares, preprocess
-from viff.prss import prss, prss_lsb, prss_zero, prss_multi
+from viff.runtime import Runtime, Share, ShareList, SharedVector, \
+    gather_shares, preprocess
+from viff.prss import prss, prss_lsb, prss_zero, prss_multi, PRSSContext
 from viff.field import GF256, FieldElement
 from viff.util import rand, profile
 
-from twisted.internet.defer import gatherResults
+from twisted.internet.defer import Deferred, gatherResults
+
+
+def _vector_add(field, xs, ys):
+    """Element-wise addition of two lists of integers from *field*."""
+    if field is GF256:
+        return map(operator.xor, xs, ys)
+    modulus = field.modulus
+    return [(x + y) % modulus for x, y in zip(xs, ys)]
+
+
+def _vector_sub(field, xs, ys):
+    """Element-wise subtraction of two lists of integers from *field*."""
+    if field is GF256:
+        return map(operator.xor, xs, ys)
+    modulus = field.modulus
+    return [(x - y) % modulus for x, y in zip(xs, ys)]
+
+
+def _vector_mul(field, xs, ys):
+    """Element-wise multiplication of two lists of integers from
+    *field*."""
+    if field is GF256:
+        return [(field(x) * y).value for x, y in zip(xs, ys)]
+    modulus = field.modulus
+    return [(x * y) % modulus for x, y in zip(xs, ys)]
 
 
 class PassiveRuntime(Runtime):
@@ -53,6 +79,8 @@ class PassiveRuntime(Runtime):
     def __init__(self, player, threshold, options=None):
         """Initialize runtime."""
         Runtime.__init__(self, player, threshold, options)
+        #: PRSS contexts for this player, see :meth:`prss_context`.
+        self._prss_contexts = {}
 
     def output(self, share, receivers=None, threshold=None):
         return self.open(share, receivers, threshold)
@@ -216,6 +244,306 @@ class PassiveRuntime(Runtime):
 
         return result
 
+    def mul_many(self, shares_a, shares_b):
+        """Multiplication of many pairs of shares.
+
+        Does the same as calling :meth:`mul` on each pair of shares
+        from *shares_a* and *shares_b*, but all products are reshared
+        together using :func:`~viff.shamir.share_many` and
+        :func:`~viff.shamir.recombine_many`. The shares are sent as
+        one vector per player instead of one message per product. A
+        list of :class:`Share` objects is returned.
+
+        Communication cost: 1 Shamir sharing of a vector.
+        """
+        assert len(shares_a) == len(shares_b), \
+            "Number of shares should be equal."
+        for share in shares_a + shares_b:
+            assert isinstance(share, Share), "Shares should be shares."
+
+        if not shares_a:
+            return []
+
+        field = shares_a[0].field
+        count = len(shares_a)
+
+        def share_recombine(values):
+            products = map(operator.mul, values[:count], values[count:])
+            shares = shamir.share_many(products, self.threshold,
+                                       self.num_players)
+
+            exchanged_shares = []
+            for peer_id, vector in shares:
+                d = self._exchange_share_vector(peer_id.value, field, vector)
+                d.addCallback(lambda vector, peer_id: (peer_id, vector),
+                              peer_id)
+                exchanged_shares.append(d)
+
+            # Recombine the first 2t+1 shares.
+            result = gather_shares(exchanged_shares[:2*self.threshold+1])
+            result.addCallback(shamir.recombine_many)
+            return result
+
+        def split_result(values, results):
+            for result, value in zip(results, values):
+                result.callback(value)
+
+        products = gather_shares(shares_a + shares_b)
+        self.schedule_callback(products, share_recombine)
+
+        results = [Share(self, field) for _ in range(count)]
+        products.addCallback(split_result, results)
+
+        # do actual communication
+        self.activate_reactor()
+
+        return results
+
+    def gather_vector(self, shares):
+        """Gather a list of shares into a :class:`SharedVector`.
+
+        All shares must belong to the same field. Use
+        :meth:`split_vector` to go the other way.
+        """
+        assert shares, "Cannot gather an empty list of shares."
+        field = shares[0].field
+        result = SharedVector(self, field, len(shares))
+        values = gather_shares(shares)
+        values.addCallback(lambda values: map(long, values))
+        values.chainDeferred(result)
+        return result
+
+    def split_vector(self, vector):
+        """Split a :class:`SharedVector` into a list of shares."""
+        field = vector.field
+
+        def split_result(values, results):
+            for result, value in zip(results, values):
+                result.callback(field(value))
+            return values
+
+        results = [Share(self, field) for _ in range(len(vector))]
+        vector.addCallback(split_result, results)
+        return results
+
+    def _vector_op(self, vector, other, op, reflected=False):
+        """Apply *op* element-wise to *vector* and *other*.
+
+        The *other* operand can be a :class:`SharedVector`, a
+        :class:`Deferred` yielding a list, a list of constants, or a
+        single constant. With *reflected* set, *other* is used as the
+        first operand of *op*.
+        """
+        field = vector.field
+        length = len(vector)
+
+        if isinstance(other, Deferred):
+            if isinstance(other, SharedVector):
+                assert other.length == length, "Vector lengths differ."
+            values = gatherResults([vector, other])
+            values.addCallback(lambda (xs, ys): (xs, map(long, ys)))
+        else:
+            if isinstance(other, (list, tuple)):
+                assert len(other) == length, "Vector lengths differ."
+                ys = map(long, other)
+            else:
+                ys = [long(other)] * length
+            values = gatherResults([vector])
+            values.addCallback(lambda (xs,): (xs, ys))
+
+        if reflected:
+            values.addCallback(lambda (xs, ys): op(field, ys, xs))
+        else:
+            values.addCallback(lambda (xs, ys): op(field, xs, ys))
+
+        result = SharedVector(self, field, length)
+        values.chainDeferred(result)
+        return result
+
+    def add_vector(self, vector_a, vector_b):
+        """Element-wise addition of shared vectors.
+
+        The *vector_b* can also be a list of constants or a single
+        constant which is added to every element.
+
+        Communication cost: none.
+        """
+        return self._vector_op(vector_a, vector_b, _vector_add)
+
+    def sub_vector(self, vector_a, vector_b):
+        """Element-wise subtraction of shared vectors.
+
+        One of the operands can be a list of constants or a single
+        constant.
+
+        Communication cost: none.
+        """
+        if not isinstance(vector_a, SharedVector):
+            return self._vector_op(vector_b, vector_a, _vector_sub,
+                                   reflected=True)
+        return self._vector_op(vector_a, vector_b, _vector_sub)
+
+    def lin_comb_vector(self, coefficients, vectors):
+        """Linear combination of shared vectors.
+
+        Element k of the resulting :class:`SharedVector` is the sum of
+        ``coefficients[i] * vectors[i][k]``. A coefficient can be a
+        single constant or a list of constants, one per element.
+
+        Communication cost: none.
+        """
+        assert vectors, "Cannot combine an empty list of vectors."
+        assert len(coefficients) == len(vectors), \
+            "Number of coefficients and vectors should be equal."
+        field = vectors[0].field
+        length = len(vectors[0])
+        for vector in vectors:
+            assert isinstance(vector, SharedVector), \
+                "Vectors should be shared vectors."
+            assert len(vector) == length, "Vector lengths differ."
+
+        scalings = []
+        for coeff in coefficients:
+            if isinstance(coeff, (list, tuple)):
+                assert len(coeff) == length, "Vector lengths differ."
+                scalings.append(map(long, coeff))
+            else:
+                scalings.append([long(coeff)] * length)
+
+        def computation(vectors):
+            if field is GF256:
+                result = [0] * length
+                for cs, xs in zip(scalings, vectors):
+                    result = _vector_add(field, result,
+                                         _vector_mul(field, cs, xs))
+                return result
+            # Reduce only once after summing the products.
+            result = [0] * length
+            for cs, xs in zip(scalings, vectors):
+                result = [r + c * x for r, c, x in zip(result, cs, xs)]
+            modulus = field.modulus
+            return [r % modulus for r in result]
+
+        result = SharedVector(self, field, length)
+        values = gatherResults(vectors)
+        values.addCallback(computation)
+        values.chainDeferred(result)
+        return result
+
+    def mul_vector(self, vector_a, vector_b):
+        """Element-wise multiplication of shared vectors.
+
+        Multiplication by a list of constants or a single constant is
+        done locally. Otherwise the products are reshared like in
+        :meth:`mul_many` and each player sends one vector to every
+        other player.
+
+        Communication cost: 1 Shamir sharing of a vector.
+        """
+        assert isinstance(vector_a, SharedVector), \
+            "vector_a must be a SharedVector."
+
+        if not isinstance(vector_b, SharedVector):
+            return self._vector_op(vector_a, vector_b, _vector_mul)
+
+        assert len(vector_a) == len(vector_b), "Vector lengths differ."
+        field = vector_a.field
+        length = len(vector_a)
+
+        if length == 0:
+            return SharedVector(self, field, 0, [])
+
+        def share_recombine((xs, ys)):
+            products = _vector_mul(field, xs, ys)
+            shares = shamir.share_many(products, self.threshold,
+                                       self.num_players, field)
+
+            exchanged_shares = []
+            for peer_id, vector in shares:
+                d = self._exchange_share_vector(peer_id.value, field, vector)
+                d.addCallback(lambda vector, peer_id: (peer_id, vector),
+                              peer_id)
+                exchanged_shares.append(d)
+
+            # Recombine the first 2t+1 shares.
+            result = gather_shares(exchanged_shares[:2*self.threshold+1])
+            result.addCallback(shamir.recombine_many)
+            result.addCallback(lambda values: map(long, values))
+            return result
+
+        result = SharedVector(self, field, length)
+        values = gatherResults([vector_a, vector_b])
+        self.schedule_callback(values, share_recombine)
+        values.chainDeferred(result)
+
+        # do actual communication
+        self.activate_reactor()
+
+        return result
+
+    def open_vector(self, vector, receivers=None, threshold=None):
+        """Open a shared vector.
+
+        Works like :meth:`open`, but the shares are sent as a single
+        vector to each receiver. The result is a :class:`Deferred`
+        which yields a list of field elements.
+
+        Communication cost: every player sends one vector to each
+        receiving player.
+        """
+        assert isinstance(vector, SharedVector)
+        # all players receive result by default
+        if receivers is None:
+            receivers = self.players.keys()
+        if threshold is None:
+            threshold = self.threshold
+        field = vector.field
+        length = len(vector)
+
+        def filter_good_shares(results):
+            # Filter results, which is a list of (success, share)
+            # pairs.
+            return [result[1] for result in results
+                    if result is not None and result[0]][:threshold+1]
+
+        def exchange(values):
+            # Send vector to all receivers.
+            for peer_id in receivers:
+                if peer_id != self.id:
+                    pc = tuple(self.program_counter)
+                    self.protocols[peer_id].sendShareVector(pc, field, values)
+            # Receive and recombine shares if this player is a receiver.
+            if self.id in receivers:
+                if length == 0:
+                    return []
+                deferreds = []
+                for peer_id in self.players:
+                    if peer_id == self.id:
+                        d = Share(self, field, (field(peer_id), values))
+                    else:
+                        d = self._expect_share_vector(peer_id, field, length)
+                        d.addCallback(lambda vs, peer_id: (field(peer_id), vs),
+                                      peer_id)
+                    deferreds.append(d)
+                shares = ShareList(deferreds, threshold+1)
+                shares.addCallback(filter_good_shares)
+                shares.addCallback(shamir.recombine_many)
+                return shares
+
+        def split_result(values):
+            result.callback(values)
+            return values
+
+        result = Deferred()
+        vector.addCallback(split_result)
+        self.schedule_callback(result, exchange)
+
+        # do actual communication
+        self.activate_reactor()
+
+        if self.id in receivers:
+            return result
+
     def pow(self, share, exponent):
         """Exponentation of a share to an integer by square-and-multiply."""
 
@@ -263,6 +591,28 @@ class PassiveRuntime(Runtime):
         self.increment_pc()
         return tuple(self.program_counter)
 
+    def prss_context(self, field, player=None, prfs=None):
+        """Return the :class:`~viff.prss.PRSSContext` for *field*.
+
+        The context is for the shares of *player* (default this
+        player) and the subsets of *prfs* (default the PRSS keys of
+        this player). It is made the first time it is needed and then
+        reused by the PRSS methods of this runtime.
+        """
+        if player is None:
+            player = self.id
+        if prfs is None:
+            subsets = self.players[self.id].keys.keys()
+        else:
+            subsets = prfs.keys()
+        key = (field, player, frozenset(subsets))
+        try:
+            return self._prss_contexts[key]
+        except KeyError:
+            context = PRSSContext(self.num_players, player, field, subsets)
+            self._prss_contexts[key] = context
+            return context
+
     def prss_share(self, inputters, field, element=None):
         """Creates pseudo-random secret sharings.
 
@@ -303,7 +653,8 @@ class PassiveRuntime(Runtime):
         # Compute and broadcast correction value.
         if self.id in inputters:
             for player in self.players:
-                share = prss(n, player, field, prfs[self.id], key)
+                share = prss(n, player, field, prfs[self.id], key,
+                             self.prss_context(field, player, prfs[self.id]))
                 all_shares.append((field(player), share))
             shared = shamir.recombine(all_shares[:self.threshold+1])
             correction = element - shared
@@ -317,7 +668,9 @@ class PassiveRuntime(Runtime):
         # Receive correction value from inputters and compute share.
         result = []
         for player in inputters:
-            tmp_shares[player] = prss(n, self.id, field, prfs[player], key)
+            tmp_shares[player] = prss(n, self.id, field, prfs[player], key,
+                                      self.prss_context(field, self.id,
+                                                        prfs[player]))
             if player == self.id:
                 d = Share(self, field, correction)
             else:
@@ -347,7 +700,8 @@ class PassiveRuntime(Runtime):
         # Key used for PRSS.
         prss_key = self.prss_key()
         prfs = self.players[self.id].prfs(modulus)
-        share = prss(self.num_players, self.id, field, prfs, prss_key)
+        share = prss(self.num_players, self.id, field, prfs, prss_key,
+                     self.prss_context(field))
 
         if field is GF256 or not binary:
             return Share(self, field, share)
@@ -387,9 +741,9 @@ class PassiveRuntime(Runtime):
 
         # Key used for PRSS.
         prss_key = self.prss_key()
-        prfs = self.players[self.id].prfs(modulus ** quantity)
+        prfs = self.players[self.id].prfs(modulus)
         shares = prss_multi(self.num_players, self.id, field, prfs, prss_key,
-                            modulus, quantity)
+                            modulus, quantity, self.prss_context(field))
         return [Share(self, field, share) for share in shares]
 
     def prss_share_zero(self, field, quantity):
@@ -402,7 +756,8 @@ class PassiveRuntime(Runtime):
         prss_key = self.prss_key()
         prfs = self.players[self.id].prfs(field.modulus)
         zero_share = prss_zero(self.num_players, self.threshold, self.id,
-                               field, prfs, prss_key, quantity)
+                               field, prfs, prss_key, quantity,
+                               self.prss_context(field))
         return [Share(self, field, zero_share[i]) for i in range(quantity)]
 
     def prss_double_share(self, field, quantity):
@@ -415,6 +770,105 @@ class PassiveRuntime(Runtime):
         z_2t = self.prss_share_zero(field, quantity)
         return (r_t, [r_t[i] + z_2t[i] for i in range(quantity)])
 
+    def prss_share_random_vector(self, field, quantity):
+        """Generate a :class:`SharedVector` of *quantity* random
+        elements from *field* using PRSS.
+
+        Communication cost: none.
+        """
+        prss_key = self.prss_key()
+        prfs = self.players[self.id].prfs(field.modulus)
+        shares = prss_multi(self.num_players, self.id, field, prfs, prss_key,
+                            field.modulus, quantity, self.prss_context(field))
+        return SharedVector(self, field, quantity, map(long, shares))
+
+    def prss_double_share_vector(self, field, quantity):
+        """Make *quantity* double-sharings using PRSS.
+
+        Like :meth:`prss_double_share`, but the result is a pair of
+        :class:`SharedVector` objects with degree t and 2t.
+
+        Communication cost: none.
+        """
+        r_t = self.prss_share_random_vector(field, quantity)
+        prss_key = self.prss_key()
+        prfs = self.players[self.id].prfs(field.modulus)
+        z_2t = prss_zero(self.num_players, self.threshold, self.id,
+                         field, prfs, prss_key, quantity,
+                         self.prss_context(field))
+        return (r_t, r_t + map(long, z_2t))
+
+    def prss_share_random_bits(self, field, quantity):
+        """Generate *quantity* shares of random 0/1 elements from
+        *field*.
+
+        Does the same as calling :meth:`prss_share_random` with
+        *binary* set *quantity* times, but see
+        :meth:`prss_share_random_bit_vector` for the cost.
+        """
+        if quantity == 0:
+            return []
+        return self.split_vector(self.prss_share_random_bit_vector(field,
+                                                                   quantity))
+
+    def prss_share_random_bit_vector(self, field, quantity):
+        """Generate a :class:`SharedVector` of *quantity* random 0/1
+        elements from *field*.
+
+        The random elements are made with a single call to
+        :func:`~viff.prss.prss_multi`. Like in
+        :meth:`prss_share_random`, their squares are opened and the
+        elements are divided by the square roots. The squares are
+        opened as one vector. The elements whose square is zero are
+        made again in one follow-up batch.
+
+        Communication cost: 1 vector opening, and rarely another to
+        replace zeros.
+        """
+        if field is GF256:
+            prss_key = self.prss_key()
+            prfs = self.players[self.id].prfs(2)
+            shares = prss_multi(self.num_players, self.id, field, prfs,
+                                prss_key, 2, quantity,
+                                self.prss_context(field))
+            return SharedVector(self, field, quantity, map(long, shares))
+        if quantity == 0:
+            return SharedVector(self, field, 0, [])
+
+        randoms = self.prss_share_random_vector(field, quantity)
+        squares = self.open_vector(self._vector_op(randoms, randoms,
+                                                   _vector_mul),
+                                   threshold=2*self.threshold)
+
+        def finish((squares, randoms)):
+            bits = []
+            retry = []
+            for index, (square, share) in enumerate(zip(squares, randoms)):
+                if square == 0:
+                    # We were unlucky, the element is made again below.
+                    retry.append(index)
+                    bits.append(None)
+                else:
+                    # Convert the -1/1 share into a 0/1 share.
+                    root = square.sqrt()
+                    bits.append(((field(share) / root + 1) / 2).value)
+            if not retry:
+                return bits
+
+            def fill(more):
+                for index, bit in zip(retry, more):
+                    bits[index] = bit
+                return bits
+            more = self.prss_share_random_bit_vector(field, len(retry))
+            more.addCallback(fill)
+            return more
+
+        result = SharedVector(self, field, quantity)
+        values = gatherResults([squares, randoms])
+        self.schedule_callback(values, finish)
+        values.chainDeferred(result)
+        return result
+
     def prss_share_bit_double(self, field):
         """Share a random bit over *field* and GF256.
 
@@ -429,7 +883,9 @@ class PassiveRuntime(Runtime):
         prss_key = self.prss_key()
 
         b_p = self.prss_share_random(field, binary=True)
-        r_p, r_lsb = prss_lsb(n, self.id, field, prfs, prss_key)
+        r_p, r_lsb = prss_lsb(n, self.id, field, prfs, prss_key,
+                              self.prss_context(field),
+                              self.prss_context(GF256))
 
         b = self.open(b_p + r_p)
         # Extract least significant bit and change field to GF256.
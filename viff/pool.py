@@ -0,0 +1,237 @@
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Preprocessed data on disk.
+
+The pool of preprocessed data (see :ref:`preprocessing`) can be
+written to a file with :func:`save_pool` after an offline phase. A
+later run loads it again with :class:`PoolFile`, which memory-maps the
+file and only decodes an item when it is taken from the pool.
+
+The file starts with a header holding the number of players, the
+threshold, the computation ID, and the moduli of the fields used. A
+pool is only accepted by a runtime with the same parameters. Each
+item is stored as a record with its program counter, the field, and
+the field elements in fixed-width binary form.
+"""
+
+import mmap
+import struct
+from binascii import hexlify, unhexlify
+
+from viff.field import GF, FieldElement
+from viff.runtime import element_size
+
+#: Magic string identifying a pool file.
+MAGIC = "VIFFPOOL"
+
+#: Version of the file format.
+VERSION = 1
+
+# Header: magic, version, players, threshold, computation ID, and
+# number of fields. The header is followed by the fields, each given
+# by the length of the modulus in bytes and the modulus.
+_header = struct.Struct("!8sBHHIB")
+
+# Record: length of the program counter, index of the field, a flag
+# telling if the item is a single element, and the number of
+# elements. The record is followed by the program counter and the
+# elements.
+_record = struct.Struct("!BBBH")
+
+_SINGLE = 0
+_SEQUENCE = 1
+
+
+class PoolError(Exception):
+    """Raised when a pool file does not match the runtime."""
+    pass
+
+
+def _encode_number(value, size):
+    return unhexlify("%0*x" % (2 * size, value))
+
+
+def _decode_number(data):
+    return long(hexlify(data), 16)
+
+
+def save_pool(filename, items, num_players, threshold, computation_id):
+    """Write preprocessed *items* to *filename*.
+
+    The *items* is a list of ``(program counter, item)`` pairs where
+    an item is a field element or a list or tuple of field elements,
+    like the pool in :class:`~viff.runtime.Runtime`.
+    """
+    fields = []
+    records = []
+    for pc, item in items:
+        if isinstance(item, FieldElement):
+            kind, elements = _SINGLE, [item]
+        elif isinstance(item, (list, tuple)):
+            kind, elements = _SEQUENCE, list(item)
+        else:
+            kind, elements = _SEQUENCE, []
+        if not elements or \
+                not all([isinstance(e, FieldElement) for e in elements]):
+            raise ValueError("Cannot store %r in a pool file" % (item,))
+
+        field = elements[0].field
+        for element in elements:
+            if element.field is not field:
+                raise ValueError("Item with mixed fields: %r" % (item,))
+        if field not in fields:
+            fields.append(field)
+
+        size = element_size(field)
+        records.append(_record.pack(len(pc), fields.index(field), kind,
+                                    len(elements)))
+        records.append(struct.pack("!%dI" % len(pc), *pc))
+        records.append("".join([_encode_number(e.value, size)
+                                for e in elements]))
+
+    header = [_header.pack(MAGIC, VERSION, num_players, threshold,
+                           computation_id or 0, len(fields))]
+    for field in fields:
+        # The modulus itself may need more bytes than the elements.
+        size = (len("%x" % field.modulus) + 1) // 2
+        header.append(struct.pack("!H", size))
+        header.append(_encode_number(field.modulus, size))
+
+    out = open(filename, "wb")
+    try:
+        out.write("".join(header + records))
+    finally:
+        out.close()
+
+
+class PoolFile(object):
+    """Pool of preprocessed data backed by a file.
+
+    The file is memory-mapped and indexed by program counter when it
+    is opened. Items are decoded lazily by :meth:`pop`. The object can
+    replace the dictionary normally used for :attr:`Runtime._pool`;
+    items added by :meth:`update` are kept in memory.
+    """
+
+    def __init__(self, filename, num_players, threshold, computation_id,
+                 fields=None):
+        """Open the pool in *filename*.
+
+        A :exc:`PoolError` is raised if the pool was made for other
+        players, threshold, or computation ID. If a list of *fields*
+        is given, the pool may only hold elements from these fields.
+        """
+        self.filename = filename
+        pool_file = open(filename, "rb")
+        try:
+            try:
+                self._data = mmap.mmap(pool_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped.
+                raise PoolError("%s is not a pool file" % filename)
+        finally:
+            pool_file.close()
+
+        try:
+            magic, version, n, t, comp_id, num_fields = \
+                _header.unpack_from(self._data, 0)
+        except struct.error:
+            raise PoolError("%s is not a pool file" % filename)
+        if magic != MAGIC or version != VERSION:
+            raise PoolError("%s is not a pool file" % filename)
+        if (n, t, comp_id) != (num_players, threshold, computation_id or 0):
+            raise PoolError("%s was made for n=%d, t=%d, computation ID %d, "
+                            "not n=%d, t=%d, computation ID %d"
+                            % (filename, n, t, comp_id, num_players,
+                               threshold, computation_id or 0))
+
+        offset = _header.size
+        self._fields = []
+        for _ in range(num_fields):
+            size, = struct.unpack_from("!H", self._data, offset)
+            offset += 2
+            modulus = _decode_number(self._data[offset:offset+size])
+            offset += size
+            if fields is not None and \
+                    modulus not in [f.modulus for f in fields]:
+                raise PoolError("%s holds elements modulo %d, not modulo %s"
+                                % (filename, modulus,
+                                   ", ".join([str(f.modulus)
+                                              for f in fields])))
+            self._fields.append(GF(modulus))
+
+        #: Mapping from program counter to offset of the record.
+        self._index = {}
+        while offset < len(self._data):
+            pc_size, field_index, kind, count = \
+                _record.unpack_from(self._data, offset)
+            pc = struct.unpack_from("!%dI" % pc_size, self._data,
+                                    offset + _record.size)
+            self._index[pc] = offset
+            size = element_size(self._fields[field_index])
+            offset += _record.size + 4 * pc_size + count * size
+
+        #: Items added after the file was opened.
+        self._extra = {}
+
+    def _decode(self, offset):
+        pc_size, field_index, kind, count = \
+            _record.unpack_from(self._data, offset)
+        field = self._fields[field_index]
+        size = element_size(field)
+        offset += _record.size + 4 * pc_size
+        elements = [field(_decode_number(self._data[i:i+size]))
+                    for i in range(offset, offset + count * size, size)]
+        if kind == _SINGLE:
+            return elements[0]
+        else:
+            return elements
+
+    def pop(self, pc):
+        """Remove the item for *pc* and return it.
+
+        Raises :exc:`KeyError` if there is no such item.
+        """
+        try:
+            return self._extra.pop(pc)
+        except KeyError:
+            return self._decode(self._index.pop(pc))
+
+    def update(self, items):
+        """Add ``(program counter, item)`` pairs to the pool."""
+        self._extra.update(items)
+
+    def keys(self):
+        return self._index.keys() + self._extra.keys()
+
+    def items(self):
+        """Decode and return all remaining items."""
+        return [(pc, self._decode(offset))
+                for pc, offset in self._index.iteritems()] + \
+            self._extra.items()
+
+    def __contains__(self, pc):
+        return pc in self._extra or pc in self._index
+
+    def __len__(self):
+        return len(self._index) + len(self._extra)
+
+    def close(self):
+        """Close the memory-mapped file."""
+        self._data.close()
@@ -41,8 +41,11 @@ Cramer, Ivan Damgård, and Yuval Ishai in Proc. of TCC 2005, LNCS 3378.
 """
 
 import sha
+import struct
+import operator
 from math import ceil
 from binascii import hexlify
+from hashlib import sha512
 
 from gmpy import numdigits
 
@@ -86,8 +89,95 @@ def convert_replicated_shamir(n, j, field, rep_shares):
         result += share * f_in_j
     return result
 
-@fake(lambda n, j, field, prfs, key: field(7))
-def prss(n, j, field, prfs, key):
+
+class PRSSContext(object):
+    """Precomputed tables for the PRSS functions.
+
+    A context holds what player *j* out of *n* needs in order to
+    convert replicated shares over *field* into Shamir shares: the
+    subsets containing *j* and the value in *j* of the polynomial f
+    used for each subset (see :func:`convert_replicated_shamir`). For
+    prime fields the values are stored as integers, which makes a
+    conversion a dot product of integers with a single reduction.
+
+    >>> from field import GF
+    >>> Zp = GF(31)
+    >>> subsets = [frozenset([1,2]), frozenset([1,3]), frozenset([2,3])]
+    >>> context = PRSSContext(3, 1, Zp, subsets)
+    >>> len(context.subsets)
+    2
+
+    If every subset holds the value 1, the secret is the sum 3 and
+    any two players can recombine it:
+
+    >>> shares = [(Zp(j), PRSSContext(3, j, Zp, subsets).convert([1, 1]))
+    ...           for j in (1, 2)]
+    >>> from shamir import recombine
+    >>> recombine(shares)
+    {3}
+
+    A runtime builds a context once per player and field and passes
+    it to the PRSS functions, see
+    :meth:`~viff.passive.PassiveRuntime.prss_context`.
+    """
+
+    def __init__(self, n, j, field, subsets):
+        self.n = n
+        self.j = j
+        self.field = field
+        #: The subsets containing *j*, in the order used by the tables.
+        self.subsets = [subset for subset in subsets if j in subset]
+
+        all = frozenset(range(1, n+1))
+        f_in_j = []
+        for subset in self.subsets:
+            points = [(field(x), 0) for x in all-subset]
+            points.append((0, 1))
+            f_in_j.append(shamir.recombine(points, j))
+
+        #: True if the tables hold integers instead of field elements.
+        self.integers = field is not GF256
+        if self.integers:
+            f_in_j = [long(f) for f in f_in_j]
+        #: The value of f in j for each subset.
+        self.f_in_j = f_in_j
+        self._g_in_j = {}
+
+    def convert(self, values):
+        """Convert a replicated sharing to a Shamir share.
+
+        The *values* are the replicated shares given in the order of
+        :attr:`subsets`.
+        """
+        if self.integers:
+            return self.field(sum(map(operator.mul, values, self.f_in_j)))
+        else:
+            return sum(map(operator.mul, self.f_in_j, values))
+
+    def g_in_j(self, t):
+        """Return the table used by :func:`prss_zero` for threshold *t*.
+
+        For each subset the table has the values of g_i(j) = f(j) *
+        j**i for i from 1 to *t*.
+        """
+        try:
+            return self._g_in_j[t]
+        except KeyError:
+            j = self.field(self.j)
+            powers = [j**i for i in range(1, t+1)]
+            if self.integers:
+                modulus = self.field.modulus
+                powers = [long(power) for power in powers]
+                table = [[f * power % modulus for power in powers]
+                         for f in self.f_in_j]
+            else:
+                table = [[f * power for power in powers]
+                         for f in self.f_in_j]
+            self._g_in_j[t] = table
+            return table
+
+@fake(lambda n, j, field, prfs, key, context=None: field(7))
+def prss(n, j, field, prfs, key, context=None):
     """Return a pseudo-random secret share for a random number.
 
     The share is for player *j* based on the pseudo-random functions
@@ -110,25 +200,45 @@ def prss(n, j, field, prfs, key):
 
     We see that the sharing is consistent because each subset of two
     players will recombine their shares to ``{24}``.
+
+    The *context* is a :class:`PRSSContext` for *n*, *j*, *field*,
+    and the subsets of *prfs*. If it is not given, one is made for
+    this call only. This holds for the other PRSS functions too.
     """
-    rep_shares = random_replicated_sharing(j, prfs, key)
-    return convert_replicated_shamir(n, j, field, rep_shares)
+    if context is None:
+        context = PRSSContext(n, j, field, prfs.keys())
+    return context.convert([prfs[s](key) for s in context.subsets])
+
+def prss_multi(n, j, field, prfs, key, modulus, quantity, context=None):
+    """Does the same as :meth:`prss`, but *quantity* times and with
+    numbers less than *modulus*.
+
+    Each PRF is evaluated once using :meth:`PRF.stream`, so the number
+    of hash invocations only grows with the number of bytes needed.
+    The maximum of the PRFs is not used.
 
-def prss_multi(n, j, field, prfs, key, modulus, quantity):
-    """Does the same as :meth:`prss`, but multiple times in order to
-    call the PRFs less frequently.
+    >>> from field import GF
+    >>> Zp = GF(31)
+    >>> prfs = {frozenset([1,2]): PRF("a", 31),
+    ...         frozenset([1,3]): PRF("b", 31),
+    ...         frozenset([2,3]): PRF("c", 31)}
+    >>> a = prss_multi(3, 1, Zp, prfs, "key", 31, 4)
+    >>> b = prss_multi(3, 2, Zp, prfs, "key", 31, 4)
+    >>> c = prss_multi(3, 3, Zp, prfs, "key", 31, 4)
+    >>> from shamir import recombine
+    >>> [recombine([(Zp(1), x), (Zp(2), y)]) for x, y in zip(a, b)] == \\
+    ...     [recombine([(Zp(2), y), (Zp(3), z)]) for y, z in zip(b, c)]
+    True
     """
-    prf_results = random_replicated_sharing(j, prfs, key)
-    rep_shares_list = [[] for i in range(quantity)]
-    for subset, result in prf_results:
-        for i in range(quantity):
-            rep_shares_list[i].append((subset, result % modulus))
-            result /= modulus
-    return [convert_replicated_shamir(n, j, field, rep_shares)
-            for rep_shares in rep_shares_list]
-
-@fake(lambda n, j, field, prfs, key: (field(7), GF256(1)))
-def prss_lsb(n, j, field, prfs, key):
+    if context is None:
+        context = PRSSContext(n, j, field, prfs.keys())
+    streams = [prfs[s].stream(key, modulus, quantity)
+               for s in context.subsets]
+    return map(context.convert, zip(*streams))
+
+@fake(lambda n, j, field, prfs, key, context=None, lsb_context=None:
+          (field(7), GF256(1)))
+def prss_lsb(n, j, field, prfs, key, context=None, lsb_context=None):
     """Share a pseudo-random number and its least significant bit.
 
     The random number is shared over *field* and its least significant
@@ -160,75 +270,72 @@ def prss_lsb(n, j, field, prfs, key):
     [0]
     >>> recombine([(GF256(3), GF256(143)), (GF256(1), GF256(140))])
     [0]
-    """
-    rep_shares = random_replicated_sharing(j, prfs, key)
-    lsb_shares = [(s, r & 1) for (s, r) in rep_shares]
-    return (convert_replicated_shamir(n, j, field, rep_shares),
-            convert_replicated_shamir(n, j, GF256, lsb_shares))
 
-@fake(lambda n, t, j, field, prfs, key, quantity: [field(0)] * quantity)
-def prss_zero(n, t, j, field, prfs, key, quantity):
+    The *lsb_context* is the :class:`PRSSContext` for :class:`GF256`.
+    """
+    if context is None:
+        context = PRSSContext(n, j, field, prfs.keys())
+    if lsb_context is None:
+        lsb_context = PRSSContext(n, j, GF256, prfs.keys())
+    values = [prfs[s](key) for s in context.subsets]
+    return (context.convert(values),
+            lsb_context.convert([r & 1 for r in values]))
+
+@fake(lambda n, t, j, field, prfs, key, quantity, context=None:
+          [field(0)] * quantity)
+def prss_zero(n, t, j, field, prfs, key, quantity, context=None):
     """Return *quantity* pseudo-random secret zero-sharings of degree 2t.
 
+    As in :func:`prss_multi`, the random numbers are taken from
+    :meth:`PRF.stream` and the maximum of the PRFs is not used.
+
     >>> from field import GF
     >>> Zp = GF(23)
     >>> prfs = {frozenset([1,2]): PRF("a", 7),
     ...         frozenset([1,3]): PRF("b", 7),
     ...         frozenset([2,3]): PRF("c", 7)}
     >>> prss_zero(3, 1, 1, Zp, prfs, "key", 1)
-    [{16}]
+    [{11}]
     >>> prss_zero(3, 1, 2, Zp, prfs, "key", 1)
-    [{13}]
+    [{11}]
     >>> prss_zero(3, 1, 3, Zp, prfs, "key", 1)
-    [{14}]
+    [{0}]
 
     If we recombine 2t + 1 = 3 shares we can verify that this is
     indeed a zero-sharing:
 
     >>> from shamir import recombine
-    >>> recombine([(Zp(1), Zp(4)), (Zp(2), Zp(0)), (Zp(3), Zp(11))])
+    >>> recombine([(Zp(1), Zp(11)), (Zp(2), Zp(11)), (Zp(3), Zp(0))])
     {0}
     """
-    # We start by generating t random numbers for each subset. This is
-    # very similar to calling random_replicated_sharing t times, but
-    # by doing it like this we immediatedly get the nesting we want.
-    rep_shares = [(s, [(i+1, prf((key, i))) for i in range(t)])
-                  for (s, prf) in prfs.iteritems() if j in s]
-
-    # We then proceed with the zero-sharing. The first part is like in
-    # a normal PRSS.
-    result = [0] * quantity
-    all = frozenset(range(1, n+1))
+    if context is None:
+        context = PRSSContext(n, j, field, prfs.keys())
     modulus = field.modulus
-
-    # This is needed for correct exponentiation.
-    j = field(j)
-
-    for subset, shares in rep_shares:
-        try:
-            f_in_j = _f_in_j_cache[(field, n, j, subset)]
-        except KeyError:
-            points = [(field(x), 0) for x in all-subset]
-            points.append((0, 1))
-            f_in_j = shamir.recombine(points, j)
-            _f_in_j_cache[(field, n, j, subset)] = f_in_j
-
-        # Unlike a normal PRSS we have an inner sum where we use a
-        # degree 2t polynomial g_i which we choose as
-        #
-        #   g_i(x) = f(x) * x**j
-        #
-        # since we already have the degree t polynomial f at hand. The
-        # g_i are all linearly independent as required by the protocol
-        # and can thus be used for the zero-sharing.
-        for i, packed_share in shares:
-            g_i_in_j = f_in_j * j**i
-
+    inputs = [(key, i) for i in range(t)]
+
+    # Like in a normal PRSS we have a sum over the subsets, but each
+    # subset has an inner sum where we use a degree 2t polynomial g_i
+    # which we choose as
+    #
+    #   g_i(x) = f(x) * x**i
+    #
+    # since we already have the degree t polynomial f at hand. The
+    # g_i are all linearly independent as required by the protocol
+    # and can thus be used for the zero-sharing. The values g_i(j) are
+    # taken from the context. Each PRF is evaluated once per g_i
+    # using PRF.stream to get quantity random numbers.
+    result = [0] * quantity
+    for subset, g_in_j in zip(context.subsets, context.g_in_j(t)):
+        prf = prfs[subset]
+        for input, g_i_in_j in zip(inputs, g_in_j):
+            stream = prf.stream(input, modulus, quantity)
             for k in range(quantity):
-                result[k] += (packed_share % modulus) * g_i_in_j
-                packed_share /= modulus
+                result[k] += stream[k] * g_i_in_j
 
-    return result
+    if context.integers:
+        return [field(r) for r in result]
+    else:
+        return result
 
 def generate_subsets(orig_set, size):
     """Generates the set of all subsets of a specific size.
@@ -385,45 +492,120 @@ class PRF(object):
         that the input must have a deterministic ``__str__``
         method. This means that hashable instances are probably best.
         """
-        # We can only feed str data to sha1 instance, so we must
-        # convert the input.
+        return self.many((input,))[0]
+
+    def many(self, inputs):
+        """Evaluate the PRF on many inputs.
+
+        This gives the same as calling the PRF on each input:
+
+        >>> prf = PRF("key", 1000)
+        >>> prf.many([1, 2, 3])
+        [501L, 432L, 133L]
+
+        The keyed SHA1 instances and the conversion of the digests
+        are set up once for all the inputs.
+        """
+        sha1s = self.sha1s
+        max = self.max
+        size = self.bytes
+        if self.bits:
+            shift = 8 - self.bits
+        else:
+            shift = 0
+
+        results = []
+        for input in inputs:
+            # We can only feed str data to sha1 instance, so we must
+            # convert the input.
+            if not isinstance(input, str):
+                input = str(input)
+
+            # There is a chance that we generate a number that is too
+            # big, so we must keep trying until we succeed.
+            while True:
+                # We collect a digest for each keyed sha1 instance.
+                # Each must work on a copy of the keyed sha1 instance.
+                digests = []
+                for sha1 in sha1s:
+                    copy = sha1.copy()
+                    copy.update(input)
+                    digests.append(copy.digest())
+
+                digest = ''.join(digests)
+
+                # Convert the random bytes to a long by converting it
+                # to hexadecimal representation first. Then shift to
+                # get rid of the surplus bits.
+                result = long(hexlify(digest[:size]), 16) >> shift
+
+                if result < max:
+                    results.append(result)
+                    break
+                else:
+                    # TODO: is this safe? The first idea was to append
+                    # a fixed string (".") every time, but that makes
+                    # f("a") and f("a.") return the same number.
+                    #
+                    # The final byte of the digest depends on the key
+                    # which means that it should not be possible to
+                    # predict it and so it should be hard to find
+                    # pairs of inputs which give the same output value.
+                    input += digest[-1]
+        return results
+
+    def stream(self, input, modulus, quantity):
+        """Return *quantity* numbers less than *modulus*.
+
+        The numbers are taken from a stream of bytes made by hashing
+        a seed and a counter with SHA-512. The seed is the keyed hash
+        of the input, and so only the first block of the key is used.
+        Many numbers are thus made with few hash invocations compared
+        to evaluating a PRF with a maximum of ``modulus**quantity``.
+
+        >>> prf = PRF("key", 1000)
+        >>> prf.stream("input", 1000, 5)
+        [816L, 552L, 244L, 333L, 647L]
+        >>> prf.stream("input", 1000, 3)
+        [816L, 552L, 244L]
+        >>> prf.stream("input", 2, 10)
+        [1L, 0L, 1L, 1L, 1L, 0L, 1L, 1L, 0L, 0L]
+
+        The numbers are sampled without bias by discarding numbers
+        which are too big.
+        """
         if not isinstance(input, str):
             input = str(input)
 
-        # There is a chance that we generate a number that is too big,
-        # so we must keep trying until we succeed.
-        while True:
-            # We collect a digest for each keyed sha1 instance.
-            digests = []
-            for sha1 in self.sha1s:
-                # Must work on a copy of the keyed sha1 instance.
-                copy = sha1.copy()
-                copy.update(input)
-                digests.append(copy.digest())
-
-            digest = ''.join(digests)
-            random_bytes = digest[:self.bytes]
-
-            # Convert the random bytes to a long by converting it to
-            # hexadecimal representation first.
-            result = long(hexlify(random_bytes), 16)
-
-            # Shift to get rid of the surplus bits (if needed).
-            if self.bits:
-                result >>= (8 - self.bits)
-
-            if result < self.max:
-                return result
-            else:
-                # TODO: is this safe? The first idea was to append a
-                # fixed string (".") every time, but that makes f("a")
-                # and f("a.") return the same number.
-                #
-                # The final byte of the digest depends on the key
-                # which means that it should not be possible to
-                # predict it and so it should be hard to find pairs of
-                # inputs which give the same output value.
-                input += digest[-1]
+        seed = self.sha1s[0].copy()
+        seed.update("stream %d %s" % (modulus, input))
+        seed = seed.digest()
+
+        # Each number uses size bytes of which we keep bit_length bits.
+        bit_length = numdigits(modulus - 1, 2)
+        size = int(ceil(bit_length / 8.0))
+        shift = 8 * size - bit_length
+        width = 2 * size
+
+        result = []
+        counter = 0
+        data = ""
+        while len(result) < quantity:
+            # Most numbers are accepted, so we generate enough bytes
+            # for the missing numbers plus a margin in one go.
+            missing = quantity - len(result)
+            blocks = missing * size * 9 // 8 // 64 + 1
+            data += hexlify("".join([sha512(seed + struct.pack("!Q", i)).digest()
+                                     for i in range(counter, counter + blocks)]))
+            counter += blocks
+            end = len(data) - len(data) % width
+            for i in range(0, end, width):
+                value = long(data[i:i+width], 16) >> shift
+                if value < modulus:
+                    result.append(value)
+            # Keep the bytes left over for the next round.
+            data = data[end:]
+        return result[:quantity]
 
 if __name__ == "__main__":
     import doctest    #pragma NO COVER
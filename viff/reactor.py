@@ -19,19 +19,27 @@
 
 """VIFF reactor to have control over the scheduling."""
 
+import sys
+
 from twisted.internet.selectreactor import SelectReactor
 
+try:
+    from twisted.internet.epollreactor import EPollReactor
+except ImportError:
+    EPollReactor = None
 
-class ViffReactor(SelectReactor):
-    """VIFF reactor.
 
-    The only difference to the SelectReactor is the loop call.
-    From there, doIteration() can be called recursively."""
+class ViffReactorMixin:
+    """Loop call support for VIFF reactors.
+
+    The mixin adds a loop call which is called after each iteration.
+    From there, doIteration() can be called recursively. It must be
+    mixed into a Twisted reactor class given by :attr:`base_reactor`.
+    """
+
+    #: The Twisted reactor class providing the real doIteration().
+    base_reactor = None
 
-    def __init__(self):
-        SelectReactor.__init__(self)
-        self.loopCall = lambda: None
-   
     def setLoopCall(self, f):
         self.loopCall = f
 
@@ -43,11 +51,48 @@ class ViffReactor(SelectReactor):
         if t2 is not None:
             t = min(t, self.running and t2)
 
-        SelectReactor.doIteration(self, t)
+        self.base_reactor.doIteration(self, t)
         self.loopCall()
 
+
+class ViffReactor(ViffReactorMixin, SelectReactor):
+    """VIFF reactor.
+
+    The only difference to the SelectReactor is the loop call.
+    From there, doIteration() can be called recursively."""
+
+    base_reactor = SelectReactor
+
+    def __init__(self):
+        SelectReactor.__init__(self)
+        self.loopCall = lambda: None
+
+
+if EPollReactor is not None:
+
+    class EPollViffReactor(ViffReactorMixin, EPollReactor):
+        """VIFF reactor based on epoll.
+
+        Works like :class:`ViffReactor`, but the cost of an iteration
+        does not grow with the number of open connections like it
+        does with select()."""
+
+        base_reactor = EPollReactor
+
+        def __init__(self):
+            EPollReactor.__init__(self)
+            self.loopCall = lambda: None
+
+
 def install():
-    """Use the VIFF reactor."""
-    reactor = ViffReactor()
+    """Use the VIFF reactor.
+
+    The epoll based reactor is used on Linux, the select based
+    reactor elsewhere.
+    """
+    if EPollReactor is not None and sys.platform.startswith("linux"):
+        reactor = EPollViffReactor()
+    else:
+        reactor = ViffReactor()
     from twisted.internet.main import installReactor
     installReactor(reactor)
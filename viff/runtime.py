@@ -33,25 +33,65 @@ from __future__ import division
 
 import time
 import struct
+import signal
+import cPickle as pickle
+import traceback
+import multiprocessing
 from optparse import OptionParser, OptionGroup
 from collections import deque
 import os
 import sys
+from binascii import hexlify, unhexlify
+
+from gmpy import numdigits
 
 from viff.field import GF256, FieldElement
 from viff.util import wrapper, rand, track_memory_usage, begin, end
-from viff.constants import SHARE
+from viff.util import pack_longs, unpack_longs
+from viff.constants import SHARE, SHARES
 import viff.reactor
 
 from twisted.internet import reactor
 from twisted.internet.task import LoopingCall
 from twisted.internet.error import ConnectionDone, CannotListenError
 from twisted.internet.defer import Deferred, DeferredList, gatherResults
-from twisted.internet.defer import maybeDeferred
+from twisted.internet.defer import maybeDeferred, fail, succeed
 from twisted.internet.protocol import ReconnectingClientFactory, ServerFactory
 from twisted.protocols.basic import Int16StringReceiver
 
 
+def _init_worker():
+    """Restore default signal handling in a worker process.
+
+    The workers are forked from a process where Twisted has installed
+    its own handlers, which would otherwise make them try to shut
+    down a reactor when the pool is terminated.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _call_in_worker(job):
+    """Run a pickled *job* and return a pickled ``(success, result)``.
+
+    This is run in a worker process by :meth:`Runtime.defer_to_pool`.
+    The *job* is a pickled ``(func, args)`` pair. The :mod:`multiprocessing`
+    pool in Python 2 drops failed jobs without calling the callback,
+    so the pickling is done here and any exception is returned
+    instead. An exception which cannot be pickled is replaced by a
+    :exc:`RuntimeError` holding its traceback.
+    """
+    try:
+        func, args = pickle.loads(job)
+        return pickle.dumps((True, func(*args)), pickle.HIGHEST_PROTOCOL)
+    except Exception, e:
+        try:
+            return pickle.dumps((False, e), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            e = RuntimeError(traceback.format_exc())
+            return pickle.dumps((False, e), pickle.HIGHEST_PROTOCOL)
+
+
 class Share(Deferred):
     """A shared number.
 
@@ -176,6 +216,77 @@ class Share(Deferred):
         return clone
 
 
+class SharedVector(Deferred):
+    """A vector of shared numbers.
+
+    A :class:`SharedVector` holds shares of *length* numbers from one
+    field behind a single :class:`Deferred`. The value is a list of
+    integers, not field elements. Working on a vector avoids the
+    overhead of creating a :class:`Share` for each of the numbers.
+
+    Like a :class:`Share`, a vector overloads the arithmetic
+    operations. They work element-wise and call back to the runtime.
+    The other operand can be another :class:`SharedVector`, a list of
+    *length* constants, or a single constant.
+    """
+
+    def __init__(self, runtime, field, length, values=None):
+        """Initialize a shared vector.
+
+        If initial values are given, they will be passed to
+        :meth:`callback` right away.
+        """
+        assert field is not None, "Cannot construct vector without a field."
+
+        Deferred.__init__(self)
+        self.runtime = runtime
+        self.field = field
+        self.length = length
+        if values is not None:
+            assert len(values) == length, "Wrong number of values."
+            self.callback(values)
+
+    def __len__(self):
+        return self.length
+
+    def __add__(self, other):
+        """Element-wise addition."""
+        return self.runtime.add_vector(self, other)
+
+    def __radd__(self, other):
+        """Element-wise addition (reflected argument version)."""
+        return self.runtime.add_vector(self, other)
+
+    def __sub__(self, other):
+        """Element-wise subtraction."""
+        return self.runtime.sub_vector(self, other)
+
+    def __rsub__(self, other):
+        """Element-wise subtraction (reflected argument version)."""
+        return self.runtime.sub_vector(other, self)
+
+    def __mul__(self, other):
+        """Element-wise multiplication."""
+        return self.runtime.mul_vector(self, other)
+
+    def __rmul__(self, other):
+        """Element-wise multiplication (reflected argument version)."""
+        return self.runtime.mul_vector(self, other)
+
+    def clone(self):
+        """Clone a shared vector.
+
+        Works like :meth:`Share.clone`.
+        """
+
+        def split_result(result):
+            clone.callback(result)
+            return result
+        clone = SharedVector(self.runtime, self.field, self.length)
+        self.addCallback(split_result)
+        return clone
+
+
 class ShareList(Share):
     """Create a share that waits on a number of other shares.
 
@@ -267,6 +378,23 @@ def gather_shares(shares):
     return share_list
 
 
+def element_size(field):
+    """Number of bytes used when sending elements of *field* in binary.
+
+    The size is the smallest number of bytes which can hold the
+    largest element of the field:
+
+    >>> element_size(GF256)
+    1
+    >>> from viff.field import GF
+    >>> element_size(GF(251))
+    1
+    >>> element_size(GF(257))
+    2
+    """
+    return (numdigits(field.modulus - 1, 2) + 7) // 8
+
+
 class ShareExchanger(Int16StringReceiver):
     """Send and receive shares.
 
@@ -275,6 +403,17 @@ class ShareExchanger(Int16StringReceiver):
     receive shares from one other player.
     """
 
+    #: Largest frame which fits behind the 16-bit length prefix.
+    max_frame_size = 2**16 - 1
+
+    #: Largest message which is sent in fragments and reassembled
+    #: by the receiver.
+    max_message_size = 2**20
+
+    #: Seconds to wait for a peer to announce its features before
+    #: treating it as a peer which has none.
+    handshake_timeout = 2
+
     def __init__(self):
         self.peer_id = None
         self.lost_connection = Deferred()
@@ -284,11 +423,60 @@ class ShareExchanger(Int16StringReceiver):
         #: Statistics
         self.sent_packets = 0
         self.sent_bytes = 0
+        self.sent_messages = 0
+        #: Number of frames saved by sending records in batch frames.
+        self.saved_frames = 0
+        #: Coalesce messages into batch frames. Enabled in
+        #: :meth:`connectionMade` if the runtime asks for it.
+        self.batching = False
+        #: Records waiting to be sent in the next batch frame.
+        self._batch = []
+        self._batch_size = 0
+        self._flush_call = None
+        #: Set when the peer has announced its features, or when we
+        #: have given up waiting for a peer which does not do so.
+        self.identified = False
+        self._identify_call = None
+        #: Send shares in the fixed-width binary encoding. This is
+        #: negotiated with the peer in :meth:`stringReceived`.
+        self.binary_shares = False
+        #: Send messages larger than a frame in fragments. This is
+        #: negotiated with the peer in :meth:`stringReceived`.
+        self.fragments = False
+        #: Fragments received of the current large message.
+        self._fragments = []
+        self._fragments_size = 0
 
     def connectionMade(self):
-        self.sendString(str(self.factory.runtime.id))
+        runtime = self.factory.runtime
+        # We first identify ourselves exactly like peers unaware of
+        # binary shares and fragmented messages do. We then announce
+        # that we can handle these features in a message short enough
+        # to be ignored by such peers.
+        self.sendString(str(runtime.id))
+        if runtime.options.binary_shares:
+            self.sendString("bf")
+        else:
+            self.sendString("f")
+        self.batching = runtime.options.batch_messages
+
+    def message_size_limit(self):
+        """Largest amount of data which should be sent in one message.
+
+        This is :attr:`max_message_size` if the peer can reassemble
+        fragments and otherwise what fits in a frame. We keep 1 KiB
+        free for the header and the program counter.
+        """
+        if self.fragments:
+            return self.max_message_size - 1024
+        else:
+            return self.max_frame_size - 1024
 
     def connectionLost(self, reason):
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        if self._identify_call is not None and self._identify_call.active():
+            self._identify_call.cancel()
         reason.trap(ConnectionDone)
         self.lost_connection.callback(self)
 
@@ -299,7 +487,7 @@ class ShareExchanger(Int16StringReceiver):
         a data part. The data is passed the appropriate Deferred in
         :class:`self.incoming_data`.
         """
-        if self.peer_id is None and len(string)<=4:
+        if self.peer_id is None:
             # TODO: Handle ValueError if the string cannot be decoded.
             self.peer_id = int(string)
             try:
@@ -314,30 +502,103 @@ class ShareExchanger(Int16StringReceiver):
                     print "Peer %s claims to be %d, aborting!" \
                         % (cert.get_subject(), self.peer_id)
                     self.transport.loseConnection()
-            self.factory.identify_peer(self)
+            # The peer is identified when we know which features it
+            # supports. Peers which do not announce them are
+            # identified when they send data or after a timeout.
+            self._identify_call = reactor.callLater(self.handshake_timeout,
+                                                    self._identify)
+        elif not self.identified:
+            if len(string) <= 4:
+                # Binary shares are only used if both ends support them.
+                options = self.factory.runtime.options
+                self.binary_shares = "b" in string and options.binary_shares
+                self.fragments = "f" in string
+                self._identify()
+            else:
+                self._identify()
+                self._receive_frame(string)
         elif len(string)>4:
-            try:
-		#print "Received:"," ".join(hex(ord(n)) for n in string)
-                pc_size, data_size, data_type = struct.unpack("!HHB", string[:5])
-                fmt = "!%dI%ds" % (pc_size, data_size)
-                unpacked = struct.unpack(fmt, string[5:])
-
-                program_counter = unpacked[:pc_size]
-                data = unpacked[-1]
-
-                key = (program_counter, data_type)
-
-                if key in self.waiting_deferreds:
-                    deq = self.waiting_deferreds[key]
-                    deferred = deq.popleft()
-                    if not deq:
-                        del self.waiting_deferreds[key]
-                    self.factory.runtime.handle_deferred_data(deferred, data)
-                else:
-                    deq = self.incoming_data.setdefault(key, deque())
-                    deq.append(data)
-            except struct.error, e:
-                self.factory.runtime.abort(self, e)
+            self._receive_frame(string)
+
+    def _identify(self):
+        """Tell the factory that the peer has been identified."""
+        if self._identify_call.active():
+            self._identify_call.cancel()
+        self.identified = True
+        self.factory.identify_peer(self)
+
+    def _receive_frame(self, string):
+        """Unpack the records in the frame *string* and deliver them."""
+        try:
+            pc_size, count = struct.unpack("!HH", string[:4])
+            if pc_size == 0 and count == 0:
+                # A fragment of a large record.
+                offset = self._add_fragment(string)
+            elif pc_size == 0:
+                # A batch frame holding count records.
+                offset = 4
+                for _ in range(count):
+                    offset = self._unpack_record(string, offset)
+            else:
+                offset = self._unpack_record(string, 0)
+            if offset != len(string):
+                raise struct.error("trailing data in frame")
+        except struct.error, e:
+            self.factory.runtime.abort(self, e)
+
+    def _unpack_record(self, string, offset):
+        """Unpack and deliver the record starting at *offset*.
+
+        Returns the offset of the following record.
+        """
+        pc_size, data_size, data_type = \
+            struct.unpack("!HHB", string[offset:offset+5])
+        end = offset + 5 + 4 * pc_size + data_size
+        if pc_size == 0 or end > len(string):
+            raise struct.error("malformed record at offset %d" % offset)
+        fmt = "!%dI%ds" % (pc_size, data_size)
+        unpacked = struct.unpack(fmt, string[offset+5:end])
+        self._deliver(unpacked[:pc_size], data_type, unpacked[-1])
+        return end
+
+    def _add_fragment(self, string):
+        """Add the fragment in the frame *string*.
+
+        The record is unpacked and delivered when the last fragment
+        has arrived. Returns the length of the frame.
+        """
+        last = ord(string[4])
+        self._fragments.append(string[5:])
+        self._fragments_size += len(string) - 5
+        if self._fragments_size > self.max_message_size:
+            raise struct.error("message larger than %d bytes"
+                               % self.max_message_size)
+        if last:
+            record = "".join(self._fragments)
+            self._fragments = []
+            self._fragments_size = 0
+
+            pc_size, data_size, data_type = struct.unpack("!HIB", record[:7])
+            if pc_size == 0 or 7 + 4 * pc_size + data_size != len(record):
+                raise struct.error("malformed fragmented record")
+            fmt = "!%dI%ds" % (pc_size, data_size)
+            unpacked = struct.unpack(fmt, record[7:])
+            self._deliver(unpacked[:pc_size], data_type, unpacked[-1])
+        return len(string)
+
+    def _deliver(self, program_counter, data_type, data):
+        """Pass *data* to the Deferred waiting for it or store it."""
+        key = (program_counter, data_type)
+
+        if key in self.waiting_deferreds:
+            deq = self.waiting_deferreds[key]
+            deferred = deq.popleft()
+            if not deq:
+                del self.waiting_deferreds[key]
+            self.factory.runtime.handle_deferred_data(deferred, data)
+        else:
+            deq = self.incoming_data.setdefault(key, deque())
+            deq.append(data)
 
     def sendData(self, program_counter, data_type, data):
         """Send data to the peer.
@@ -354,27 +615,187 @@ class ShareExchanger(Int16StringReceiver):
 
         The program counter takes up ``4 * pc_size`` bytes, the data
         takes up ``data_size`` bytes.
+
+        If :attr:`batching` is enabled, the record is queued instead
+        and all records queued for this peer during one reactor
+        iteration are sent together in a single batch frame::
+
+          +---------+-------+----------+----------+-----
+          |    0    | count | record 1 | record 2 | ...
+          +---------+-------+----------+----------+-----
+            2 bytes  2 bytes
+
+        where each record is encoded like a normal frame. The zero in
+        place of the ``pc_size`` tells the receiver that this is a
+        batch frame.
+
+        A record which does not fit in a frame is sent in fragments if
+        the peer supports it, see :meth:`_send_fragments`.
         """
         pc_size = len(program_counter)
         data_size = len(data)
+        if 5 + 4 * pc_size + data_size > self.max_frame_size:
+            self._send_fragments(program_counter, data_type, data)
+            return
         fmt = "!HHB%dI%ds" % (pc_size, data_size)
         t = (pc_size, data_size, data_type) + program_counter + (data,)
         packet = struct.pack(fmt, *t)
 	#print "Sent:"," ".join(hex(ord(n)) for n in packet)
+        self.sent_messages += 1
+        if self.batching:
+            self._queue_record(packet)
+        else:
+            self._send_frame(packet)
+
+    def _send_fragments(self, program_counter, data_type, data):
+        """Send a record which is too large for a frame.
+
+        The record is encoded like a normal record, except that the
+        ``data_size`` takes up 4 bytes. It is split into fragments
+        which are each sent in a frame of its own::
+
+          +---------+---------+------+----------+
+          |    0    |    0    | last | fragment |
+          +---------+---------+------+----------+
+            2 bytes   2 bytes  1 byte   varies
+
+        where *last* is 1 for the last fragment of the record and 0
+        otherwise. Queued records are sent first, so no records come
+        between the fragments. Peers which did not announce that they
+        can reassemble fragments cannot receive such records.
+        """
+        assert self.fragments, \
+            "Player %d cannot receive messages larger than %d bytes" \
+            % (self.peer_id, self.max_frame_size)
+        pc_size = len(program_counter)
+        data_size = len(data)
+        assert 7 + 4 * pc_size + data_size <= self.max_message_size, \
+            "Message of %d bytes is too large" % data_size
+        fmt = "!HIB%dI" % pc_size
+        record = struct.pack(fmt, pc_size, data_size, data_type,
+                             *program_counter) + data
+
+        self.flush()
+        self.sent_messages += 1
+        length = self.max_frame_size - 5
+        for start in range(0, len(record), length):
+            last = start + length >= len(record)
+            header = struct.pack("!HHB", 0, 0, last)
+            self._send_frame(header + record[start:start+length])
+
+    def _send_frame(self, packet):
         self.sendString(packet)
         self.sent_packets += 1
         self.sent_bytes += len(packet)
 
+    def _queue_record(self, record):
+        """Queue a record for the next batch frame."""
+        if self._batch_size + len(record) > self.max_frame_size - 4:
+            # The record would make the frame too large, so we send
+            # the records we already have first.
+            self.flush()
+        self._batch.append(record)
+        self._batch_size += len(record)
+        if self._flush_call is None:
+            self._flush_call = reactor.callLater(0, self.flush)
+
+    def flush(self):
+        """Send all queued records in a single frame.
+
+        This is called automatically in the reactor iteration
+        following the first queued record.
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        records = self._batch
+        if not records:
+            return
+        self._batch = []
+        self._batch_size = 0
+
+        if len(records) == 1:
+            # A single record is simply sent as a normal frame.
+            self._send_frame(records[0])
+        else:
+            header = struct.pack("!HH", 0, len(records))
+            self._send_frame(header + "".join(records))
+            self.saved_frames += len(records) - 1
+
     def sendShare(self, program_counter, share):
         """Send a share.
 
         The program counter and the share are converted to bytes and
-        sent to the peer.
+        sent to the peer. The share is encoded using
+        :func:`element_size` bytes if :attr:`binary_shares` is set and
+        as a hexadecimal string otherwise.
+        """
+        if self.binary_shares:
+            size = element_size(share.field)
+            data = unhexlify("%0*x" % (2 * size, share.value))
+        else:
+            data = hex(share.value)
+        self.sendData(program_counter, SHARE, data)
+
+    def vector_chunk_length(self, field):
+        """Number of elements of *field* sent per message by
+        :meth:`sendShareVector`.
+
+        The length is chosen so that a message is within
+        :meth:`message_size_limit` in both the binary and the
+        hexadecimal encoding.
         """
-        self.sendData(program_counter, SHARE, hex(share.value))
+        return max(self.message_size_limit() // (2*element_size(field) + 1),
+                   1)
+
+    def sendShareVector(self, program_counter, field, values):
+        """Send a vector of shares.
+
+        The *values* are integers (or field elements) from *field*.
+        They are sent in as few messages as possible, see
+        :meth:`vector_chunk_length`. The receiver must know the
+        number of values to expect.
+        """
+        length = self.vector_chunk_length(field)
+        size = element_size(field)
+        for i in range(0, len(values), length):
+            chunk = values[i:i+length]
+            if self.binary_shares:
+                data = unhexlify("".join(["%0*x" % (2 * size, v)
+                                          for v in chunk]))
+            else:
+                data = " ".join(["%x" % v for v in chunk])
+            self.sendData(program_counter, SHARES, data)
+
+    def sendLongs(self, program_counter, data_type, values):
+        """Send a list of integers.
+
+        The integers are encoded with :func:`~viff.util.pack_longs`
+        and sent in as many messages as needed to keep each message
+        within :meth:`message_size_limit`. The first message starts
+        with the number of messages as a four byte unsigned integer,
+        so the receiver can expect all of them at once. Use
+        :meth:`Runtime._expect_longs` to receive the list.
+        """
+        limit = self.message_size_limit() - 4
+        chunks = [[]]
+        size = 0
+        for value in values:
+            data = pack_longs([value])
+            if chunks[-1] and size + len(data) > limit:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(data)
+            size += len(data)
+        chunks[0].insert(0, struct.pack("!I", len(chunks)))
+        for chunk in chunks:
+            self.sendData(program_counter, data_type, "".join(chunk))
 
     def loseConnection(self):
         """Disconnect this protocol instance."""
+        self.flush()
         self.transport.loseConnection()
 
 class SelfShareExchanger(ShareExchanger):
@@ -383,6 +804,9 @@ class SelfShareExchanger(ShareExchanger):
         ShareExchanger.__init__(self)
         self.peer_id = id
         self.factory = factory
+        self.binary_shares = factory.runtime.options.binary_shares
+        # Data sent to ourselves is never framed.
+        self.fragments = True
 
     def stringReceived(self, program_counter, data_type, data):
         """Called when a share is received.
@@ -466,9 +890,10 @@ def preprocess(generator):
 
     The decorated method will be replaced with a proxy method which
     first tries to get the data needed from
-    :attr:`Runtime._pool`, and if that fails it falls back to the
-    original method. It also returns a flag to indicate whether the
-    data is from the pool.
+    :attr:`Runtime._pool`, then from the queue for the generator and
+    arguments in :attr:`Runtime._fifo_pool`, and if that fails it
+    falls back to the original method. It also returns a flag to
+    indicate whether the data is from the pool.
 
     The *generator* method is only used to record where the data
     should be generated from, the method is not actually called. This
@@ -486,6 +911,9 @@ def preprocess(generator):
                 return self._pool.pop(pc), True
             except KeyError:
                 key = (generator, args)
+                queue = self._fifo_pool.get(key)
+                if queue:
+                    return queue.popleft(), True
                 pcs = self._needed_data.setdefault(key, [])
                 pcs.append(pc)
                 self.fork_pc()
@@ -529,6 +957,14 @@ class Runtime:
                          help="Track memory usage over time.")
         group.add_option("--statistics", action="store_true",
                          help="Print statistics on shutdown.")
+        group.add_option("--no-binary-shares", action="store_false",
+                         dest="binary_shares",
+                         help=("Send shares as hexadecimal strings instead "
+                               "of fixed-width binary numbers."))
+        group.add_option("--batch-messages", action="store_true",
+                         help=("Coalesce all messages sent to a player "
+                               "during one reactor iteration into a "
+                               "single frame."))
         group.add_option("--no-socket-retry", action="store_true",
                          default=False, help="Fail rather than keep retrying "
                          "to connect if port is already in use.")
@@ -543,6 +979,9 @@ class Runtime:
                          "computation. All IDs for runs using the same set "
                          "of player configuration files must be unique "
                          "to ensure security.")
+        group.add_option("--worker-processes", type="int", metavar="N",
+                         help="Run CPU-bound batches in N worker processes. "
+                         "Zero runs them in the reactor thread.")
 
         try:
             # Using __import__ since we do not use the module, we are
@@ -559,7 +998,10 @@ class Runtime:
                             profile=False,
                             track_memory=False,
                             statistics=False,
-                            computation_id=None)
+                            binary_shares=True,
+                            batch_messages=False,
+                            computation_id=None,
+                            worker_processes=0)
 
     def __init__(self, player, threshold, options=None):
         """Initialize runtime.
@@ -591,6 +1033,20 @@ class Runtime:
         self._pool = {}
         #: Description of needed preprocessed data.
         self._needed_data = {}
+        #: Preprocessed data independent of program counters.
+        #:
+        #: Mapping from ``(generator, args)`` to a :class:`deque` of
+        #: items which are used in FIFO order.
+        self._fifo_pool = {}
+        #: Worker processes used by :meth:`defer_to_pool`, created
+        #: when first needed.
+        self._worker_pool = None
+        #: Results from the worker processes waiting to be delivered
+        #: in the reactor thread.
+        self._worker_results = deque()
+        #: The ``(peer_id, pc, data_type)`` keys of the lists expected
+        #: with :meth:`_expect_longs` which have not yet arrived.
+        self._expected_longs = set()
 
         #: Current program counter.
         __comp_id = self.options.computation_id
@@ -633,7 +1089,7 @@ class Runtime:
         #: Recursion depth limit by experiment, including security margin.
         self.depth_limit = int(sys.getrecursionlimit() / 50)
         #: Use deferred queues only if the ViffReactor is running.
-        self.using_viff_reactor = isinstance(reactor, viff.reactor.ViffReactor)
+        self.using_viff_reactor = isinstance(reactor, viff.reactor.ViffReactorMixin)
 
     def add_player(self, player, protocol):
         self.players[player.id] = player
@@ -659,6 +1115,7 @@ class Runtime:
 
         def stop_reactor(_):
             print "done."
+            self.close_worker_pool()
             print "Stopping reactor...",
             reactor.stop()
             print "done."
@@ -668,6 +1125,71 @@ class Runtime:
         sync.addCallback(stop_reactor)
         return sync
 
+    def defer_to_pool(self, func, *args):
+        """Call *func* with *args* in a worker process.
+
+        Returns a :class:`Deferred` which will yield the result of the
+        call, or fail with the exception raised by it. The function
+        and the arguments must be picklable, so *func* must be
+        defined at module level and field elements should be passed
+        as integers. If they are not, the :class:`Deferred` fails
+        with the pickling error.
+
+        The number of workers is set by the ``--worker-processes``
+        option. If it is zero, *func* is called immediately in the
+        reactor thread and the returned :class:`Deferred` has already
+        fired. Otherwise the result is delivered in a later reactor
+        iteration. Callbacks that depend on the program counter must
+        in both cases be added with :meth:`schedule_callback`.
+        """
+        processes = getattr(self.options, "worker_processes", 0)
+        if not processes:
+            return maybeDeferred(func, *args)
+
+        try:
+            job = pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return fail()
+
+        if self._worker_pool is None:
+            self._worker_pool = multiprocessing.Pool(processes, _init_worker)
+
+        result = Deferred()
+
+        def done(reply):
+            # Called in the result handler thread of the worker pool.
+            self._worker_results.append((result, reply))
+            reactor.callFromThread(self._deliver_worker_results)
+
+        self._worker_pool.apply_async(_call_in_worker, (job,), callback=done)
+        return result
+
+    def _deliver_worker_results(self):
+        """Fire the Deferreds of finished :meth:`defer_to_pool` calls.
+
+        The results are taken from a queue, so each is delivered once
+        even if the VIFF reactor runs this call again while it is
+        re-entered from one of the callbacks.
+        """
+        while self._worker_results:
+            result, reply = self._worker_results.popleft()
+            try:
+                success, value = pickle.loads(reply)
+            except Exception:
+                result.errback()
+                continue
+            if success:
+                result.callback(value)
+            else:
+                result.errback(value)
+
+    def close_worker_pool(self):
+        """Stop the worker processes used by :meth:`defer_to_pool`."""
+        if self._worker_pool is not None:
+            self._worker_pool.terminate()
+            self._worker_pool.join()
+            self._worker_pool = None
+
     def abort(self, protocol, exc):
         """Abort the execution due to an exception.
 
@@ -788,6 +1310,42 @@ class Runtime:
             deq = self.protocols[peer_id].waiting_deferreds.setdefault(key, deque())
             deq.append(deferred)
 
+    def _expect_longs(self, peer_id, data_type, deferred):
+        """Expect a list of integers sent with
+        :meth:`ShareExchanger.sendLongs` from *peer_id*.
+
+        The *deferred* will be called with the list of integers when
+        all messages holding it have arrived. The first message tells
+        how many follow, and they are all expected when it arrives.
+        The messages of one list are told apart from those of another
+        list only by their order, so at most one list can be expected
+        from a peer per program counter and data type.
+        """
+        pc = tuple(self.program_counter)
+        key = (peer_id, pc, data_type)
+        assert key not in self._expected_longs, \
+            "Already expecting a list of integers for %s" % (key,)
+        self._expected_longs.add(key)
+
+        def receive(data):
+            count = struct.unpack("!I", data[:4])[0]
+            chunks = [Deferred() for _ in range(count - 1)]
+            for chunk in chunks:
+                self._expect_data_with_pc(pc, peer_id, data_type, chunk)
+            result = gatherResults([succeed(data[4:])] + chunks)
+            result.addCallback(lambda chunks: unpack_longs("".join(chunks)))
+            return result
+
+        def done(result):
+            self._expected_longs.discard(key)
+            return result
+
+        first = Deferred()
+        first.addCallback(receive)
+        first.addBoth(done)
+        first.chainDeferred(deferred)
+        self._expect_data_with_pc(pc, peer_id, data_type, first)
+
     def _exchange_shares(self, peer_id, field_element):
         """Exchange shares with another player.
 
@@ -806,10 +1364,60 @@ class Runtime:
 
     def _expect_share(self, peer_id, field):
         share = Share(self, field)
-        share.addCallback(lambda value: field(long(value, 16)))
+        if self.protocols[peer_id].binary_shares:
+            share.addCallback(lambda data: field(long(hexlify(data), 16)))
+        else:
+            share.addCallback(lambda value: field(long(value, 16)))
         self._expect_data(peer_id, SHARE, share)
         return share
 
+    def _exchange_share_vector(self, peer_id, field, values):
+        """Exchange a vector of shares with another player.
+
+        This is like :meth:`_exchange_shares`, but for a list of
+        integers from *field*. The returned :class:`Share` will
+        trigger with the list of integers from the other side.
+        """
+        if peer_id == self.id:
+            return Share(self, field, values)
+        else:
+            share = self._expect_share_vector(peer_id, field, len(values))
+            pc = tuple(self.program_counter)
+            self.protocols[peer_id].sendShareVector(pc, field, values)
+            return share
+
+    def _expect_share_vector(self, peer_id, field, count):
+        """Expect a vector of *count* shares from *peer_id*.
+
+        The returned :class:`Share` will trigger with a list of
+        integers.
+        """
+        protocol = self.protocols[peer_id]
+        if protocol.binary_shares:
+            width = 2 * element_size(field)
+
+            def decode(data):
+                data = hexlify(data)
+                return [long(data[i:i+width], 16)
+                        for i in range(0, len(data), width)]
+        else:
+            def decode(data):
+                return [long(value, 16) for value in data.split()]
+
+        length = protocol.vector_chunk_length(field)
+        chunks = []
+        for _ in range(0, count, length):
+            chunk = Share(self, field)
+            chunk.addCallback(decode)
+            self._expect_data(peer_id, SHARES, chunk)
+            chunks.append(chunk)
+
+        if not chunks:
+            return Share(self, field, [])
+        result = gather_shares(chunks)
+        result.addCallback(lambda chunks: sum(chunks, []))
+        return result
+
     def preprocess(self, program):
         """Generate preprocess material.
 
@@ -855,6 +1463,82 @@ class Runtime:
             self.unfork_pc()
         return gatherResults(wait_list)
 
+    def preprocess_fifo(self, budget):
+        """Generate preprocessed data independent of program counters.
+
+        The *budget* is a list of ``((generator, args), count)``
+        pairs, such as ``[(("generate_triples", (Zp,)), 1000)]``. The
+        generator methods must follow the interface described in
+        :meth:`preprocess`. The items are put in
+        :attr:`_fifo_pool` and are used by methods decorated with
+        :func:`preprocess` in the order they were generated, no matter
+        the program counter. No profiling run is needed to know the
+        program counters.
+
+        The players must use the items in the same order. This holds
+        when the decorated methods are called in the same order by all
+        players, e.g., directly by the program. Calls made from
+        callbacks whose order depends on the network can make the
+        players use different items, and programs doing that must use
+        :meth:`preprocess` instead.
+        """
+
+        def store(results, key):
+            # The batches are added in the order they were generated
+            # since they may finish in a different order.
+            queue = self._fifo_pool.setdefault(key, deque())
+            for batch in results:
+                queue.extend(batch)
+
+        wait_list = []
+        for ((generator, args), count) in budget:
+            print "Preprocessing %s (%d items)" % (generator, count)
+            self.increment_pc()
+            self.fork_pc()
+            func = getattr(self, generator)
+            batches = []
+
+            while count > 0:
+                self.increment_pc()
+                self.fork_pc()
+                results = func(quantity=count, *args)
+                self.unfork_pc()
+                assert results, "%s generated no items" % generator
+                batches.append(gatherResults(results[:count]))
+                count -= len(results)
+            self.unfork_pc()
+            ready = gatherResults(batches)
+            ready.addCallback(store, (generator, args))
+            wait_list.append(ready)
+        return gatherResults(wait_list)
+
+    def save_pool(self, filename):
+        """Save the pool of preprocessed data to *filename*.
+
+        This is used to split a computation into an offline run,
+        which calls :meth:`preprocess` and then this method, and an
+        online run which calls :meth:`load_pool`. The pool is written
+        in the format of :mod:`viff.pool`.
+        """
+        from viff.pool import save_pool
+        save_pool(filename, self._pool.items(), self.num_players,
+                  self.threshold, self.options.computation_id)
+
+    def load_pool(self, filename, fields):
+        """Use the preprocessed data saved in *filename*.
+
+        The file is memory-mapped and items are decoded when they are
+        needed. A :exc:`~viff.pool.PoolError` is raised if the file
+        was written by a runtime with another number of players,
+        threshold, or computation ID, or if it holds elements from
+        other fields than those listed in *fields*.
+        """
+        from viff.pool import PoolFile
+        pool = PoolFile(filename, self.num_players, self.threshold,
+                        self.options.computation_id, fields)
+        pool.update(self._pool.items())
+        self._pool = pool
+
     def input(self, inputters, field, number=None):
         """Input *number* to the computation.
 
@@ -950,6 +1634,9 @@ class Runtime:
         for protocol in self.protocols.itervalues():
             print "Transfer to peer %d: %d bytes in %d packets" % \
                   (protocol.peer_id, protocol.sent_bytes, protocol.sent_packets)
+            if protocol.batching:
+                print "  %d messages sent, %d frames saved by batching" % \
+                      (protocol.sent_messages, protocol.saved_frames)
 
 
 def make_runtime_class(runtime_class=None, mixins=None):
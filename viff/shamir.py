@@ -22,6 +22,8 @@ share a secret* by Adi Shamir in *Communications of the ACM* **22**
 
 import operator
 from viff.util import rand, fake
+from viff.field import GF256
+from viff.matrix import Matrix
 
 
 @fake(lambda s, t, n: [(s.field(i+1), s) for i in range(n)])
@@ -82,6 +84,64 @@ def share(secret, threshold, num_players):
 
     return shares
 
+@fake(lambda s, t, n, f=None: [((f or s[0].field)(i+1), map(long, s))
+                                for i in range(n)])
+def share_many(secrets, threshold, num_players, field=None):
+    """Shamir share many secrets at once.
+
+    The *secrets* must be elements of the same field, or integers if
+    the *field* is given. The return value is a list of ``(player id,
+    shares)`` pairs where *shares* is a list with the player's share
+    of each secret. The shares are plain integers and not field
+    elements, which saves allocating a field element for every share.
+    Use :func:`recombine_many` to recombine such shares:
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> secrets = [Zp(42), Zp(10), Zp(0)]
+    >>> shares = share_many(secrets, 2, 5)
+    >>> recombine_many(shares[2:]) == secrets
+    True
+
+    The result holds the same shares as calling :func:`share` for
+    each secret, and the same range of thresholds is allowed:
+
+    >>> share_many([Zp(10), Zp(11)], 0, 3)
+    [({1}, [10L, 11L]), ({2}, [10L, 11L]), ({3}, [10L, 11L])]
+    >>> share_many([Zp(10)], 3, 3)
+    Traceback (most recent call last):
+      ...
+    AssertionError: Threshold out of range
+    """
+    assert threshold >= 0 and threshold < num_players, "Threshold out of range"
+
+    if field is None:
+        field = secrets[0].field
+    if field is GF256:
+        # The integer arithmetic below does not work in GF256 where
+        # we fall back to sharing each secret separately.
+        shares = [share(field(long(secret)), threshold, num_players)
+                  for secret in secrets]
+        return [(field(i+1), [s[i][1].value for s in shares])
+                for i in range(num_players)]
+
+    modulus = field.modulus
+    coef = [map(long, secrets)]
+    for j in range(threshold):
+        coef.append([rand.randint(0, modulus - 1) for _ in secrets])
+
+    result = []
+    for i in range(1, num_players+1):
+        # We evaluate all polynomials in the point i using Horner's
+        # rule like in share, but we do it on integers and only
+        # reduce at the very end.
+        cur_shares = coef[threshold]
+        for j in range(threshold-1, -1, -1):
+            cur_shares = [c + s * i for c, s in zip(coef[j], cur_shares)]
+        result.append((field(i), [s % modulus for s in cur_shares]))
+
+    return result
+
 #: Cached recombination vectors.
 #:
 #: The recombination vector used by `recombine` depends only on the
@@ -90,6 +150,21 @@ def share(secret, threshold, num_players):
 _recombination_vectors = {}
 
 
+def _recombination_vector(xs, x_recomb):
+    """Return the (cached) recombination vector for the points *xs*."""
+    key = xs + (x_recomb, )
+    try:
+        return _recombination_vectors[key]
+    except KeyError:
+        vector = []
+        for i, x_i in enumerate(xs):
+            factors = [(x_k - x_recomb) / (x_k - x_i)
+                       for k, x_k in enumerate(xs) if k != i]
+            vector.append(reduce(operator.mul, factors))
+        _recombination_vectors[key] = vector
+        return vector
+
+
 @fake(lambda s, x=0: s[0][1])
 def recombine(shares, x_recomb=0):
     """Recombines list of ``(xi, yi)`` pairs.
@@ -110,17 +185,79 @@ def recombine(shares, x_recomb=0):
     {3}
     """
     xs, ys = zip(*shares)
-    key = xs + (x_recomb, )
+    vector = _recombination_vector(xs, x_recomb)
+    return sum(map(operator.mul, ys, vector))
+
+
+@fake(lambda s, x=0: [s[0][0].field(y) for y in s[0][1]])
+def recombine_many(shares, x_recomb=0):
+    """Recombines many secrets at once.
+
+    The *shares* is a list of *threshold* + 1 ``(player id, shares)``
+    pairs as returned by :func:`share_many`. The list of shares held
+    by a player can contain integers or field elements. The
+    recombination vector is taken from the same cache as
+    :func:`recombine` uses.
+
+    >>> from field import GF
+    >>> Zp = GF(19)
+    >>> shares = [(Zp(i), [7 * i + 3, 2 * i + 5]) for i in range(1, 4)]
+    >>> recombine_many(shares)
+    [{3}, {5}]
+    >>> recombine_many(shares, Zp(4))
+    [{12}, {13}]
+    """
+    xs, ys = zip(*shares)
+    vector = _recombination_vector(xs, x_recomb)
+
+    field = xs[0].field
+    if field is GF256:
+        return [sum(map(operator.mul, column, vector))
+                for column in zip(*ys)]
+
+    # Work on integers and reduce each result once.
+    modulus = field.modulus
+    vector = [long(c) for c in vector]
+    ys = [[long(y) for y in player_ys] for player_ys in ys]
+    return [field(sum(map(operator.mul, column, vector)) % modulus)
+            for column in zip(*ys)]
+
+
+#: Cached parity-check matrices.
+#:
+#: The parity-check matrix used by :func:`verify_sharing` depends only
+#: on the player IDs of the shares and the degree, and so it can be
+#: cached for efficiency.
+_parity_check_matrices = {}
+
+
+def _parity_check_matrix(xs, degree):
+    """Return the (cached) parity-check matrix for the points *xs*.
+
+    The sharings of *degree* are the code words of a Reed-Solomon
+    code. Its dual code is spanned by the vectors ``(w_i * x_i**j)``
+    for ``j = 0, ..., n - degree - 2``, where ``w_i`` is the inverse
+    of the product of ``x_i - x_k`` for all *k* different from *i*.
+    The result is :const:`None` if every vector is a code word.
+    """
+    key = xs + (degree, )
     try:
-        vector = _recombination_vectors[key]
+        return _parity_check_matrices[key]
     except KeyError:
-        vector = []
-        for i, x_i in enumerate(xs):
-            factors = [(x_k - x_recomb) / (x_k - x_i)
-                       for k, x_k in enumerate(xs) if k != i]
-            vector.append(reduce(operator.mul, factors))
-        _recombination_vectors[key] = vector
-    return sum(map(operator.mul, ys, vector))
+        if len(xs) - degree - 1 <= 0:
+            matrix = None
+        else:
+            row = []
+            for i, x_i in enumerate(xs):
+                factors = [x_i - x_k for k, x_k in enumerate(xs) if k != i]
+                row.append(1 / reduce(operator.mul, factors))
+            rows = [row]
+            for _ in range(len(xs) - degree - 2):
+                row = map(operator.mul, row, xs)
+                rows.append(row)
+            matrix = Matrix(rows)
+        _parity_check_matrices[key] = matrix
+        return matrix
 
 
 def verify_sharing(shares, degree):
@@ -139,12 +276,32 @@ def verify_sharing(shares, degree):
     >>> verify_sharing(shares, 1)
     False
     """
-    used_shares = shares[0:degree+1]
-    for i in range(degree+1, len(shares)+1):
-        if recombine(used_shares, i) != shares[i-1][1]:
-            return False
+    xs, ys = zip(*shares)
+    return not verify_sharing_many([ys], degree, xs)
+
+
+def verify_sharing_many(sharings, degree, xs):
+    """Verifies many sharings at once.
 
-    return True
+    Each of the *sharings* is a list with the shares of the players
+    with the IDs in *xs*. The shares can be integers or field
+    elements. The sharings are checked with a single product with a
+    parity-check matrix, and the indices of the sharings which do not
+    correspond to a polynomial of at most the given degree are
+    returned:
+
+    >>> from field import GF
+    >>> Zp = GF(47)
+    >>> xs = [Zp(i) for i in range(1, 5)]
+    >>> verify_sharing_many([[2, 3, 4, 5], [1, 4, 9, 16], [7, 7, 7, 7]],
+    ...                     1, xs)
+    [1]
+    """
+    matrix = _parity_check_matrix(tuple(xs), degree)
+    if matrix is None:
+        return []
+    syndromes = matrix.mul_vectors(sharings)
+    return [i for i, syndrome in enumerate(syndromes) if any(syndrome)]
 
 
 if __name__ == "__main__":
@@ -316,7 +316,7 @@ class BeDOZaBasicCommandsTest(BeDOZaTestCase):
         random = Random(3423993)
         gen = TripleGenerator(runtime, self.security_parameter, self.Zp.modulus, random)
         [triple] = gen._generate_triples(1)
-        triple.addCallback(open)
+        runtime.schedule_callback(triple, open)
         return triple
 
     @protocol
@@ -182,6 +182,19 @@ class ModifiedPaillierTest(BeDOZaTestCase):
         runtime.schedule_callback(received, verify)
         return received
 
+    @protocol
+    def test_modified_paillier_can_decrypt_many(self, runtime):
+        paillier = ModifiedPaillier(runtime, Random(361285))
+        vals = [0, 1, -1, 4711]
+        result = paillier.decrypt_many([paillier.encrypt(v) for v in vals])
+        result.addCallback(self.assertEquals, vals)
+        return result
+
+
+class ModifiedPaillierWorkerTest(ModifiedPaillierTest):
+
+    runtime_options = {'worker_processes': 1}
+
 
 def partial_share(random, runtime, Zp, val, paillier=None):
     if not paillier:
@@ -395,6 +408,35 @@ class TripleTest(BeDOZaTestCase):
             runtime.schedule_callback(triple, open)
         return gatherResults(triples)
 
+    @protocol
+    def test_generate_triple_stream(self, runtime):
+        p = 17
+        random = Random(574566 + runtime.id)
+        triple_generator = TripleGenerator(runtime, self.security_parameter, p, random)
+        sizes = []
+
+        def check((a, b, c)):
+            self.assertEquals(c, a * b)
+
+        def consume(triples):
+            sizes.append(len(triples))
+            opened = []
+            for triple in triples:
+                d = gatherResults([runtime.open(triple.a),
+                                   runtime.open(triple.b),
+                                   runtime.open(triple.c)])
+                d.addCallback(check)
+                opened.append(d)
+            return gatherResults(opened)
+
+        def verify(count):
+            self.assertEquals(count, 7)
+            self.assertEquals(sizes, [3, 3, 1])
+
+        result = triple_generator.generate_triple_stream(7, consume, window=3)
+        result.addCallback(verify)
+        return result
+
     @protocol
     def test_generate_triple_candidates_generates_correct_triples(self, runtime):
         p = 17
@@ -415,6 +457,11 @@ class TripleTest(BeDOZaTestCase):
         d.addCallback(verify)
         return d
 
+class TripleWorkerTest(TripleTest):
+
+    runtime_options = {'worker_processes': 1}
+
+
 class MulTest(BeDOZaTestCase): 
 
     timeout = 10
@@ -550,6 +597,11 @@ class ShareTest(BeDOZaTestCase):
         return partial_shares
 
 
+class ShareWorkerTest(ShareTest):
+
+    runtime_options = {'worker_processes': 1}
+
+
 class FullMulTest(BeDOZaTestCase): 
 
     timeout = 10
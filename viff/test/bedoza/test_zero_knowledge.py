@@ -22,9 +22,10 @@ from random import Random
 from gmpy import mpz
 
 from viff.field import GF
+from viff.util import pack_longs, unpack_longs
 from viff.bedoza.modified_paillier import ModifiedPaillier
-from viff.bedoza.zero_knowledge import ZKProof
-from viff.bedoza.util import rand_int_signed
+from viff.bedoza.zero_knowledge import ZKProof, verify_proofs
+from viff.bedoza.util import rand_int_signed, multi_pow
 
 from viff.test.util import protocol
 from viff.test.bedoza.util import BeDOZaTestCase, skip_if_missing_packages
@@ -38,6 +39,13 @@ class RuntimeStub(object):
         self.players = players
         self.id = id
 
+class CheatingZKProof(ZKProof):
+    """A proof where the prover changes Z after the challenge."""
+
+    def _generate_Z_and_W(self):
+        ZKProof._generate_Z_and_W(self)
+        self.Z[0] += 1
+
 class BeDOZaZeroKnowledgeTest(BeDOZaTestCase):
 
     def test_zk_matrix_entries_are_correct(self):
@@ -90,14 +98,37 @@ class BeDOZaZeroKnowledgeTest(BeDOZaTestCase):
         x_mul_E = zk._vec_mul_E(x)
         self.assertEquals([v for v in [0, 2, -1, -3, 0]], x_mul_E)
 
+    def test_vec_E_matches_matrix(self):
+        s, k, prover_id = 7, 0, 1
+        c = [None] * s
+        zk = ZKProof(s, prover_id, k, RuntimeStub(), c)
+        zk.e = [1, 1, 0, 1, 0, 0, 1]
+        x = [3, -1, 4, 1, -5, 9, 2]
+        y = [mpz(v) for v in [2, 3, 5, 7, 11, 13, 17]]
+        self.assertEquals([sum([x[i] * zk._E(j, i) for i in range(s)])
+                           for j in range(zk.m)], zk._vec_mul_E(x))
+        self.assertEquals([reduce(lambda a, b: a * b % 1009,
+                                  [y[i] for i in range(s) if zk._E(j, i)],
+                                  mpz(1))
+                           for j in range(zk.m)], zk._vec_pow_E(y, 1009))
+
+    def test_multi_pow(self):
+        bases = [3, 5, 7, 11]
+        exponents = [0, 1, 2**40 - 1, 12345]
+        expected = 1
+        for base, exponent in zip(bases, exponents):
+            expected = expected * pow(base, exponent, 1009) % 1009
+        self.assertEquals(multi_pow(bases, exponents, 1009), expected)
+        self.assertEquals(multi_pow([], [], 1009), 1)
+
     @protocol
     def test_broadcast(self, runtime):
         s, k, prover_id = 0, 2, 1
         c = []
         zk = ZKProof(s, prover_id, k, runtime, c)
-        res = zk._broadcast([5, 6, 7])
+        res = zk._broadcast(pack_longs([5, 6, 7]))
         def verify(res):
-            self.assertEquals(eval(res), [5, 6, 7])
+            self.assertEquals(unpack_longs(res), [5, 6, 7])
         runtime.schedule_callback(res, verify)
         return res
 
@@ -180,7 +211,53 @@ class BeDOZaZeroKnowledgeTest(BeDOZaTestCase):
         runtime.schedule_callback(deferred_proof, verify)
         return deferred_proof
 
-# TODO: Test succeeding proof.
-# TODO: Test failing proof.
+    def _make_proofs(self, runtime, seed, k, s, cheater=None):
+        """Make a proof for each player. The *cheater* sends a
+        proof that does not match the challenge."""
+        player_random = Random(seed + runtime.id)
+        shared_random = Random(seed)
+        paillier = ModifiedPaillier(runtime,
+                                    Random(player_random.getrandbits(128)))
+        proofs = []
+        for prover_id in runtime.players:
+            x, r, c = self._generate_test_ciphertexts(shared_random, runtime,
+                                                      k, s, prover_id)
+            proof_class = ZKProof
+            if runtime.id != prover_id:
+                x, r = None, None
+            elif runtime.id == cheater:
+                proof_class = CheatingZKProof
+            proofs.append(proof_class(s, prover_id, k, runtime, c,
+                                      paillier=paillier,
+                                      random=player_random, x=x, r=r))
+        return proofs
+
+    @protocol
+    def test_failing_proof(self, runtime):
+        k, s, prover_id = 5, 3, 1
+        zk = self._make_proofs(runtime, 2348838, k, s, cheater=prover_id)[0]
+        deferred_proof = zk.start()
+        def verify(result):
+            # The prover does not check his own proof.
+            self.assertEquals(result, runtime.id == prover_id)
+        runtime.schedule_callback(deferred_proof, verify)
+        return deferred_proof
+
+    @protocol
+    def test_verify_proofs(self, runtime):
+        proofs = self._make_proofs(runtime, 4711, 5, 4)
+        deferred_proofs = verify_proofs(runtime, proofs)
+        runtime.schedule_callback(deferred_proofs, self.assertTrue)
+        return deferred_proofs
+
+    @protocol
+    def test_verify_proofs_with_cheater(self, runtime):
+        cheater = 2
+        proofs = self._make_proofs(runtime, 4711, 5, 4, cheater=cheater)
+        deferred_proofs = verify_proofs(runtime, proofs)
+        def verify(result):
+            self.assertEquals(result, runtime.id == cheater)
+        runtime.schedule_callback(deferred_proofs, verify)
+        return deferred_proofs
 
 skip_if_missing_packages(BeDOZaZeroKnowledgeTest)
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
 
+from random import Random
 
 from viff.config import generate_configs
 
@@ -28,9 +29,10 @@ from viff.bedoza.shares import PartialShare, PartialShareContents
 
 # HACK: The paillier keys that are available as standard in VIFF tests
 # are not suited for use with pypaillier. Hence, we use NaClPaillier
-# to generate test keys. This confusion will disappear when pypaillier
-# replaces the current Python-based paillier implementation.
-from viff.paillierutil import NaClPaillier
+# to generate test keys when pypaillier is available. Otherwise the
+# BeDOZa code falls back to the Python-based paillier implementation
+# and its keys.
+from viff.paillierutil import NaClPaillier, ViffPaillier
 
 # HACK^2: Currently, the NaClPaillier hack only works when triple is
 # imported. It should ideally work without the triple package.
@@ -39,8 +41,6 @@ try:
 except ImportError:
     tripple = None
 
-# The PyPaillier and commitment packages are not standard parts of VIFF so we
-# skip them instead of letting them fail if the packages are not available. 
 try:
     import pypaillier
 except ImportError:
@@ -70,18 +70,20 @@ class BeDOZaTestCase(RuntimeTestCase):
     # TODO: During test, we would like generation of Paillier keys to
     # be deterministic. How do we obtain that?
     def generate_configs(self, *args):
-        return generate_configs(
-            paillier=NaClPaillier(self.paillier_key_size), *args)
+        if pypaillier:
+            paillier = NaClPaillier(self.paillier_key_size)
+        else:
+            paillier = ViffPaillier(self.paillier_key_size)
+        return generate_configs(paillier=paillier, *args)
 
 
 def skip_if_missing_packages(*test_cases):
-    """Skipts the given list of test cases if some of the required
-    external viff packages (tripple, pypaillier) is not available.
+    """Skipts the given list of test cases if pypaillier is available
+    but the tripple package it needs is not. Without pypaillier the
+    tests use the Python-based paillier implementation.
     """
     missing = []
-    if not pypaillier:
-        missing.append("pypaillier")
-    if not tripple:
+    if pypaillier and not tripple:
         missing.append("tripple")
     if missing:
         for test_case in test_cases:
@@ -146,16 +148,22 @@ class TestShareGenerator(TestPartialShareGenerator):
         self.u_bound = u_bound
         self.alpha = alpha
         TestPartialShareGenerator.__init__(self, Zp, runtime, random, paillier)
+        # The shares are made from random values which must be drawn
+        # in the same order by all players. The MAC keys are drawn
+        # when the partial shares are ready, so they are taken from
+        # a copy of the generator.
+        self.mac_random = Random()
+        self.mac_random.setstate(random.getstate())
 
     def generate_share(self, value):
         self.runtime.increment_pc()
         partial_share = TestPartialShareGenerator.generate_share(self, value)
         full_share = add_macs(self.runtime, self.Zp, self.u_bound, self.alpha,
-                             self.random, self.paillier, [partial_share])
+                             self.mac_random, self.paillier, [partial_share])
         return full_share[0]
     
     def generate_random_shares(self, n):
         self.runtime.increment_pc()
         partial_shares = TestPartialShareGenerator.generate_random_shares(self, n)
         return add_macs(self.runtime, self.Zp, self.u_bound, self.alpha,
-                        self.random, self.paillier, partial_shares)
+                        self.mac_random, self.paillier, partial_shares)
@@ -21,6 +21,8 @@ from twisted.internet.defer import gatherResults
 
 from viff.test.util import RuntimeTestCase, protocol, BinaryOperatorTestCase
 from viff.runtime import Share
+from viff.constants import SEND
+from viff.field import GF256
 from viff.active import BasicActiveRuntime, ActiveRuntime, \
     BrachaBroadcastMixin, TriplesHyperinvertibleMatricesMixin
 
@@ -118,6 +120,63 @@ class TriplesHyperTest(RuntimeTestCase):
             runtime.schedule_callback(triple, check)
         return triples
 
+    @protocol
+    def test_generate_triples_quantity(self, runtime):
+        """Test generation of many triples in a single run."""
+        T = runtime.num_players - 2 * runtime.threshold
+        triples = runtime.generate_triples(self.Zp, quantity=7, gather=False)
+        self.assertEquals(len(triples), T * 4)
+
+        def verify((a, b, c)):
+            self.assertEquals([x * y for x, y in zip(a, b)], c)
+
+        vectors = [runtime.gather_vector(shares) for shares in zip(*triples)]
+        result = gatherResults(map(runtime.open_vector, vectors))
+        result.addCallback(verify)
+        return result
+
+    @protocol
+    def test_generate_triples_gf256(self, runtime):
+        """Test generation of triples in GF256."""
+        triples = runtime.generate_triples(GF256, quantity=3, gather=False)
+
+        def verify((a, b, c)):
+            self.assertEquals([x * y for x, y in zip(a, b)], c)
+
+        result = gatherResults([gatherResults(map(runtime.open, shares))
+                                for shares in zip(*triples)])
+        result.addCallback(verify)
+        return result
+
+    @protocol
+    def test_generate_triples_cheater(self, runtime):
+        """Test that the verifiers detect a wrong sharing."""
+        T = runtime.num_players - 2 * runtime.threshold
+        if runtime.id == 1:
+            exchange = runtime._exchange_share_vector
+
+            def cheat(peer_id, field, values):
+                if peer_id == 2:
+                    values = [values[0] + 1] + values[1:]
+                return exchange(peer_id, field, values)
+            runtime._exchange_share_vector = cheat
+
+        triples = runtime.generate_triples(self.Zp)
+        # The players must stay connected until the shares to be
+        # verified have been sent.
+        sync = runtime.synchronize()
+        if runtime.id > T:
+            for triple in triples:
+                self.assertFailure(triple, AssertionError)
+            return gatherResults(triples + [sync])
+        return sync
+
+
+class TriplesHyperWorkerTest(TriplesHyperTest):
+    """Test for preprocessing with verification in worker processes."""
+
+    runtime_options = {'worker_processes': 1}
+
 
 class BrachaBroadcastRuntime(ActiveRuntime, BrachaBroadcastMixin):
     pass
@@ -154,3 +213,94 @@ class BrachaBroadcastTest(RuntimeTestCase):
         y.addCallback(self.assertEquals, "Hello two!")
         z.addCallback(self.assertEquals, "Hello three!")
         return gatherResults([x, y, z])
+
+    @protocol
+    def test_broadcast_truncated(self, runtime):
+        """Test that all players fail on a truncated payload."""
+        if runtime.id == 1:
+            # The sender sends a truncated payload to the others.
+            for peer_id, exchanger in runtime.protocols.iteritems():
+                if peer_id != runtime.id:
+                    def truncate(pc, data_type, data,
+                                 send_data=exchanger.sendData):
+                        if data_type == SEND:
+                            data = data[:-1]
+                        send_data(pc, data_type, data)
+                    exchanger.sendData = truncate
+            x = runtime.broadcast([1], "Hello")
+        else:
+            x = runtime.broadcast([1])
+
+        self.assertFailure(x, ValueError)
+        runtime.schedule_callback(x, lambda _: runtime.synchronize())
+        return x
+
+    @protocol
+    def test_broadcast_many(self, runtime):
+        """Test batched Bracha broadcast of several messages."""
+        messages = {1: ["a", "", "b" * 1000], 2: [], 3: ["c"]}
+        if runtime.id in messages:
+            results = runtime.broadcast_many([1, 2, 3], messages[runtime.id])
+        else:
+            results = runtime.broadcast_many([1, 2, 3])
+
+        def check(received):
+            self.assertEquals(received, [messages[1], messages[2],
+                                         messages[3]])
+
+        return gatherResults(results).addCallback(check)
+
+    @protocol
+    def test_broadcast_fetch(self, runtime):
+        """Test that a player who misses the payload fetches it."""
+        if runtime.id == 1:
+            # Player 4 only sees the digests of the message.
+            protocol = runtime.protocols[4]
+            send_data = protocol.sendData
+
+            def drop_send(pc, data_type, data):
+                if data_type != SEND:
+                    send_data(pc, data_type, data)
+            protocol.sendData = drop_send
+            x = runtime.broadcast([1], "Hello four!")
+        else:
+            x = runtime.broadcast([1])
+
+        x.addCallback(self.assertEquals, "Hello four!")
+        # Player 4 fetches the payload after the others have
+        # delivered it, so they must stay connected until then.
+        runtime.schedule_callback(x, lambda _: runtime.synchronize())
+        return x
+
+    @protocol
+    def test_broadcast_fetch_silent_sender(self, runtime):
+        """Test that a payload is fetched while another sender is
+        silent."""
+        if runtime.id == 1:
+            # Player 4 only sees the digests of the message.
+            protocol = runtime.protocols[4]
+            send_data = protocol.sendData
+
+            def drop_send(pc, data_type, data):
+                if data_type != SEND:
+                    send_data(pc, data_type, data)
+            protocol.sendData = drop_send
+            x, _ = runtime.broadcast([1, 2], "Hello four!")
+        elif runtime.id == 2:
+            # Player 2 takes part in the broadcast but never sends
+            # its own message, so it is never delivered.
+            for peer_id, protocol in runtime.protocols.iteritems():
+                if peer_id != runtime.id:
+                    def drop_send(pc, data_type, data,
+                                  send_data=protocol.sendData):
+                        if data_type != SEND:
+                            send_data(pc, data_type, data)
+                    protocol.sendData = drop_send
+            x, _ = runtime.broadcast([1, 2], "Silence")
+        else:
+            x, _ = runtime.broadcast([1, 2])
+
+        x.addCallback(self.assertEquals, "Hello four!")
+        runtime.schedule_callback(x, lambda _: runtime.synchronize())
+        return x
+
@@ -111,3 +111,52 @@ class ProgramCounterTest(RuntimeTestCase):
                 deferreds.extend([d100, d200, d300])
 
         return gatherResults(deferreds)
+
+
+class BatchingTest(RuntimeTestCase):
+    """Tests for coalescing of messages into batch frames."""
+
+    def _enable_batching(self, runtime):
+        for peer_id, exchanger in runtime.protocols.iteritems():
+            if peer_id != runtime.id:
+                exchanger.batching = True
+
+    @protocol
+    def test_batched_send(self, runtime):
+        """Test that queued messages are delivered from one frame."""
+        self._enable_batching(runtime)
+
+        for peer_id in range(1, self.num_players+1):
+            if peer_id != runtime.id:
+                pc = tuple(runtime.program_counter)
+                runtime.protocols[peer_id].sendData(pc, 42, "100")
+                runtime.protocols[peer_id].sendData(pc, 42, "200")
+                runtime.protocols[peer_id].sendData(pc + (1,), 42, "300")
+                runtime.protocols[peer_id].flush()
+                self.assertEquals(runtime.protocols[peer_id].sent_packets, 1)
+                self.assertEquals(runtime.protocols[peer_id].sent_messages, 3)
+                self.assertEquals(runtime.protocols[peer_id].saved_frames, 2)
+
+        deferreds = []
+        for peer_id in range(1, self.num_players+1):
+            if peer_id != runtime.id:
+                d100 = Deferred().addCallback(self.assertEquals, "100")
+                d200 = Deferred().addCallback(self.assertEquals, "200")
+                d300 = Deferred().addCallback(self.assertEquals, "300")
+                runtime._expect_data(peer_id, 42, d100)
+                runtime._expect_data(peer_id, 42, d200)
+                runtime._expect_data_with_pc(
+                    tuple(runtime.program_counter) + (1,), peer_id, 42, d300)
+                deferreds.extend([d100, d200, d300])
+
+        return gatherResults(deferreds)
+
+    @protocol
+    def test_batched_multiplication(self, runtime):
+        """Test that a computation works with batching enabled."""
+        self._enable_batching(runtime)
+
+        a, b, c = runtime.shamir_share([1, 2, 3], self.Zp, 42 + runtime.id)
+        product = runtime.open(a * b * c)
+        product.addCallback(self.assertEquals, (42 + 1) * (42 + 2) * (42 + 3))
+        return product
@@ -17,6 +17,7 @@
 
 """Tests for viff.field."""
 
+import viff.field
 from viff.field import GF, GF256
 
 from twisted.trial.unittest import TestCase
@@ -119,6 +120,26 @@ class GFpElementTest(TestCase):
         self.assertEquals(a.bit(6), 0)
         self.assertEquals(a.bit(100), 0)
 
+    def test_slots(self):
+        """Test that elements carry no instance dictionary."""
+        self.assertFalse(hasattr(self.field(1), "__dict__"))
+
+    def test_invert_all(self):
+        """Test inverse operation on all non-zero elements."""
+        for i in range(1, 31):
+            self.assertEquals(self.field(i) * ~self.field(i), self.field(1))
+
+    def test_debug_field_check(self):
+        """Test that comparisons across fields fail in debug mode."""
+        other = GF(37)
+        self.assertFalse(self.field(1) == other(2))
+        viff.field.debug = True
+        try:
+            self.assertRaises(AssertionError,
+                              lambda: self.field(1) == other(1))
+        finally:
+            viff.field.debug = False
+
 # TODO: figure out how to use the todo attribute correctly. Update
 # this if and when __repr__ return the proper string
 #    def test_repr(self):
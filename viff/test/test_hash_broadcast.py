@@ -18,10 +18,12 @@
 from twisted.internet.defer import Deferred, DeferredList
 
 from viff.test.util import RuntimeTestCase, protocol
+from viff.constants import TEXT
 from viff.field import GF
 
 from viff.comparison import Toft05Runtime
-from viff.hash_broadcast import HashBroadcastMixin
+from viff.hash_broadcast import HashBroadcastMixin, \
+    InconsistentHashException
 
 class BroadcastRuntime(Toft05Runtime, HashBroadcastMixin):
     """Mix of :class:`Toft05Runtime` and
@@ -178,3 +180,54 @@ class HashBroadcastTest(RuntimeTestCase):
         runtime.schedule_callback(dls, check)
         dls.addErrback(runtime.error_handler)
         return dls
+
+
+class OptimisticHashBroadcastTest(HashBroadcastTest):
+    """Test for the hash broadcast mixin with hashes compared only at
+    checkpoints."""
+
+    runtime_options = {'optimistic_broadcast': True}
+
+    @protocol
+    def test_checkpoint(self, runtime):
+        """Test that consistent broadcasts pass a checkpoint."""
+        receivers = [1, 2, 3]
+        if runtime.id == 1:
+            d1 = runtime.broadcast([1], receivers, "first")
+        else:
+            d1 = runtime.broadcast([1], receivers)
+        if runtime.id == 2:
+            d2 = runtime.broadcast([2], [2, 3], "second")
+        else:
+            d2 = runtime.broadcast([2], [2, 3])
+
+        d1.addCallback(self.assertEquals, "first")
+        if runtime.id != 1:
+            d2.addCallback(self.assertEquals, "second")
+
+        result = runtime.checkpoint()
+        result.addCallback(self.assertEquals, None)
+        return result
+
+    @protocol
+    def test_checkpoint_inconsistent(self, runtime):
+        """Test that a checkpoint detects a sender sending different
+        messages to the receivers."""
+        receivers = [2, 3]
+        if runtime.id == 1:
+            def send_message(pc, sender, receivers, message):
+                for peer_id in receivers:
+                    runtime.protocols[peer_id].sendData(pc, TEXT,
+                                                        "%s%d" % (message,
+                                                                  peer_id))
+            runtime._send_message = send_message
+            d = runtime.broadcast([1], receivers, "value")
+        else:
+            d = runtime.broadcast([1], receivers)
+            # The value is released before it has been checked.
+            d.addCallback(self.assertEquals, "value%d" % runtime.id)
+
+        result = runtime.checkpoint()
+        if runtime.id in receivers:
+            self.assertFailure(result, InconsistentHashException)
+        return result
@@ -18,8 +18,10 @@
 #: Declare doctests for Trial.
 __doctests__ = ['viff.matrix']
 
-from viff.field import GF
+import viff.matrix
+from viff.field import GF, GF256
 from viff.matrix import Matrix, hyper
+from viff.util import rand, find_prime
 from viff.prss import generate_subsets
 from twisted.trial.unittest import TestCase
 
@@ -60,3 +62,53 @@ class MatrixTest(TestCase):
                     [Zp(4), Zp(6), Zp(9)],
                     [Zp(3), Zp(5), Zp(8)]])
         self.assertFalse(self.is_hyper(m))
+
+    def test_hyper_cached(self):
+        """Check that hyper-invertible matrices are cached."""
+        Zp = GF(47)
+        self.assertIdentical(hyper(4, Zp), hyper(4, Zp))
+        self.assertNotIdentical(hyper(4, Zp), hyper(4, GF(53)))
+
+    def _test_mul_vectors(self, field, n=5, count=7):
+        """Compare mul_vectors with multiplication by columns."""
+        m = Matrix([[field(rand.randint(0, field.modulus - 1))
+                     for _ in range(n)] for _ in range(n - 1)])
+        vectors = [[field(rand.randint(0, field.modulus - 1))
+                    for _ in range(n)] for _ in range(count)]
+        expected = [(m * Matrix([v]).transpose()).transpose().rows[0]
+                    for v in vectors]
+        self.assertEquals(m.mul_vectors(vectors), expected)
+
+    def test_mul_vectors(self):
+        """Test multiplication in a small and a large prime field."""
+        self._test_mul_vectors(GF(47))
+        self._test_mul_vectors(GF(find_prime(2**40)))
+        self._test_mul_vectors(GF(find_prime(2**100)))
+
+    def test_mul_vectors_without_numpy(self):
+        """Test multiplication without NumPy."""
+        numpy = viff.matrix.numpy
+        viff.matrix.numpy = None
+        try:
+            self._test_mul_vectors(GF(47))
+            self._test_mul_vectors(GF(find_prime(2**100)))
+        finally:
+            viff.matrix.numpy = numpy
+
+    def test_mul_vectors_gf256(self):
+        """Test multiplication in GF256."""
+        self._test_mul_vectors(GF256)
+
+    def test_mul_vectors_setitem(self):
+        """Check that assignment updates the residues."""
+        Zp = GF(47)
+        m = Matrix([[Zp(1), Zp(2)], [Zp(3), Zp(4)]])
+        self.assertEquals(m.mul_vectors([[Zp(1), Zp(1)]]), [[Zp(3), Zp(7)]])
+        m[0, 0] = Zp(10)
+        self.assertEquals(m.mul_vectors([[Zp(1), Zp(1)]]), [[Zp(12), Zp(7)]])
+
+    def test_mul_vectors_dimensions(self):
+        """Check that vectors of the wrong length are rejected."""
+        Zp = GF(47)
+        self.assertRaises(ValueError, hyper(3, Zp).mul_vectors, [[Zp(1)]])
+        self.assertEquals(hyper(3, Zp).mul_vectors([]), [])
@@ -0,0 +1,198 @@
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.paillier."""
+
+from random import Random
+
+from gmpy import jacobi
+
+from twisted.trial.unittest import TestCase
+
+from viff.paillier import generate_keys, encrypt, encrypt_r, decrypt, \
+    randomizer, fixed_base_randomizer, FixedBase, RandomizerPool, \
+    PaillierRuntime
+from viff.util import find_prime
+from viff.test.util import RuntimeTestCase, protocol
+
+#: Declare doctests for Trial.
+__doctests__ = ['viff.paillier']
+
+
+class PaillierTest(TestCase):
+    """Tests for the Paillier crypto system."""
+
+    def setUp(self):
+        self.pubkey, self.seckey = generate_keys(256)
+        self.n = self.pubkey['n']
+        self.nsq = self.n * self.n
+
+    def test_encrypt_decrypt(self):
+        for m in [0, 1, 42, self.n - 1]:
+            self.assertEquals(decrypt(encrypt(m, self.pubkey), self.seckey), m)
+
+    def test_encrypt_r(self):
+        c = encrypt_r(17, 1234567, self.pubkey)
+        expected = pow(self.n + 1, 17, self.nsq) * \
+            pow(1234567, self.n, self.nsq) % self.nsq
+        self.assertEquals(c, expected)
+
+    def test_homomorphic(self):
+        a = encrypt(100, self.pubkey)
+        b = encrypt(23, self.pubkey)
+        self.assertEquals(decrypt(a * b % self.nsq, self.seckey), 123)
+        self.assertEquals(decrypt(pow(a, 3, self.nsq), self.seckey), 300)
+
+    def test_decrypt_without_primes(self):
+        """Test that keys without p and q still decrypt."""
+        seckey = dict(self.seckey)
+        del seckey['p']
+        del seckey['q']
+        c = encrypt(4711, self.pubkey)
+        self.assertEquals(decrypt(c, seckey), 4711)
+        self.assertEquals(decrypt(c, self.seckey), 4711)
+
+    def test_randomizer(self):
+        r, rn = randomizer(self.pubkey, Random(42))
+        self.assertEquals(pow(r, self.n, self.nsq), rn)
+        c = encrypt_r(99, r, self.pubkey)
+        self.assertEquals(decrypt(c, self.seckey), 99)
+
+    def test_fixed_base_randomizer(self):
+        r, rn = fixed_base_randomizer(self.pubkey, Random(42))
+        self.assertEquals(pow(r, self.n, self.nsq), rn)
+        c = encrypt(99, self.pubkey, fixed_base=True)
+        self.assertEquals(decrypt(c, self.seckey), 99)
+
+    def test_randomizer_subgroup(self):
+        """Test that fixed-base randomizers for a Blum modulus have
+        Jacobi symbol 1."""
+        # With p = q = 3 (mod 4), -1 is a non-residue modulo both
+        # primes, so h = -y^2 and its powers have Jacobi symbol 1.
+        n = find_prime(2**128, blum=True) * find_prime(2**129, blum=True)
+        pubkey = {'n': n, 'g': n + 1, 'n_square': n * n}
+        for _ in range(10):
+            r, rn = fixed_base_randomizer(pubkey)
+            self.assertEquals(jacobi(r, n), 1)
+
+    def test_fixed_base(self):
+        table = FixedBase(7, self.nsq, 256, window=4)
+        for e in [0, 1, 2**255, 2**256 - 1, self.n // 3]:
+            self.assertEquals(table.pow(e), pow(7, e, self.nsq))
+        self.assertRaises(ValueError, table.pow, 2**256)
+
+
+class RandomizerPoolTest(TestCase):
+    """Tests for the pool of Paillier randomizers."""
+
+    def setUp(self):
+        self.pubkey, self.seckey = generate_keys(256)
+        self.n = self.pubkey['n']
+        self.pool = RandomizerPool(10, 5, batch_size=4, processes=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_fill(self):
+
+        def use(_):
+            self.assertEquals(self.pool.stats()['available'], 10)
+            for _ in range(6):
+                r, rn = self.pool.get(self.pubkey)
+                self.assertEquals(pow(r, self.n, self.n**2), rn)
+            stats = self.pool.stats()
+            self.assertEquals((stats['hits'], stats['misses']), (6, 0))
+            # Falling below the low watermark triggered a refill.
+            return self.pool.wait()
+
+        def check(_):
+            self.assertEquals(self.pool.stats()['available'], 10)
+
+        self.pool.register(self.pubkey)
+        result = self.pool.wait()
+        result.addCallback(use)
+        result.addCallback(check)
+        return result
+
+    def test_empty(self):
+        """Test that an empty pool computes randomizers on demand."""
+        pool = RandomizerPool(0)
+        pairs = [pool.get(self.pubkey) for _ in range(3)]
+        self.assertEquals(pool._workers, None)
+        self.assertEquals(pool.stats()['misses'], 3)
+        self.assertEquals(pool.stats()['pending'], 0)
+        for r, rn in pairs:
+            self.assertEquals(pow(r, self.n, self.n**2), rn)
+
+    def test_encrypt(self):
+        c = self.pool.encrypt(1234, self.pubkey)
+        self.assertEquals(decrypt(c, self.seckey), 1234)
+
+    def test_failed_batch(self):
+        """Test that a failed batch is no longer pending."""
+        # The worker cannot pick random numbers in Zn* for n = 1.
+        self.pool.register({'n': 1})
+
+        def check(_):
+            stats = self.pool.stats()
+            self.assertEquals((stats['available'], stats['pending']), (0, 0))
+
+        result = self.pool.wait()
+        result.addCallback(check)
+        return result
+
+    def test_close_fires_wait(self):
+        """Test that closing the pool fires pending waits."""
+        self.pool.register(self.pubkey)
+        result = self.pool.wait()
+        self.pool.close()
+        self.assertEquals(self.pool.stats()['pending'], 0)
+        return result
+
+    def test_closed(self):
+        """Test that a closed pool is not refilled."""
+        self.pool.close()
+        self.pool.get(self.pubkey)
+        self.assertEquals(self.pool.stats()['pending'], 0)
+        self.assertEquals(self.pool._workers, None)
+
+
+class PaillierRuntimeTest(RuntimeTestCase):
+    """Tests for the PaillierRuntime using a randomizer pool."""
+
+    num_players = 2
+    runtime_class = PaillierRuntime
+    runtime_options = {'randomizer_pool_depth': 4,
+                       'randomizer_pool_processes': 1}
+
+    @protocol
+    def test_mul(self, runtime):
+        self.assertNotEquals(runtime.randomizer_pool, None)
+        if runtime.id == 1:
+            a = runtime.input([1], self.Zp, 6)
+            b = runtime.input([2], self.Zp)
+        else:
+            a = runtime.input([1], self.Zp)
+            b = runtime.input([2], self.Zp, 7)
+        result = runtime.open(a * b)
+        result.addCallback(self.assertEquals, self.Zp(42))
+        return result
+
+    @protocol
+    def test_disabled_by_default(self, runtime):
+        self.assertEquals(PaillierRuntime(runtime.player, 1).randomizer_pool,
+                          None)
@@ -0,0 +1,157 @@
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.pool."""
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import gatherResults
+
+from viff.field import GF, GF256
+from viff.pool import PoolFile, PoolError, save_pool
+from viff.runtime import Share
+from viff.active import ActiveRuntime
+from viff.test.util import RuntimeTestCase, protocol
+
+
+class PoolFileTest(TestCase):
+    """Test saving and loading pool files."""
+
+    def setUp(self):
+        self.Zp = GF(30916444023318367583)
+        self.filename = self.mktemp()
+        self.items = [((0, 1, 2), [self.Zp(1), self.Zp(2), self.Zp(3)]),
+                      ((0, 1, 3), self.Zp(30916444023318367582)),
+                      ((0, 2), [GF256(7)] * 8)]
+        save_pool(self.filename, self.items, 3, 1, 42)
+
+    def test_load(self):
+        pool = PoolFile(self.filename, 3, 1, 42)
+        self.assertEquals(len(pool), 3)
+        for pc, item in self.items:
+            self.assertTrue(pc in pool)
+            self.assertEquals(pool.pop(pc), item)
+        self.assertEquals(len(pool), 0)
+        self.assertRaises(KeyError, pool.pop, (0, 1, 2))
+        pool.close()
+
+    def test_update(self):
+        pool = PoolFile(self.filename, 3, 1, 42)
+        pool.update([((0, 5), self.Zp(5))])
+        self.assertEquals(len(pool), 4)
+        self.assertEquals(pool.pop((0, 5)), self.Zp(5))
+        self.assertEquals(sorted(pool.items()), sorted(self.items))
+        pool.close()
+
+    def test_mismatch(self):
+        self.assertRaises(PoolError, PoolFile, self.filename, 4, 1, 42)
+        self.assertRaises(PoolError, PoolFile, self.filename, 3, 2, 42)
+        self.assertRaises(PoolError, PoolFile, self.filename, 3, 1, None)
+
+    def test_field_mismatch(self):
+        PoolFile(self.filename, 3, 1, 42, [self.Zp, GF256]).close()
+        self.assertRaises(PoolError, PoolFile, self.filename, 3, 1, 42,
+                          [self.Zp])
+        self.assertRaises(PoolError, PoolFile, self.filename, 3, 1, 42,
+                          [GF(1031), GF256])
+
+    def test_not_a_pool(self):
+        filename = self.mktemp()
+        open(filename, "wb").close()
+        self.assertRaises(PoolError, PoolFile, filename, 3, 1, 42)
+        out = open(filename, "wb")
+        out.write("garbage" * 10)
+        out.close()
+        self.assertRaises(PoolError, PoolFile, filename, 3, 1, 42)
+
+    def test_unsupported_item(self):
+        self.assertRaises(ValueError, save_pool, self.mktemp(),
+                          [((0, 1), [self.Zp(1), GF256(1)])], 3, 1, 42)
+        self.assertRaises(ValueError, save_pool, self.mktemp(),
+                          [((0, 1), 10)], 3, 1, 42)
+
+
+class PreprocessingPoolTest(RuntimeTestCase):
+    """Test saving preprocessed triples and loading them again."""
+
+    num_players = 4
+    runtime_class = ActiveRuntime
+
+    @protocol
+    def test_save_and_load_triples(self, runtime):
+        filename = self.mktemp()
+        pcs = [(0, 1000, i) for i in range(3)]
+        program = {("generate_triples", (self.Zp,)): pcs[:]}
+
+        def save(_):
+            self.assertEquals(len(runtime._pool), len(pcs))
+            runtime.save_pool(filename)
+            runtime._pool = {}
+            runtime.load_pool(filename, [self.Zp])
+            self.assertEquals(len(runtime._pool), len(pcs))
+
+            results = []
+            for pc in pcs:
+                a, b, c = runtime._pool.pop(pc)
+                a = Share(runtime, self.Zp, a)
+                b = Share(runtime, self.Zp, b)
+                c = Share(runtime, self.Zp, c)
+                result = gatherResults([runtime.open(x) for x in a, b, c])
+                result.addCallback(lambda (a, b, c):
+                                   self.assertEquals(a * b, c))
+                results.append(result)
+            return gatherResults(results)
+
+        result = runtime.preprocess(program)
+        runtime.schedule_callback(result, save)
+        return result
+
+
+class FifoPoolTest(RuntimeTestCase):
+    """Test preprocessing without program counters."""
+
+    num_players = 4
+    runtime_class = ActiveRuntime
+
+    @protocol
+    def test_multiply(self, runtime):
+        count = 5
+        key = ("generate_triples", (self.Zp,))
+
+        def multiply(_):
+            self.assertEquals(len(runtime._fifo_pool[key]), count)
+            results = []
+            for i in range(count):
+                x = Share(runtime, self.Zp, self.Zp(i))
+                y = Share(runtime, self.Zp, self.Zp(i + 10))
+                result = runtime.open(x * y)
+                result.addCallback(self.assertEquals, self.Zp(i * (i + 10)))
+                results.append(result)
+            # All triples came from the queue.
+            self.assertEquals(len(runtime._fifo_pool[key]), 0)
+            self.assertEquals(runtime._needed_data, {})
+            return gatherResults(results)
+
+        result = runtime.preprocess_fifo([(key, count)])
+        runtime.schedule_callback(result, multiply)
+        return result
+
+    @protocol
+    def test_empty_batch(self, runtime):
+        """Test that a generator giving no items is caught."""
+        runtime.generate_nothing = lambda quantity: []
+        self.assertRaises(AssertionError, runtime.preprocess_fifo,
+                          [(("generate_nothing", ()), 1)])
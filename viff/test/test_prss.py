@@ -17,7 +17,7 @@
 
 """Tests for viff.prss."""
 
-from viff.prss import generate_subsets
+from viff.prss import generate_subsets, PRF
 
 from twisted.trial.unittest import TestCase
 
@@ -67,3 +67,14 @@ class PRSSTest(TestCase):
                         self.assertEquals(frozenset([]), union)
                     else:
                         self.assertEquals(set, union)
+
+    def test_prf_many(self):
+        """Test that evaluating a PRF on many inputs gives the same
+        as evaluating it on each input."""
+        inputs = range(50) + ["input", ("input", 123)]
+        # A maximum just above a power of two makes the PRF retry
+        # often, and one above 2**160 uses several SHA1 blocks.
+        for max in [2, 257, 1000, 2**200 + 1]:
+            prf = PRF("key", max)
+            self.assertEquals(prf.many(inputs), [prf(i) for i in inputs])
+        self.assertEquals(prf.many([]), [])
@@ -24,14 +24,21 @@ performed by L{StressTest}.
 """
 
 import os
+import cPickle as pickle
 from random import Random
 import operator
+import struct
+from optparse import OptionParser, Values
 
 from twisted.internet.defer import gatherResults, Deferred, DeferredList
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+from twisted.trial.unittest import TestCase
 
+import viff.runtime
 from viff.field import GF256
-from viff.runtime import Share
-from viff.constants import SHARE
+from viff.runtime import Share, ShareExchanger, Runtime
+from viff.constants import SHARE, TEXT
 from viff.comparison import Toft05Runtime
 from viff.test.util import RuntimeTestCase, BinaryOperatorTestCase, protocol
 
@@ -233,7 +240,347 @@ class RuntimeTest(RuntimeTestCase):
         dls.addCallback(check)
         return dls
 
+    @protocol
+    def test_send_large_data(self, runtime):
+        """Test sending data which is larger than a frame."""
+        pc = tuple(runtime.program_counter)
+        for peer_id, exchanger in runtime.protocols.iteritems():
+            exchanger.batching = True
+            exchanger.sendData(pc, SHARE, "small")
+            exchanger.sendData(pc, SHARE, chr(runtime.id) * 200000)
+            exchanger.sendData(pc, SHARE, "small")
+
+        ds = []
+        for peer_id in runtime.players:
+            for expected in ["small", chr(peer_id) * 200000, "small"]:
+                d = Deferred()
+                runtime._expect_data(peer_id, SHARE, d)
+                d.addCallback(self.assertEquals, expected)
+                ds.append(d)
+        return gatherResults(ds)
+
+    @protocol
+    def test_send_longs(self, runtime):
+        """Test sending lists of integers larger than a frame."""
+        values = [(runtime.id * 3**i) << 2048 for i in range(300)]
+        values.append(-1)
+
+        pc = tuple(runtime.program_counter)
+        for peer_id in runtime.players:
+            runtime.protocols[peer_id].sendLongs(pc, TEXT, values)
+            runtime.protocols[peer_id].sendLongs(pc, SHARE, [])
+
+        ds = []
+        for peer_id in runtime.players:
+            expected = [(peer_id * 3**i) << 2048 for i in range(300)] + [-1]
+            d = Deferred()
+            runtime._expect_longs(peer_id, TEXT, d)
+            d.addCallback(self.assertEquals, expected)
+            ds.append(d)
+            d = Deferred()
+            runtime._expect_longs(peer_id, SHARE, d)
+            d.addCallback(self.assertEquals, [])
+            ds.append(d)
+        return gatherResults(ds)
+
+    @protocol
+    def test_expect_longs_twice(self, runtime):
+        """Test that only one list of integers can be expected from a
+        peer per program counter and data type."""
+        pc = tuple(runtime.program_counter)
+        first = Deferred()
+        runtime._expect_longs(runtime.id, TEXT, first)
+        self.assertRaises(AssertionError, runtime._expect_longs,
+                          runtime.id, TEXT, Deferred())
+        first.addCallback(self.assertEquals, [1, 2])
+
+        # The key can be used again when the first list has arrived.
+        runtime.protocols[runtime.id].sendLongs(pc, TEXT, [1, 2])
+        runtime.protocols[runtime.id].sendLongs(pc, TEXT, [3])
+
+        def expect_again(_):
+            second = Deferred()
+            runtime._expect_longs(runtime.id, TEXT, second)
+            second.addCallback(self.assertEquals, [3])
+            return second
+        first.addCallback(expect_again)
+        return first
+
+    @protocol
+    def test_binary_shares(self, runtime):
+        """Test that shares are sent using the binary encoding."""
+        for peer_id, exchanger in runtime.protocols.iteritems():
+            self.assertTrue(exchanger.binary_shares)
 
+        bytes_before = runtime.protocols[2].sent_bytes
+        pc = tuple(runtime.program_counter)
+        if runtime.id != 2:
+            runtime.protocols[2].sendShare(pc, GF256(17))
+            # The frame holds 5 header bytes, the program counter and
+            # a single byte for the element.
+            sent = runtime.protocols[2].sent_bytes - bytes_before
+            self.assertEquals(sent, 5 + 4 * len(pc) + 1)
+            return None
+        else:
+            results = []
+            for peer_id in 1, 3:
+                d = runtime._expect_share(peer_id, GF256)
+                d.addCallback(self.assertEquals, GF256(17))
+                results.append(d)
+            return gatherResults(results)
+
+    def _mul_many(self, runtime, field, count, indices=None):
+        """Multiply *count* pairs with :meth:`mul_many` and check the
+        products at *indices*, or all products if *indices* is None."""
+        a = [Share(runtime, field, field(i) + runtime.id)
+             for i in range(count)]
+        b = [Share(runtime, field, field(i + 1) + runtime.id)
+             for i in range(count)]
+        products = runtime.mul_many(a, b)
+        if indices is None:
+            indices = range(count)
+        results = []
+        for i in indices:
+            opened = runtime.open(products[i])
+            opened.addCallback(self.assertEquals, field(i) * field(i + 1))
+            results.append(opened)
+        return gatherResults(results)
+
+    @protocol
+    def test_mul_many(self, runtime):
+        """Test multiplication of many pairs at once."""
+        return self._mul_many(runtime, self.Zp, 10)
+
+    @protocol
+    def test_mul_many_long_vector(self, runtime):
+        """Test a vector of products split over several messages."""
+        # Use smaller messages to keep the test fast. The messages
+        # are still larger than a frame.
+        for exchanger in runtime.protocols.itervalues():
+            exchanger.max_message_size = 2**17
+        length = runtime.protocols[1].vector_chunk_length(self.Zp)
+        # Opening thousands of products is slow with the VIFF
+        # reactor, so only those around the message boundary are
+        # checked.
+        return self._mul_many(runtime, self.Zp, length + 10,
+                              [0, length - 1, length, length + 9])
+
+    @protocol
+    def test_mul_many_hex_shares(self, runtime):
+        """Test multiplication of many pairs with hexadecimal shares."""
+        for exchanger in runtime.protocols.itervalues():
+            exchanger.binary_shares = False
+        return self._mul_many(runtime, self.Zp, 10)
+
+    @protocol
+    def test_mul_many_gf256(self, runtime):
+        """Test multiplication of many pairs in GF256."""
+        return self._mul_many(runtime, GF256, 10)
+
+    @protocol
+    def test_mul_many_empty(self, runtime):
+        self.assertEquals(runtime.mul_many([], []), [])
+
+
+class LegacyShareExchanger(ShareExchanger):
+    """Receive data like a peer unaware of binary shares and fragments."""
+
+    def connectionMade(self):
+        self.sendString(str(self.factory.runtime.id))
+
+    def stringReceived(self, string):
+        if self.peer_id is None and len(string)<=4:
+            self.peer_id = int(string)
+            self.factory.identify_peer(self)
+        elif len(string)>4:
+            try:
+                pc_size, data_size, data_type = \
+                    struct.unpack("!HHB", string[:5])
+                fmt = "!%dI%ds" % (pc_size, data_size)
+                unpacked = struct.unpack(fmt, string[5:])
+                self._deliver(unpacked[:pc_size], data_type, unpacked[-1])
+            except struct.error, e:
+                self.factory.runtime.abort(self, e)
+
+
+class HandshakeTest(TestCase):
+    """Test negotiation of the share encoding."""
+
+    class FakeFactory(object):
+
+        def __init__(self, id, binary_shares):
+            parser = OptionParser()
+            Runtime.add_options(parser)
+            self.runtime = Values()
+            self.runtime.id = id
+            self.runtime.options = parser.get_default_values()
+            self.runtime.options.binary_shares = binary_shares
+            self.runtime.abort = self.abort
+            self.identified = []
+            self.errors = []
+
+        def identify_peer(self, protocol):
+            self.identified.append(protocol.peer_id)
+
+        def abort(self, protocol, exc):
+            self.errors.append(exc)
+
+    def setUp(self):
+        self.clock = Clock()
+        self.patch(viff.runtime, "reactor", self.clock)
+
+    def _connect(self, protocol, id, binary_shares):
+        protocol.factory = self.FakeFactory(id, binary_shares)
+        protocol.makeConnection(StringTransport())
+        return protocol
+
+    def _transfer(self, source, destination):
+        data = source.transport.value()
+        source.transport.clear()
+        destination.dataReceived(data)
+
+    def _handshake(self, first, second):
+        self._transfer(first, second)
+        self._transfer(second, first)
+
+    def test_binary_peer(self):
+        first = self._connect(ShareExchanger(), 1, True)
+        second = self._connect(ShareExchanger(), 2, True)
+        self._handshake(first, second)
+        for protocol, peer_id in (first, 2), (second, 1):
+            self.assertEquals(protocol.peer_id, peer_id)
+            self.assertEquals(protocol.factory.identified, [peer_id])
+            self.assertTrue(protocol.binary_shares)
+            self.assertTrue(protocol.fragments)
+            self.assertEquals(protocol.message_size_limit(),
+                              protocol.max_message_size - 1024)
+
+    def test_binary_disabled(self):
+        first = self._connect(ShareExchanger(), 1, True)
+        second = self._connect(ShareExchanger(), 2, False)
+        self._handshake(first, second)
+        self.assertFalse(first.binary_shares)
+        self.assertFalse(second.binary_shares)
+        self.assertTrue(first.fragments)
+
+    def test_identify_after_features(self):
+        """Test that the peer is identified when its features are known."""
+        first = self._connect(ShareExchanger(), 1, True)
+        second = self._connect(ShareExchanger(), 2, True)
+        data = first.transport.value()
+        # Deliver the ID alone.
+        second.dataReceived(data[:3])
+        self.assertEquals(second.peer_id, 1)
+        self.assertEquals(second.factory.identified, [])
+        second.dataReceived(data[3:])
+        self.assertEquals(second.factory.identified, [1])
+        self.assertEquals(self.clock.getDelayedCalls(), [])
+
+    def test_legacy_receiver(self):
+        """Test that a legacy peer can receive from us."""
+        protocol = self._connect(ShareExchanger(), 1, True)
+        legacy = self._connect(LegacyShareExchanger(), 2, True)
+        self._handshake(protocol, legacy)
+        self.assertEquals(legacy.peer_id, 1)
+        self.assertEquals(legacy.factory.identified, [1])
+
+        # The legacy peer sends data and is identified.
+        legacy.sendData((1,), SHARE, hex(42))
+        self._transfer(legacy, protocol)
+        self.assertEquals(protocol.factory.identified, [2])
+        self.assertFalse(protocol.binary_shares)
+        self.assertFalse(protocol.fragments)
+        self.assertEquals(protocol.incoming_data[((1,), SHARE)][0], hex(42))
+
+        protocol.sendShare((2,), GF256(17))
+        self._transfer(protocol, legacy)
+        self.assertEquals(legacy.factory.errors, [])
+        self.assertEquals(legacy.incoming_data[((2,), SHARE)][0], hex(17))
+
+    def test_legacy_timeout(self):
+        """Test that a silent legacy peer is identified after a timeout."""
+        protocol = self._connect(ShareExchanger(), 1, True)
+        legacy = self._connect(LegacyShareExchanger(), 2, True)
+        self._handshake(protocol, legacy)
+        self.assertEquals(protocol.factory.identified, [])
+        self.clock.advance(protocol.handshake_timeout)
+        self.assertEquals(protocol.factory.identified, [2])
+        self.assertFalse(protocol.binary_shares)
+
+    def test_large_data(self):
+        first = self._connect(ShareExchanger(), 1, True)
+        second = self._connect(ShareExchanger(), 2, True)
+        self._handshake(first, second)
+        data = "x" * (2 * first.max_frame_size)
+        first.sendData((1,), SHARE, data)
+        self.assertEquals(first.sent_packets, 3)
+        self.assertEquals(first.saved_frames, 0)
+        self._transfer(first, second)
+        self.assertEquals(second.factory.errors, [])
+        self.assertEquals(second.incoming_data[((1,), SHARE)][0], data)
+
+    def test_large_data_legacy_peer(self):
+        protocol = self._connect(ShareExchanger(), 1, True)
+        legacy = self._connect(LegacyShareExchanger(), 2, True)
+        self._handshake(protocol, legacy)
+        self.clock.advance(protocol.handshake_timeout)
+        self.assertFalse(protocol.fragments)
+        self.assertRaises(AssertionError, protocol.sendData,
+                          (1,), SHARE, "x" * protocol.max_frame_size)
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+def _unpicklable():
+    return lambda: None
+
+
+class DeferToPoolTest(RuntimeTestCase):
+    """Test running functions in the reactor thread."""
+
+    @protocol
+    def test_result(self, runtime):
+        result = runtime.defer_to_pool(pow, 3, 4, 7)
+        result.addCallback(self.assertEquals, 4)
+        return result
+
+    @protocol
+    def test_error(self, runtime):
+        result = runtime.defer_to_pool(_fail, "bad")
+        return self.assertFailure(result, ValueError)
+
+
+class DeferToWorkerTest(DeferToPoolTest):
+    """Test running functions in worker processes."""
+
+    runtime_options = {'worker_processes': 1}
+
+    @protocol
+    def test_worker_pool(self, runtime):
+        result = runtime.defer_to_pool(os.getpid)
+        result.addCallback(self.assertNotEquals, os.getpid())
+        self.assertNotEquals(runtime._worker_pool, None)
+        return result
+
+    @protocol
+    def test_unpicklable_argument(self, runtime):
+        result = runtime.defer_to_pool(pow, lambda: None, 4, 7)
+        return self.assertFailure(result, pickle.PicklingError)
+
+    @protocol
+    def test_unpicklable_result(self, runtime):
+        result = runtime.defer_to_pool(_unpicklable)
+        return self.assertFailure(result, pickle.PicklingError)
+
+    @protocol
+    def test_many_results(self, runtime):
+        results = [runtime.defer_to_pool(pow, 3, i, 7) for i in range(20)]
+        result = gatherResults(results)
+        result.addCallback(self.assertEquals,
+                           [pow(3, i, 7) for i in range(20)])
+        return result
 
 
 class ConvertBitShareTest(RuntimeTestCase):
@@ -19,9 +19,12 @@
 
 import operator
 
+from viff.field import GF
+from viff.runtime import Share, gather_shares
 from viff.comparison import Toft05Runtime, Toft07Runtime
 from viff.comparison import ActiveToft05Runtime, ActiveToft07Runtime
-from viff.test.util import RuntimeTestCase, BinaryOperatorTestCase
+from viff.util import find_prime
+from viff.test.util import RuntimeTestCase, BinaryOperatorTestCase, protocol
 
 
 class Toft05GreaterThanTest(BinaryOperatorTestCase, RuntimeTestCase):
@@ -105,3 +108,56 @@ class ActiveToft07LessThanTest(BinaryOperatorTestCase, RuntimeTestCase):
 class ActiveToft07LessThanEqualTest(BinaryOperatorTestCase, RuntimeTestCase):
     runtime_class = ActiveToft07Runtime
     operator = operator.le
+
+
+class GreaterThanEqualManyTestCase:
+    """Test of :meth:`greater_than_equal_many`.
+
+    This mix-in class should be used together with a RuntimeTestCase
+    class using a Toft07 comparison.
+    """
+
+    values = [(0, 0), (1, 0), (0, 1), (12345, 6789), (6789, 12345),
+              (2**32 - 1, 2**32 - 2), (2**32 - 2, 2**32 - 1)]
+
+    def _verify(self, runtime, results, expected):
+        opened = gather_shares(map(runtime.open, results))
+        opened.addCallback(self.assertEquals, expected)
+        return opened
+
+    @protocol
+    def test_greater_than_equal_many(self, runtime):
+        pairs = [(Share(runtime, self.Zp, self.Zp(a)), b)
+                 for a, b in self.values]
+        results = runtime.greater_than_equal_many(pairs)
+        self.assertEquals(len(results), len(pairs))
+        return self._verify(runtime, results,
+                            [self.Zp(a >= b) for a, b in self.values])
+
+    @protocol
+    def test_two_fields(self, runtime):
+        Zq = GF(find_prime(2**80, blum=True))
+        pairs = []
+        expected = []
+        for i, (a, b) in enumerate(self.values):
+            field = [self.Zp, Zq][i % 2]
+            pairs.append((field(a), Share(runtime, field, field(b))))
+            expected.append(field(a >= b))
+        results = runtime.greater_than_equal_many(pairs)
+        self.assertEquals([r.field for r in results],
+                          [e.field for e in expected])
+        return self._verify(runtime, results, expected)
+
+    @protocol
+    def test_empty(self, runtime):
+        self.assertEquals(runtime.greater_than_equal_many([]), [])
+
+
+class Toft07GreaterThanEqualManyTest(GreaterThanEqualManyTestCase,
+                                     RuntimeTestCase):
+    runtime_class = Toft07Runtime
+
+
+class ActiveToft07GreaterThanEqualManyTest(GreaterThanEqualManyTestCase,
+                                           RuntimeTestCase):
+    runtime_class = ActiveToft07Runtime
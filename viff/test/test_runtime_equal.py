@@ -21,8 +21,11 @@
 import operator
 
 from viff.equality import ProbabilisticEqualityMixin
-from viff.test.util import RuntimeTestCase, BinaryOperatorTestCase
+from viff.test.util import RuntimeTestCase, BinaryOperatorTestCase, protocol
 from viff.passive import PassiveRuntime
+from viff.active import ActiveRuntime
+from viff.runtime import Share, SharedVector, gather_shares
+from viff.field import GF
 
 #: Declare doctests for Trial.
 __doctests__ = ['viff.equality']
@@ -33,6 +36,11 @@ class EqualRuntime(PassiveRuntime, ProbabilisticEqualityMixin):
     pass
 
 
+class ActiveEqualRuntime(ActiveRuntime, ProbabilisticEqualityMixin):
+    """An active runtime with the equality mixin."""
+    pass
+
+
 class ProbabilisticEqualityTestDifferent(BinaryOperatorTestCase,
                                          RuntimeTestCase):
     """Testing the equality with *a* and *b* different."""
@@ -67,3 +75,50 @@ class ProbabilisticEqualityTestDiff1_2(BinaryOperatorTestCase,
     b = 0
     runtime_class = EqualRuntime
     operator = operator.eq
+
+
+class EqualManyTest(RuntimeTestCase):
+    """Testing the batched equality."""
+
+    runtime_class = EqualRuntime
+
+    values = [(0, 0), (0, 1), (1, 0), (4023, 4023), (12442, 91243)]
+
+    @protocol
+    def test_equal_many(self, runtime):
+        pairs = [(Share(runtime, self.Zp, self.Zp(a)), b)
+                 for a, b in self.values]
+        results = runtime.equal_many(pairs)
+        self.assertEquals(len(results), len(pairs))
+        opened = gather_shares(map(runtime.open, results))
+        opened.addCallback(self.assertEquals,
+                           [self.Zp(a == b) for a, b in self.values])
+        return opened
+
+    @protocol
+    def test_empty(self, runtime):
+        self.assertEquals(runtime.equal_many([]), [])
+
+    @protocol
+    def test_and_many(self, runtime):
+        bits = [1, 1, 1, 1, 0, 1, 0, 0, 0, 0, 1, 1]
+        x = SharedVector(runtime, self.Zp, len(bits), bits)
+        result = runtime.open_vector(runtime._and_many(x, 4, 3))
+        result.addCallback(self.assertEquals, [1, 0, 0, 0])
+        return result
+
+    @protocol
+    def test_and_many_small_field(self, runtime):
+        # The random masks are often zero in a small field.
+        Zp = GF(7)
+        bits = [1, 1, 1, 1, 0, 1, 0, 0, 0, 0, 1, 1] * 4
+        x = SharedVector(runtime, Zp, len(bits), bits)
+        result = runtime.open_vector(runtime._and_many(x, 16, 3))
+        result.addCallback(self.assertEquals, [1, 0, 0, 0] * 4)
+        return result
+
+
+class ActiveEqualManyTest(EqualManyTest):
+    """Testing the batched equality with an active runtime."""
+
+    runtime_class = ActiveEqualRuntime
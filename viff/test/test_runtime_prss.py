@@ -45,6 +45,19 @@ class RuntimePrssTest(RuntimeTestCase):
 
         return gather_shares([opened_a, opened_b, opened_c])
 
+    @protocol
+    def test_prss_context(self, runtime):
+        """Test that PRSS contexts are kept by the runtime."""
+        context = runtime.prss_context(self.Zp)
+        self.assertTrue(runtime.prss_context(self.Zp) is context)
+        self.assertEquals(context.j, runtime.id)
+        self.assertFalse(runtime.prss_context(GF256) is context)
+
+        prfs = runtime.players[runtime.id].dealer_prfs(self.Zp.modulus)[1]
+        dealer = runtime.prss_context(self.Zp, 1, prfs)
+        self.assertTrue(runtime.prss_context(self.Zp, 1, prfs) is dealer)
+        self.assertEquals(dealer.j, 1)
+
     @protocol
     def test_prss_share_bit(self, runtime):
         """Test sharing of a GF256 element using PRSS."""
@@ -115,6 +128,52 @@ class RuntimePrssTest(RuntimeTestCase):
         opened_a.addCallback(self.assertIn, [self.Zp(0), self.Zp(1)])
         return opened_a
 
+    @protocol
+    def test_prss_share_random_bits(self, runtime):
+        """Tests the sharing of several 0/1 Zp elements using PRSS."""
+        bits = runtime.prss_share_random_bits(self.Zp, 20)
+        self.assertEquals(len(bits), 20)
+
+        opened = gather_shares(map(runtime.open, bits))
+        def check(values):
+            for value in values:
+                self.assertIn(value, [self.Zp(0), self.Zp(1)])
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_prss_share_random_bits_gf256(self, runtime):
+        """Tests the sharing of several 0/1 GF256 elements using PRSS."""
+        bits = runtime.prss_share_random_bits(GF256, 8)
+
+        opened = gather_shares(map(runtime.open, bits))
+        def check(values):
+            for value in values:
+                self.assertIn(value, [GF256(0), GF256(1)])
+        opened.addCallback(check)
+        return opened
+
+    @protocol
+    def test_prss_share_random_bits_retry(self, runtime):
+        """Tests that elements with a zero square are made again."""
+        prss_share_random_vector = runtime.prss_share_random_vector
+
+        def with_zeros(field, quantity):
+            runtime.prss_share_random_vector = prss_share_random_vector
+            vector = prss_share_random_vector(field, quantity)
+            vector.addCallback(lambda values: [0, 0] + values[2:])
+            return vector
+
+        runtime.prss_share_random_vector = with_zeros
+        bits = runtime.prss_share_random_bits(self.Zp, 5)
+
+        opened = gather_shares(map(runtime.open, bits))
+        def check(values):
+            for value in values:
+                self.assertIn(value, [self.Zp(0), self.Zp(1)])
+        opened.addCallback(check)
+        return opened
+
     @protocol
     def test_prss_share_random_multi_bit(self, runtime):
         """Tests the sharing of several 0/1 GF256 elements using PRSS."""
@@ -17,3 +17,39 @@
 
 #: Declare doctests for Trial.
 __doctests__ = ['viff.shamir']
+
+from twisted.trial.unittest import TestCase
+
+from viff import shamir
+from viff.field import GF, GF256
+from viff.util import find_prime
+
+
+class VerifySharingTest(TestCase):
+    """Tests for the verification of sharings."""
+
+    def _test_verify_many(self, field, n, degree):
+        secrets = [field(i) for i in range(10)]
+        xs, shares = zip(*shamir.share_many(secrets, degree, n, field))
+        sharings = map(list, zip(*shares))
+        self.assertEquals(shamir.verify_sharing_many(sharings, degree, xs),
+                          [])
+        for i in [2, 7]:
+            sharings[i][i % n] = (sharings[i][i % n] + 1) % field.modulus
+        self.assertEquals(shamir.verify_sharing_many(sharings, degree, xs),
+                          [2, 7])
+
+    def test_verify_many(self):
+        Zp = GF(find_prime(2**64))
+        self._test_verify_many(Zp, 4, 1)
+        self._test_verify_many(Zp, 7, 2)
+        self._test_verify_many(Zp, 7, 4)
+
+    def test_verify_many_gf256(self):
+        self._test_verify_many(GF256, 7, 2)
+
+    def test_verify_many_full_degree(self):
+        """Test that all sharings are correct when degree is n - 1."""
+        Zp = GF(47)
+        xs = [Zp(1), Zp(2), Zp(3)]
+        self.assertEquals(shamir.verify_sharing_many([[1, 5, 2]], 2, xs), [])
@@ -0,0 +1,192 @@
+# Copyright 2008 VIFF Development Team.
+#
+# This file is part of VIFF, the Virtual Ideal Functionality Framework.
+#
+# VIFF is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License (LGPL) as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# VIFF is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with VIFF. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for viff.runtime.SharedVector."""
+
+from twisted.internet.defer import gatherResults
+
+from viff.test.util import RuntimeTestCase, protocol
+from viff.runtime import Share, SharedVector
+from viff.field import GF256
+from viff.active import BasicActiveRuntime, ActiveRuntime, \
+    TriplesHyperinvertibleMatricesMixin
+
+
+class SharedVectorTest(RuntimeTestCase):
+    """Test the passive operations on shared vectors."""
+
+    xs = [1, 2, 3, 4, 5]
+    ys = [10, 20, 30, 40, 50]
+
+    def _share_vectors(self, runtime, field):
+        """Shamir share the test vectors and gather them."""
+        def share(number):
+            if runtime.id == 1:
+                return runtime.shamir_share([1], field, number)
+            else:
+                return runtime.shamir_share([1], field)
+        xs = [share(x) for x in self.xs]
+        ys = [share(y) for y in self.ys]
+        return runtime.gather_vector(xs), runtime.gather_vector(ys)
+
+    def _check(self, runtime, vector, expected):
+        """Open *vector* and compare with *expected*."""
+        self.assert_type(vector, SharedVector)
+        self.assertEquals(len(vector), len(expected))
+        result = runtime.open_vector(vector)
+        result.addCallback(self.assertEquals, expected)
+        return result
+
+    @protocol
+    def test_add(self, runtime):
+        xs, ys = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(x + y) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, xs + ys, expected)
+
+    @protocol
+    def test_add_constant(self, runtime):
+        xs, _ = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(x + 7) for x in self.xs]
+        return self._check(runtime, xs + 7, expected)
+
+    @protocol
+    def test_sub(self, runtime):
+        xs, ys = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(x - y) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, xs - ys, expected)
+
+    @protocol
+    def test_rsub_constants(self, runtime):
+        xs, _ = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(y - x) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, self.ys - xs, expected)
+
+    @protocol
+    def test_mul(self, runtime):
+        xs, ys = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(x * y) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, xs * ys, expected)
+
+    @protocol
+    def test_mul_constants(self, runtime):
+        xs, _ = self._share_vectors(runtime, self.Zp)
+        expected = [self.Zp(x * y) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, self.ys * xs, expected)
+
+    @protocol
+    def test_lin_comb(self, runtime):
+        xs, ys = self._share_vectors(runtime, self.Zp)
+        coefficients = [3, [1, -1, 2, 0, 5]]
+        expected = [self.Zp(3 * x + c * y) for x, y, c
+                    in zip(self.xs, self.ys, coefficients[1])]
+        vector = runtime.lin_comb_vector(coefficients, [xs, ys])
+        return self._check(runtime, vector, expected)
+
+    @protocol
+    def test_lin_comb_gf256(self, runtime):
+        xs, ys = self._share_vectors(runtime, GF256)
+        expected = [GF256(3) * x + GF256(7) * y
+                    for x, y in zip(self.xs, self.ys)]
+        vector = runtime.lin_comb_vector([GF256(3), 7], [xs, ys])
+        return self._check(runtime, vector, expected)
+
+    @protocol
+    def test_mul_gf256(self, runtime):
+        xs, ys = self._share_vectors(runtime, GF256)
+        expected = [GF256(x) * GF256(y) for x, y in zip(self.xs, self.ys)]
+        return self._check(runtime, xs * ys, expected)
+
+    @protocol
+    def test_mul_long_vector(self, runtime):
+        n = runtime.protocols.values()[0].vector_chunk_length(self.Zp) + 10
+        xs = SharedVector(runtime, self.Zp, n, range(n))
+        expected = [self.Zp(x * x) for x in range(n)]
+        return self._check(runtime, xs * xs, expected)
+
+    @protocol
+    def test_mul_empty(self, runtime):
+        empty = SharedVector(runtime, self.Zp, 0, [])
+        return self._check(runtime, empty * empty, [])
+
+    @protocol
+    def test_split_vector(self, runtime):
+        xs, _ = self._share_vectors(runtime, self.Zp)
+        shares = runtime.split_vector(xs)
+        results = []
+        for share, x in zip(shares, self.xs):
+            self.assert_type(share, Share)
+            result = runtime.open(share)
+            result.addCallback(self.assertEquals, x)
+            results.append(result)
+        return gatherResults(results)
+
+    @protocol
+    def test_prss_share_random_vector(self, runtime):
+        quantity = 10
+        r_t = runtime.prss_share_random_vector(self.Zp, quantity)
+        self.assertEquals(len(r_t), quantity)
+        # Opening with threshold t+1 must be consistent with opening
+        # using all shares.
+        a = runtime.open_vector(r_t)
+        b = runtime.open_vector(r_t.clone(), threshold=2*runtime.threshold)
+        result = gatherResults([a, b])
+        result.addCallback(lambda (a, b): self.assertEquals(a, b))
+        return result
+
+    @protocol
+    def test_prss_double_share_vector(self, runtime):
+        quantity = 10
+        r_t, r_2t = runtime.prss_double_share_vector(self.Zp, quantity)
+        a = runtime.open_vector(r_t)
+        b = runtime.open_vector(r_2t, threshold=2*runtime.threshold)
+        result = gatherResults([a, b])
+        result.addCallback(lambda (a, b): self.assertEquals(a, b))
+        return result
+
+
+class ActiveSharedVectorTest(RuntimeTestCase):
+    """Test multiplication of shared vectors using PRSS triples."""
+
+    num_players = 4
+    runtime_class = ActiveRuntime
+
+    @protocol
+    def test_mul(self, runtime):
+        def share(number):
+            if runtime.id == 1:
+                return runtime.prss_share([1], self.Zp, number)
+            else:
+                return runtime.prss_share([1], self.Zp)
+        xs = [share(10 + i) for i in range(7)]
+        ys = [share(20 + i) for i in range(7)]
+        product = runtime.gather_vector(xs) * runtime.gather_vector(ys)
+        self.assert_type(product, SharedVector)
+        result = runtime.open_vector(product)
+        result.addCallback(self.assertEquals,
+                           [self.Zp((10 + i) * (20 + i)) for i in range(7)])
+        return result
+
+
+class TriplesHyper(TriplesHyperinvertibleMatricesMixin, BasicActiveRuntime):
+    pass
+
+
+class HyperSharedVectorTest(ActiveSharedVectorTest):
+    """Test multiplication of shared vectors using triples from
+    hyperinvertible matrices."""
+
+    runtime_class = TriplesHyper
@@ -27,9 +27,10 @@ from viff.field import GF
 from viff.config import generate_configs, load_config
 from viff.util import rand
 from viff.test.loopback import loopbackAsync
-from viff.reactor import ViffReactor
+from viff.reactor import ViffReactorMixin
 
 from random import Random
+from optparse import OptionParser
 
 
 def protocol(method):
@@ -95,6 +96,8 @@ class RuntimeTestCase(TestCase):
     threshold = 1
     #: Default Runtime class to instantiate.
     runtime_class = PassiveRuntime
+    #: Options overriding the defaults of the runtime class.
+    runtime_options = {}
 
     #: A dictionary mapping player ids to pseudorandom generators.
     #:
@@ -139,11 +142,12 @@ class RuntimeTestCase(TestCase):
         self.close_sentinels = []
 
         self.runtimes = []
+        self.runtime_objects = []
         for id in reversed(range(1, self.num_players+1)):
             _, players = load_config(configs[id])
             self.create_loopback_runtime(id, players)
 
-        if isinstance(reactor, ViffReactor):
+        if isinstance(reactor, ViffReactorMixin):
             def set_loop_call(runtimes):
                 self.i = 0
 
@@ -177,6 +181,11 @@ class RuntimeTestCase(TestCase):
         """
         for protocol in self.protocols.itervalues():
             protocol.transport.close()
+        for runtime in self.runtime_objects:
+            runtime.close_worker_pool()
+            pool = getattr(runtime, "randomizer_pool", None)
+            if pool is not None:
+                pool.close()
 
     def create_loopback_runtime(self, id, players):
         """Create a L{Runtime} connected with a loopback.
@@ -193,7 +202,16 @@ class RuntimeTestCase(TestCase):
         # Create a runtime that knows about no other players than itself.
         # It will eventually be returned in result when the factory has
         # determined that all needed protocols are ready.
-        runtime = self.runtime_class(players[id], self.threshold)
+        if self.runtime_options:
+            parser = OptionParser()
+            self.runtime_class.add_options(parser)
+            options = parser.get_default_values()
+            for name, value in self.runtime_options.iteritems():
+                setattr(options, name, value)
+        else:
+            options = None
+        runtime = self.runtime_class(players[id], self.threshold, options)
+        self.runtime_objects.append(runtime)
         factory = ShareExchangerFactory(runtime, players, result)
         # We add the Deferred passed to ShareExchangerFactory and not
         # the Runtime, since we want everybody to wait until all
@@ -25,6 +25,7 @@ ensures that a protocol run can be reproduced at a later time.
 import os
 import time
 import random
+import struct
 import warnings
 from twisted.internet.defer import Deferred, succeed, gatherResults
 from gmpy import mpz
@@ -281,6 +282,58 @@ def find_random_prime(k):
     return long(p)
 
 
+def pack_longs(values):
+    """Encode a list of integers as a string.
+
+    Each integer is stored as a four byte length followed by the
+    bytes of the integer in the binary format of :mod:`gmpy`. This
+    is much more compact and faster to parse than :func:`repr`, and
+    the encoding of a concatenation of lists is the concatenation of
+    the encodings:
+
+    >>> pack_longs([1, -1])
+    '\\x00\\x00\\x00\\x01\\x01\\x00\\x00\\x00\\x02\\x01\\xff'
+    >>> pack_longs([1]) + pack_longs([-1]) == pack_longs([1, -1])
+    True
+    >>> pack_longs([])
+    ''
+
+    Use :func:`unpack_longs` to decode the string.
+    """
+    parts = []
+    for value in values:
+        data = mpz(value).binary()
+        parts.append(struct.pack("!I", len(data)))
+        parts.append(data)
+    return "".join(parts)
+
+
+def unpack_longs(data):
+    """Decode a string made by :func:`pack_longs`.
+
+    >>> unpack_longs(pack_longs([0, 42, -7, 2**100]))
+    [0L, 42L, -7L, 1267650600228229401496703205376L]
+
+    A :exc:`struct.error` is raised if the string is malformed:
+
+    >>> unpack_longs('\\x00\\x00\\x00\\x05\\x01')
+    Traceback (most recent call last):
+        ...
+    error: truncated integer at offset 0
+    """
+    values = []
+    offset = 0
+    end = len(data)
+    while offset < end:
+        size, = struct.unpack_from("!I", data, offset)
+        start = offset + 4
+        if start + size > end:
+            raise struct.error("truncated integer at offset %d" % offset)
+        values.append(long(mpz(data[start:start+size], 256)))
+        offset = start + size
+    return values
+
+
 PHASES = {}
 
 def begin(result, phase):